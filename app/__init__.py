@@ -8,16 +8,38 @@ from flask_moment import Moment
 from flask_pagedown import PageDown
 from flask_login import LoginManager
 from flask_bootstrap import Bootstrap
-from flask_sqlalchemy import SQLAlchemy
 from flask import Flask, render_template
+from .routing import RoutingSQLAlchemy
+from .render import Renderer
+from .cache import PageCache
+from .presence import LastSeenBuffer
+from .passwords import PasswordHasher
+from .email import MailSpooler
+from .metrics import Metrics
+from .profiler import Profiler
+from .graph import FollowGraph
 
 
 mail = Mail()
 moment = Moment()
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 pagedown = PageDown()
 bootstrap = Bootstrap()
 login_manager = LoginManager()
+renderer = Renderer()
+metrics = Metrics()
+profiler = Profiler()
+page_cache = PageCache()
+page_cache.listen(db.session)
+db.primary_when(page_cache.fills)
+last_seen_buffer = LastSeenBuffer()
+password_hasher = PasswordHasher()
+metrics.add_collector(password_hasher.collect)
+mail_spooler = MailSpooler()
+mail_spooler.listen(db.session)
+metrics.add_collector(mail_spooler.collect)
+follow_graph = FollowGraph()
+follow_graph.listen(db.session)
 
 
 login_manager.session_protection = 'strong'#提供不同的安全等级防止用户会话被篡改。设为‘strong',Flask-Login会记录客户端IP地址和浏览器的用户代理信息。
@@ -34,6 +56,14 @@ def create_app(config_name):
 	moment.init_app(app)
 	mail.init_app(app)
 	db.init_app(app)
+	renderer.init_app(app)
+	metrics.init_app(app)
+	profiler.init_app(app)
+	page_cache.init_app(app)
+	last_seen_buffer.init_app(app)
+	password_hasher.init_app(app)
+	mail_spooler.init_app(app)
+	follow_graph.init_app(app)
 	
 	#注册蓝本
 	from .main import main as main_blueprint
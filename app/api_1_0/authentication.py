@@ -1,25 +1,12 @@
 from flask import g, jsonify
 from flask_httpauth import HTTPBasicAuth
-from ..models import User
+from ..models import User, AnonymousUser
 from . import api
 from .errors import forbidden, unauthorized
 
 auth = HTTPBasicAuth()
 
 
-#初始化Flask-HTTPAuth
-@auth.verify_password
-def verify_password(email, password):
-	if email == '':
-		g.current_user = AnonymousUser()
-		return True
-	user = User.query.filter_by(email = email).first()
-	if not user:
-		return False
-	g.current_user = user
-	return user.verify_password(password)
-
-
 #Flask-HTTPAuth错误处理程序
 @auth.error_handler
 def auth_error():
@@ -34,7 +21,7 @@ def before_request():
 		return forbidden('未经证实的消息')
 
 
-#支持令牌的改进验证回调
+#支持令牌的改进验证回调，令牌认证得到的是TokenUser，不查询数据库
 @auth.verify_password
 def verify_password(email_or_token, password):
 	if email_or_token == '':
@@ -55,21 +42,7 @@ def verify_password(email_or_token, password):
 #生成认证令牌
 @api.route('/token')
 def get_token():
-	if g.current_user.is_anonymous() or g.token_used:
+	if g.current_user.is_anonymous or g.token_used:
 		return unauthorized('Invalid credentials')
 	return jsonify({'token': g.current_user.generate_auth_token(
 		expiration=3600), 'expiration':3600})
-
-
-
-
-
-
-
-
-
-
-
-
-
-
@@ -0,0 +1,38 @@
+from flask import jsonify, request, current_app
+from .. import db, renderer
+from ..exceptions import ValidationError
+
+
+#批量创建：整批只做一次认证和一次提交，正文先集中渲染；
+#每一项用create(由from_json构造对象)校验，不合格的项不影响其余各项
+def batch_create(create, profile, serialize):
+	items = request.json
+	limit = current_app.config['FLASKY_API_BATCH_LIMIT']
+	if not isinstance(items, list) or not items:
+		raise ValidationError('batch must be a non-empty JSON array')
+	if len(items) > limit:
+		raise ValidationError('batch exceeds %d items' % limit)
+	#批量上限小于渲染缓存的条数，随后逐条赋值正文时都能命中缓存；
+	#超时的正文记在本次请求中，赋值时不再重新渲染
+	renderer.render_many([item.get('body') for item in items
+						  if isinstance(item, dict) and
+						  isinstance(item.get('body'), str)], profile)
+	results = []
+	created = []
+	for item in items:
+		try:
+			if not isinstance(item, dict):
+				raise ValidationError('item is not a JSON object')
+			created.append(create(item))
+		except ValidationError as e:
+			results.append({'status': 400, 'error': 'bad request',
+							'message': e.args[0]})
+		else:
+			results.append(None)
+	db.session.add_all(created)
+	db.session.commit()
+	serialized = iter(serialize(created))
+	for i, result in enumerate(results):
+		if result is None:
+			results[i] = {'status': 201, profile: next(serialized)}
+	return jsonify({'results': results, 'created': len(created)})
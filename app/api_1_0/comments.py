@@ -1,31 +1,85 @@
 from flask import jsonify, request, g, url_for, current_app
 from .. import db
+from ..exceptions import ValidationError
 from ..models import Post, Permission, Comment
+from ..pagination import paginate_by_cursor
+from ..serializers import comments_to_json
 from . import api
-from .decorators import permission_required
+from .decorators import permission_required, conditional_get
+from .batch import batch_create
 
 
 @api.route('/comments/')
+@conditional_get
 def get_comments():
-    page = request.args.get('page', 1, type=int)
-    pagination = Comment.query.order_by(Comment.timestamp.desc()).paginate(
-        page, per_page=current_app.config['FLASKY_COMMENTS_PER_PAGE'],
-        error_out=False)
+    pagination = paginate_by_cursor(
+        Comment.query, Comment, request.args.get('cursor'),
+        per_page=current_app.config['FLASKY_COMMENTS_PER_PAGE'])
     comments = pagination.items
     prev = None
     if pagination.has_prev:
-        prev = url_for('api.get_comments', page=page-1)
+        prev = url_for('api.get_comments', cursor=pagination.prev_cursor)
     next = None
     if pagination.has_next:
-        next = url_for('api.get_comments', page=page+1)
+        next = url_for('api.get_comments', cursor=pagination.next_cursor)
     return jsonify({
-        'comments': [comment.to_json() for comment in comments],
+        'comments': comments_to_json(comments),
         'prev': prev,
         'next': next,
-        'count': pagination.total
+        'prev_cursor': pagination.prev_cursor,
+        'next_cursor': pagination.next_cursor
     })
 
 
+@api.route('/comments/moderate')
+@permission_required(Permission.MODERATE_COMMENTS)
+@conditional_get
+def get_moderation_queue():
+    disabled = request.args.get('disabled', 'false') == 'true'
+    pagination = paginate_by_cursor(
+        Comment.query.filter(Comment.disabled == disabled), Comment,
+        request.args.get('cursor'),
+        per_page=current_app.config['FLASKY_COMMENTS_PER_PAGE'])
+    comments = pagination.items
+    prev = None
+    if pagination.has_prev:
+        prev = url_for('api.get_moderation_queue', disabled=str(disabled).lower(),
+                       cursor=pagination.prev_cursor)
+    next = None
+    if pagination.has_next:
+        next = url_for('api.get_moderation_queue', disabled=str(disabled).lower(),
+                       cursor=pagination.next_cursor)
+    return jsonify({
+        'comments': comments_to_json(comments),
+        'prev': prev,
+        'next': next,
+        'prev_cursor': pagination.prev_cursor,
+        'next_cursor': pagination.next_cursor
+    })
+
+
+# 批量审核: {"ids": [...], "disabled": true}, 只有状态确实变化的评论会被修改
+@api.route('/comments/moderate', methods=['POST'])
+@permission_required(Permission.MODERATE_COMMENTS)
+def moderate_comments():
+    json_moderation = request.json
+    if not isinstance(json_moderation, dict):
+        raise ValidationError('moderation must be a JSON object')
+    ids = json_moderation.get('ids')
+    disabled = json_moderation.get('disabled')
+    if not isinstance(disabled, bool):
+        raise ValidationError('disabled must be true or false')
+    if not isinstance(ids, list) or not all(
+            isinstance(id, int) and not isinstance(id, bool) for id in ids):
+        raise ValidationError('ids must be a JSON array of comment ids')
+    limit = current_app.config['FLASKY_MODERATION_BATCH_LIMIT']
+    if len(ids) > limit:
+        raise ValidationError('batch exceeds %d items' % limit)
+    changed = Comment.set_disabled(ids, disabled) if ids else []
+    db.session.commit()
+    return jsonify({'changed': changed, 'disabled': disabled})
+
+
 @api.route('/comments/<int:id>')
 def get_comment(id):
     comment = Comment.query.get_or_404(id)
@@ -33,24 +87,26 @@ def get_comment(id):
 
 
 @api.route('/posts/<int:id>/comments/')
+@conditional_get
 def get_post_comments(id):
     post = Post.query.get_or_404(id)
-    page = request.args.get('page', 1, type=int)
-    pagination = post.comments.order_by(Comment.timestamp.asc()).paginate(
-        page, per_page=current_app.config['FLASKY_COMMENTS_PER_PAGE'],
-        error_out=False)
+    pagination = paginate_by_cursor(
+        post.comments, Comment, request.args.get('cursor'),
+        per_page=current_app.config['FLASKY_COMMENTS_PER_PAGE'],
+        ascending=True)
     comments = pagination.items
     prev = None
     if pagination.has_prev:
-        prev = url_for('api.get_post_comments', id=id, page=page-1)
+        prev = url_for('api.get_post_comments', id=id, cursor=pagination.prev_cursor)
     next = None
     if pagination.has_next:
-        next = url_for('api.get_post_comments', id=id, page=page+1)
+        next = url_for('api.get_post_comments', id=id, cursor=pagination.next_cursor)
     return jsonify({
-        'comments': [comment.to_json() for comment in comments],
+        'comments': comments_to_json(comments),
         'prev': prev,
         'next': next,
-        'count': pagination.total
+        'prev_cursor': pagination.prev_cursor,
+        'next_cursor': pagination.next_cursor
     })
 
 
@@ -59,9 +115,22 @@ def get_post_comments(id):
 def new_post_comment(id):
     post = Post.query.get_or_404(id)
     comment = Comment.from_json(request.json)
-    comment.author = g.current_user
+    comment.author_id = g.current_user.id
     comment.post = post
     db.session.add(comment)
     db.session.commit()
     return jsonify(comment.to_json()), 201, \
         {'Location': url_for('api.get_comment', id=comment.id)}
+
+
+@api.route('/posts/<int:id>/comments/batch', methods=['POST'])
+@permission_required(Permission.COMMENT)
+def new_post_comments_batch(id):
+    post = Post.query.get_or_404(id)
+
+    def create(json_comment):
+        comment = Comment.from_json(json_comment)
+        comment.author_id = g.current_user.id
+        comment.post_id = post.id
+        return comment
+    return batch_create(create, 'comment', comments_to_json)
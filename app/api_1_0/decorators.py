@@ -1,5 +1,7 @@
+import zlib
 from functools import wraps
-from flask import g
+from flask import g, request, make_response, current_app
+from ..exceptions import NotModified
 from .errors import forbidden
 
 
@@ -12,4 +14,47 @@ def permission_required(permission):
 				return forbidden('Insufficient permissions')
 			return f(*args, **kwargs)
 		return decorated_function
-	return decorator
\ No newline at end of file
+	return decorator
+
+
+#由一页结果的行数、最大(timestamp, id)和各行的轻量指纹生成弱ETag，
+#正文编辑不会改变时间戳，所以把正文的CRC也算进去
+def window_etag(pagination):
+	items = pagination.items
+	crc = zlib.crc32(('%d%d' % (pagination.has_prev,
+								pagination.has_next)).encode('ascii'))
+	for item in items:
+		row = '%d:%s:%s:%s;' % (item.id, item.timestamp,
+								getattr(item, 'comment_count', ''),
+								getattr(item, 'disabled', ''))
+		crc = zlib.crc32(row.encode('utf-8'), crc)
+		crc = zlib.crc32((item.body or '').encode('utf-8'), crc)
+	if not items:
+		return '0-%08x' % (crc & 0xffffffff)
+	timestamp, id = max((item.timestamp, item.id) for item in items)
+	return '%d-%s-%d-%08x' % (len(items), timestamp.strftime('%Y%m%d%H%M%S%f'),
+							  id, crc & 0xffffffff)
+
+
+#条件GET修饰器：分页取出这一页后立即比较If-None-Match，命中时直接返回304，
+#不再调用to_json()。这一页里最新的时间戳不是真正的修改时间(编辑和删除不会改变它)，
+#所以不发Last-Modified，也不处理If-Modified-Since
+def conditional_get(f):
+	@wraps(f)
+	def decorated_function(*args, **kwargs):
+		def check(pagination):
+			g.etag = window_etag(pagination)
+			if request.if_none_match and \
+					request.if_none_match.contains_weak(g.etag):
+				raise NotModified()
+		g.conditional_window = check
+		try:
+			response = make_response(f(*args, **kwargs))
+		except NotModified:
+			response = current_app.response_class(status=304)
+		finally:
+			g.conditional_window = None
+		if g.get('etag') is not None:
+			response.set_etag(g.etag, weak=True)
+		return response
+	return decorated_function
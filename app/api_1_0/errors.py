@@ -1,5 +1,5 @@
 from flask import jsonify
-from app.exceptions import ValidationError
+from app.exceptions import ValidationError, ServiceUnavailable
 from . import api
 
 def bad_request(message):
@@ -18,7 +18,16 @@ def forbidden(message):
 	response.status_code = 403
 	return response
 
+def service_unavailable(message):
+	response = jsonify({'error': 'service unavailable', 'message': message})
+	response.status_code = 503
+	return response
+
 #API中alidationError异常的处理程序
 @api.errorhandler(ValidationError)
 def validation_error(e):
-	return bad_request(e.args[0])
\ No newline at end of file
+	return bad_request(e.args[0])
+
+@api.errorhandler(ServiceUnavailable)
+def service_unavailable_error(e):
+	return service_unavailable(e.args[0])
@@ -0,0 +1,70 @@
+import zlib
+from flask import request, current_app, json, stream_with_context
+from ..models import Post, User, Comment
+from ..serializers import posts_to_json, users_to_json, comments_to_json
+from . import api
+from .errors import bad_request
+
+
+#按id顺序逐批读出，每批序列化成若干行JSON；yield_per使用服务器端游标，内存占用与总行数无关
+def export_lines(model, serialize, since, batch_size):
+	query = model.query.filter(model.id > since).order_by(model.id)
+	batch = []
+	for row in query.yield_per(batch_size):
+		batch.append(row)
+		if len(batch) >= batch_size:
+			yield _encode(batch, serialize)
+			batch = []
+	if batch:
+		yield _encode(batch, serialize)
+
+
+#每行附带id，中断后用最后一行的id作为since继续导出
+def _encode(rows, serialize):
+	lines = []
+	for row, item in zip(rows, serialize(rows)):
+		item['id'] = row.id
+		lines.append(json.dumps(item))
+	return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+#每批压缩后立即同步刷新，客户端可以边收边解压
+def gzip_stream(chunks):
+	compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+	for chunk in chunks:
+		data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+		if data:
+			yield data
+	yield compressor.flush()
+
+
+def export(model, serialize):
+	try:
+		since = int(request.args.get('since', 0))
+	except ValueError:
+		return bad_request('since must be an integer id')
+	chunks = export_lines(model, serialize, since,
+						  current_app.config['FLASKY_EXPORT_BATCH_SIZE'])
+	headers = {'Vary': 'Accept-Encoding'}
+	if request.accept_encodings['gzip']:
+		chunks = gzip_stream(chunks)
+		headers['Content-Encoding'] = 'gzip'
+	return current_app.response_class(stream_with_context(chunks),
+									  mimetype='application/x-ndjson',
+									  headers=headers)
+
+
+#以换行分隔的JSON流式导出全部文章、评论和用户，代替逐页抓取列表
+@api.route('/posts/export')
+def export_posts():
+	return export(Post, posts_to_json)
+
+
+@api.route('/comments/export')
+def export_comments():
+	return export(Comment, comments_to_json)
+
+
+@api.route('/users/export')
+def export_users():
+	return export(User, users_to_json)
@@ -1,35 +1,36 @@
 from flask import jsonify, request, g, url_for, current_app
 from .. import db
 from ..models import Post, Permission
+from ..pagination import paginate_by_cursor
+from ..serializers import posts_to_json
 from . import api
-from flask_httpauth import HTTPBasicAuth
-from .decorators import permission_required
+from .decorators import permission_required, conditional_get
+from .batch import batch_create
 from .errors import forbidden
 
-auth = HTTPBasicAuth()
 
 @api.route('/posts/')
+@conditional_get
 def get_posts():
-	page = request.args.get('page', 1, type=int)
-	pagination = Post.query.paginate(
-		page, per_page=current_app.config['FLASKY_POSTS_PER_PAGE'],
-		error_out=False)
+	pagination = paginate_by_cursor(
+		Post.query, Post, request.args.get('cursor'),
+		per_page=current_app.config['FLASKY_POSTS_PER_PAGE'])
 	posts = pagination.items
 	prev = None
 	if pagination.has_prev:
-		prev = url_for('api.get_posts', page=page-1, _external=True)
+		prev = url_for('api.get_posts', cursor=pagination.prev_cursor, _external=True)
 	next = None
-	if pagination.has_nest:
-		nest = url_for('api.get_posts', page=page+1, _external=True)
+	if pagination.has_next:
+		next = url_for('api.get_posts', cursor=pagination.next_cursor, _external=True)
 	return jsonify({
-		'posts': [post.to_json() for post in posts],
+		'posts': posts_to_json(posts),
 		'prev': prev,
 		'next': next,
-		'count': pagination.total
+		'prev_cursor': pagination.prev_cursor,
+		'next_cursor': pagination.next_cursor
 	})
 
 @api.route('/posts/<int:id>')
-@auth.login_required
 def get_post(id):
 	post = Post.query.get_or_404(id)
 	return jsonify(post.to_json())
@@ -39,18 +40,28 @@ def get_post(id):
 @permission_required(Permission.WRITE_ARTICLES)
 def new_post():
 	post = Post.from_json(request.json)
-	post.author = g.current_user
+	post.author_id = g.current_user.id
 	db.session.add(post)
 	db.session.commit()
 	return jsonify(post.to_json()), 201, \
 		{'Location': url_for('api.get_post', id=post.id, _external=True)}
-	
+
+#批量发表文章，逐条校验，合格的在同一个事务中写入，按提交顺序返回每一条的状态
+@api.route('/posts/batch', methods=['POST'])
+@permission_required(Permission.WRITE_ARTICLES)
+def new_posts_batch():
+	def create(json_post):
+		post = Post.from_json(json_post)
+		post.author_id = g.current_user.id
+		return post
+	return batch_create(create, 'post', posts_to_json)
+
 #文章资源PUT请求的处理程序
 @api.route('/posts/<int:id>', methods=['PUT'])
 @permission_required(Permission.WRITE_ARTICLES)
 def edit_post(id):
 	post = Post.query.get_or_404(id)
-	if g.current_user != post.author and \
+	if g.current_user.id != post.author_id and \
 	not g.current_user.can(Permission.ADMINISTER):
 		return forbidden('Insufficient permissions')
 	post.body = request.json.get('body', post.body)
@@ -0,0 +1,44 @@
+from flask import jsonify, request, current_app, url_for
+from . import api
+from .errors import bad_request
+from ..search import search, load_hits
+from ..serializers import posts_to_json, comments_to_json
+
+
+#全文搜索，按BM25得分排序，用page分页
+@api.route('/search')
+def search_posts_and_comments():
+	q = request.args.get('q', '')
+	type = request.args.get('type')
+	if type not in (None, 'post', 'comment'):
+		return bad_request('type must be post or comment')
+	page = request.args.get('page', 1, type=int)
+	per_page = current_app.config['FLASKY_SEARCH_RESULTS_PER_PAGE']
+	if page < 1 or page * per_page > current_app.config['FLASKY_SEARCH_MAX_RESULTS']:
+		return bad_request('page out of range')
+	hits, total = search(q, type, per_page, (page - 1) * per_page)
+	hits = load_hits(hits)
+	#文章和评论分别批量序列化，再按得分顺序取回
+	serialized = {}
+	for hit_type, to_json in (('post', posts_to_json),
+							  ('comment', comments_to_json)):
+		items = [item for t, item, score in hits if t == hit_type]
+		for item, json_item in zip(items, to_json(items)):
+			serialized[(hit_type, item.id)] = json_item
+	results = [{'type': hit_type, 'score': round(score, 4),
+				hit_type: serialized[(hit_type, item.id)]}
+			   for hit_type, item, score in hits]
+	prev = None
+	if page > 1:
+		prev = url_for('api.search_posts_and_comments', q=q, type=type,
+					   page=page - 1)
+	next = None
+	if page * per_page < total:
+		next = url_for('api.search_posts_and_comments', q=q, type=type,
+					   page=page + 1)
+	return jsonify({
+		'results': results,
+		'prev': prev,
+		'next': next,
+		'count': total
+	})
@@ -1,6 +1,10 @@
-from flask import jsonify, request, current_app, url_for
+from flask import jsonify, request, current_app, url_for, g
 from . import api
+from .decorators import conditional_get
+from .errors import forbidden
 from ..models import User, Post
+from ..pagination import paginate_by_cursor
+from ..serializers import posts_to_json, users_to_json
 
 
 @api.route('/users/<int:id>')
@@ -9,45 +13,60 @@ def get_user(id):
     return jsonify(user.to_json())
 
 
+#离线计算的关注推荐，附带共同关注数；推荐列表只对本人可见
+@api.route('/users/<int:id>/suggestions/')
+def get_user_suggestions(id):
+    if g.current_user.id != id:
+        return forbidden('Insufficient permissions')
+    user = User.query.get_or_404(id)
+    suggestions = user.suggestions(current_app.config['FLASKY_SUGGESTIONS_TOP_K'])
+    users = users_to_json([suggested for suggested, mutual_count in suggestions])
+    for json_user, (suggested, mutual_count) in zip(users, suggestions):
+        json_user['mutual_count'] = mutual_count
+    return jsonify({'suggestions': users})
+
+
 @api.route('/users/<int:id>/posts/')
+@conditional_get
 def get_user_posts(id):
     user = User.query.get_or_404(id)
-    page = request.args.get('page', 1, type=int)
-    pagination = user.posts.order_by(Post.timestamp.desc()).paginate(
-        page, per_page=current_app.config['FLASKY_POSTS_PER_PAGE'],
-        error_out=False)
+    pagination = paginate_by_cursor(
+        user.posts, Post, request.args.get('cursor'),
+        per_page=current_app.config['FLASKY_POSTS_PER_PAGE'])
     posts = pagination.items
     prev = None
     if pagination.has_prev:
-        prev = url_for('api.get_user_posts', id=id, page=page-1)
+        prev = url_for('api.get_user_posts', id=id, cursor=pagination.prev_cursor)
     next = None
     if pagination.has_next:
-        next = url_for('api.get_user_posts', id=id, page=page+1)
+        next = url_for('api.get_user_posts', id=id, cursor=pagination.next_cursor)
     return jsonify({
-        'posts': [post.to_json() for post in posts],
+        'posts': posts_to_json(posts),
         'prev': prev,
         'next': next,
-        'count': pagination.total
+        'prev_cursor': pagination.prev_cursor,
+        'next_cursor': pagination.next_cursor
     })
 
 
 @api.route('/users/<int:id>/timeline/')
+@conditional_get
 def get_user_followed_posts(id):
     user = User.query.get_or_404(id)
-    page = request.args.get('page', 1, type=int)
-    pagination = user.followed_posts.order_by(Post.timestamp.desc()).paginate(
-        page, per_page=current_app.config['FLASKY_POSTS_PER_PAGE'],
-        error_out=False)
+    pagination = paginate_by_cursor(
+        user.timeline, Post, request.args.get('cursor'),
+        per_page=current_app.config['FLASKY_POSTS_PER_PAGE'])
     posts = pagination.items
     prev = None
     if pagination.has_prev:
-        prev = url_for('api.get_user_followed_posts', id=id, page=page-1)
+        prev = url_for('api.get_user_followed_posts', id=id, cursor=pagination.prev_cursor)
     next = None
     if pagination.has_next:
-        next = url_for('api.get_user_followed_posts', id=id, page=page+1)
+        next = url_for('api.get_user_followed_posts', id=id, cursor=pagination.next_cursor)
     return jsonify({
-        'posts': [post.to_json() for post in posts],
+        'posts': posts_to_json(posts),
         'prev': prev,
         'next': next,
-        'count': pagination.total
+        'prev_cursor': pagination.prev_cursor,
+        'next_cursor': pagination.next_cursor
     })
@@ -0,0 +1,100 @@
+# -*- coding:UTF-8 -*-
+#本地头像服务：根据用户的avatar_hash生成左右对称的5x5像素图案(identicon)，
+#编码成PNG后按散列值和尺寸保存在磁盘上，同一地址的内容永远不变，可以让浏览器长期缓存
+
+import os
+import re
+import struct
+import tempfile
+import zlib
+
+
+GRID = 5
+BACKGROUND = (240, 240, 240)
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+_hash = re.compile(r'^[0-9a-f]{32}$')
+
+
+def valid_hash(hash):
+	return bool(_hash.match(hash or ''))
+
+
+#不在允许列表中的尺寸取不小于它的最近一档，缓存的文件数因此有上限
+def avatar_size(size, sizes):
+	for allowed in sorted(sizes):
+		if size <= allowed:
+			return allowed
+	return max(sizes)
+
+
+#散列前15位决定左三列哪些格子着色，右两列镜像；最后三个字节决定颜色，压到中等亮度保证与背景有对比
+def pattern(hash):
+	digest = bytearray.fromhex(hash)
+	bits = int(hash[:4], 16)
+	cells = []
+	for row in range(GRID):
+		left = [bool(bits >> (row * 3 + column) & 1) for column in range(3)]
+		cells.append(left + left[1::-1])
+	color = tuple(48 + value * 5 // 8 for value in digest[-3:])
+	return cells, color
+
+
+def _chunk(kind, data):
+	return struct.pack('>I', len(data)) + kind + data + \
+		struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+
+def encode_png(rows, width, height):
+	raw = b''.join(b'\x00' + row for row in rows)
+	header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+	return PNG_SIGNATURE + _chunk(b'IHDR', header) + \
+		_chunk(b'IDAT', zlib.compress(raw, 9)) + _chunk(b'IEND', b'')
+
+
+#直接按目标尺寸绘制，不做缩放；同一行格子内的像素行完全相同，每一格行只拼一次
+def identicon(hash, size):
+	cells, color = pattern(hash)
+	margin = size // 10
+	inner = size - 2 * margin
+	background = bytes(bytearray(BACKGROUND))
+	foreground = bytes(bytearray(color))
+	columns = [(x - margin) * GRID // inner if margin <= x < margin + inner else None
+			   for x in range(size)]
+	blank = background * size
+	lines = []
+	for row in cells:
+		lines.append(b''.join(
+			foreground if column is not None and row[column] else background
+			for column in columns))
+	rows = []
+	for y in range(size):
+		if margin <= y < margin + inner:
+			rows.append(lines[(y - margin) * GRID // inner])
+		else:
+			rows.append(blank)
+	return encode_png(rows, size, size)
+
+
+#以散列值的前两位分目录，避免单个目录下文件过多
+def avatar_path(directory, hash, size):
+	return os.path.join(directory, hash[:2], '%s-%d.png' % (hash, size))
+
+
+#磁盘上已有则直接读取，否则生成后先写临时文件再改名，并发的请求不会读到写了一半的文件
+def load_avatar(directory, hash, size):
+	path = avatar_path(directory, hash, size)
+	try:
+		with open(path, 'rb') as f:
+			return f.read()
+	except (IOError, OSError):
+		pass
+	data = identicon(hash, size)
+	folder = os.path.dirname(path)
+	if not os.path.isdir(folder):
+		os.makedirs(folder, exist_ok=True)
+	descriptor, temporary = tempfile.mkstemp(suffix='.tmp', dir=folder)
+	with os.fdopen(descriptor, 'wb') as f:
+		f.write(data)
+	os.replace(temporary, path)
+	return data
@@ -0,0 +1,246 @@
+# -*- coding:UTF-8 -*-
+#直接驱动WSGI程序的并发基准测试：统计每个端点的延迟分位数、吞吐量、
+#每个请求执行的SQL语句数和加载的行数，结果写成JSON便于比较
+
+import json
+import math
+import threading
+import time
+from base64 import b64encode
+from collections import OrderedDict
+from datetime import datetime
+from . import db
+
+
+#按线程统计SQL语句数、语句耗时和ORM加载的行数
+class QueryStats(object):
+	def __init__(self):
+		self.local = threading.local()
+
+	def install(self, engine):
+		db.event.listen(engine, 'before_cursor_execute', self.before)
+		db.event.listen(engine, 'after_cursor_execute', self.after)
+		db.event.listen(db.Model, 'load', self.loaded, propagate=True)
+
+	def remove(self, engine):
+		db.event.remove(engine, 'before_cursor_execute', self.before)
+		db.event.remove(engine, 'after_cursor_execute', self.after)
+		db.event.remove(db.Model, 'load', self.loaded)
+
+	def reset(self):
+		self.local.statements = 0
+		self.local.seconds = 0.0
+		self.local.rows = 0
+		self.local.started = None
+
+	def snapshot(self):
+		return (getattr(self.local, 'statements', 0),
+				getattr(self.local, 'seconds', 0.0),
+				getattr(self.local, 'rows', 0))
+
+	#只统计调用过reset()的线程
+	def before(self, conn, cursor, statement, parameters, context, executemany):
+		if hasattr(self.local, 'statements'):
+			self.local.started = time.time()
+
+	def after(self, conn, cursor, statement, parameters, context, executemany):
+		if getattr(self.local, 'started', None) is None:
+			return
+		self.local.statements += 1
+		self.local.seconds += time.time() - self.local.started
+
+	def loaded(self, target, context):
+		if hasattr(self.local, 'rows'):
+			self.local.rows += 1
+
+
+#最近秩法求分位数
+def percentile(values, p):
+	if not values:
+		return 0.0
+	ordered = sorted(values)
+	rank = int(math.ceil(p / 100.0 * len(ordered)))
+	return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+class Benchmark(object):
+	def __init__(self, app, requests=200, concurrency=4, writes=True):
+		self.app = app
+		self.requests = requests
+		self.concurrency = concurrency
+		self.writes = writes
+		self.stats = QueryStats()
+
+	#选出关注者最多的用户、评论最多的文章和一个有关注的种子用户作为测试对象
+	def _fixtures(self):
+		from .models import User, Post, Comment
+		reader = User.query.filter(User.email.like('seed%@example.com')).order_by(
+			User.followed_count.desc()).first()
+		if reader is None:
+			raise ValueError('no seeded users, run "manage.py seed" first')
+		popular = User.query.order_by(User.follower_count.desc()).first()
+		post = Post.query.order_by(Post.comment_count.desc()).first()
+		comment = Comment.query.first()
+		own = Post.query.filter_by(author_id=reader.id).first()
+		return reader, popular, post, comment, own
+
+	def scenarios(self):
+		reader, popular, post, comment, own = self._fixtures()
+		self.reader_email = reader.email
+		scenarios = [
+			('main.index (anonymous)', 'GET', '/', 'anonymous', None),
+			('main.index (all)', 'GET', '/', 'browser', None),
+			('main.index (followed)', 'GET', '/', 'followed', None),
+			('main.user', 'GET', '/user/%s' % popular.username, 'browser', None),
+			('main.post', 'GET', '/post/%d' % post.id, 'browser', None),
+			('main.followers', 'GET', '/followers/%s' % popular.username,
+			 'browser', None),
+			('api.get_posts', 'GET', '/api/v1.0/posts/', 'api', None),
+			('api.get_post', 'GET', '/api/v1.0/posts/%d' % post.id, 'api', None),
+			('api.get_user', 'GET', '/api/v1.0/users/%d' % popular.id, 'api', None),
+			('api.get_user_posts', 'GET',
+			 '/api/v1.0/users/%d/posts/' % popular.id, 'api', None),
+			('api.get_user_followed_posts', 'GET',
+			 '/api/v1.0/users/%d/timeline/' % reader.id, 'api', None),
+			('api.get_comments', 'GET', '/api/v1.0/comments/', 'api', None),
+			('api.get_post_comments', 'GET',
+			 '/api/v1.0/posts/%d/comments/' % post.id, 'api', None),
+		]
+		if comment is not None:
+			scenarios.append(('api.get_comment', 'GET',
+							  '/api/v1.0/comments/%d' % comment.id, 'api', None))
+		if self.writes:
+			scenarios.append(('api.new_post', 'POST', '/api/v1.0/posts/', 'api',
+							  {'body': 'benchmark post'}))
+			scenarios.append(('api.new_post_comment', 'POST',
+							  '/api/v1.0/posts/%d/comments/' % post.id, 'api',
+							  {'body': 'benchmark comment'}))
+			if own is not None:
+				scenarios.append(('api.edit_post', 'PUT',
+								  '/api/v1.0/posts/%d' % own.id, 'api',
+								  {'body': own.body}))
+		return scenarios
+
+	#每个线程一个客户端：浏览器客户端先登录，API客户端使用令牌
+	def _clients(self, kind):
+		clients = []
+		for i in range(self.concurrency):
+			client = self.app.test_client(use_cookies=True)
+			if kind in ('browser', 'followed'):
+				client.post('/auth/login', data={'email': self.reader_email,
+												 'password': 'password'})
+				client.get('/followed' if kind == 'followed' else '/all')
+			clients.append(client)
+		return clients
+
+	def _token(self):
+		client = self.app.test_client()
+		credentials = b64encode(
+			(self.reader_email + ':password').encode('utf-8')).decode('ascii')
+		response = client.get('/api/v1.0/token',
+							  headers={'Authorization': 'Basic ' + credentials})
+		token = json.loads(response.get_data(as_text=True))['token']
+		return b64encode((token + ':').encode('utf-8')).decode('ascii')
+
+	def _worker(self, client, method, url, headers, body, jobs, samples, lock):
+		data = json.dumps(body) if body is not None else None
+		while True:
+			with lock:
+				if not jobs:
+					return
+				jobs.pop()
+			self.stats.reset()
+			start = time.time()
+			try:
+				response = client.open(url, method=method, headers=headers,
+									   data=data, content_type='application/json')
+				response.get_data()
+				status = response.status_code
+			except Exception:
+				self.app.logger.exception('Benchmark request failed')
+				status = 599
+			elapsed = time.time() - start
+			statements, sql_seconds, rows = self.stats.snapshot()
+			with lock:
+				samples.append((elapsed, status, statements, sql_seconds, rows))
+
+	def _measure(self, name, method, url, kind, body):
+		clients = self._clients(kind)
+		headers = {'Accept': 'application/json'}
+		if kind == 'api':
+			headers['Authorization'] = 'Basic ' + self.api_credentials
+		jobs = list(range(self.requests))
+		samples = []
+		lock = threading.Lock()
+		threads = [threading.Thread(target=self._worker,
+									args=(client, method, url, headers, body,
+										  jobs, samples, lock))
+				   for client in clients]
+		start = time.time()
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		wall = time.time() - start
+		latencies = [sample[0] * 1000 for sample in samples]
+		count = len(samples) or 1
+		return OrderedDict([
+			('endpoint', name), ('method', method), ('url', url),
+			('requests', len(samples)),
+			('errors', sum(1 for sample in samples if sample[1] >= 400)),
+			('throughput', round(len(samples) / wall, 2) if wall else 0.0),
+			('latency_ms', OrderedDict([
+				('p50', round(percentile(latencies, 50), 3)),
+				('p95', round(percentile(latencies, 95), 3)),
+				('p99', round(percentile(latencies, 99), 3)),
+				('mean', round(sum(latencies) / count, 3)),
+				('max', round(max(latencies or [0]), 3))])),
+			('statements', round(sum(s[2] for s in samples) / float(count), 2)),
+			('sql_ms', round(sum(s[3] for s in samples) * 1000 / count, 3)),
+			('rows', round(sum(s[4] for s in samples) / float(count), 2))])
+
+	def run(self, only=None):
+		from .models import User, Post, Comment, Follow
+		#基准测试用表单登录，需要关闭CSRF保护
+		self.app.config['WTF_CSRF_ENABLED'] = False
+		with self.app.app_context():
+			scenarios = self.scenarios()
+			self.api_credentials = self._token()
+			dataset = OrderedDict([
+				('users', User.query.count()), ('posts', Post.query.count()),
+				('comments', Comment.query.count()),
+				('follows', Follow.query.count())])
+			engine = db.engine
+			db.session.remove()
+		self.stats.install(engine)
+		try:
+			results = [self._measure(*scenario) for scenario in scenarios
+					   if only is None or only in scenario[0]]
+		finally:
+			self.stats.remove(engine)
+		return OrderedDict([
+			('timestamp', datetime.utcnow().isoformat()),
+			('database', engine.dialect.name),
+			('concurrency', self.concurrency),
+			('requests', self.requests),
+			('dataset', dataset),
+			('results', results)])
+
+
+def format_results(report, baseline=None):
+	previous = {}
+	if baseline is not None:
+		previous = dict((r['endpoint'], r) for r in baseline['results'])
+	lines = ['%-32s %8s %8s %8s %9s %6s %7s %5s' % (
+		'endpoint', 'p50 ms', 'p95 ms', 'p99 ms', 'req/s', 'sql', 'rows', 'err')]
+	for r in report['results']:
+		latency = r['latency_ms']
+		line = '%-32s %8.2f %8.2f %8.2f %9.1f %6.1f %7.1f %5d' % (
+			r['endpoint'], latency['p50'], latency['p95'], latency['p99'],
+			r['throughput'], r['statements'], r['rows'], r['errors'])
+		before = previous.get(r['endpoint'])
+		if before is not None and before['latency_ms']['p95']:
+			line += '  p95 %+.0f%%' % (
+				(latency['p95'] / before['latency_ms']['p95'] - 1) * 100)
+		lines.append(line)
+	return '\n'.join(lines)
@@ -0,0 +1,203 @@
+# -*- coding:UTF-8 -*-
+#匿名访问的整页缓存，数据库提交后按标签精确失效。缓存的页面在各进程内；
+#设置了FLASKY_PAGE_CACHE_DIR时，失效还会更新共享目录中标签对应的文件，其他进程命中时
+#发现标签文件比页面开始渲染的时间新就丢弃该页面。未设置时失效只作用于本进程，
+#其他进程的页面最多在FLASKY_PAGE_CACHE_TIMEOUT秒内过期
+
+import os
+import time
+import zlib
+from collections import OrderedDict
+from threading import Lock
+from flask import current_app, request, session, g
+from flask_login import current_user
+from sqlalchemy import event, inspect
+
+
+class PageCache(object):
+	def __init__(self, app=None):
+		self.entries = OrderedDict()
+		self.tags = {}
+		self.lock = Lock()
+		self.endpoints = set()
+		self.size = 1000
+		self.timeout = 300
+		self.directory = None
+		self.slots = 4096
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		self.endpoints = set(app.config['FLASKY_PAGE_CACHE_ENDPOINTS'])
+		self.size = app.config['FLASKY_PAGE_CACHE_SIZE']
+		self.timeout = app.config['FLASKY_PAGE_CACHE_TIMEOUT']
+		self.directory = app.config['FLASKY_PAGE_CACHE_DIR']
+		if self.directory and not os.path.isdir(self.directory):
+			os.makedirs(self.directory, exist_ok=True)
+		app.before_request(self.serve)
+		app.after_request(self.store)
+
+	#只缓存匿名用户的GET请求，待显示的flash消息必须走正常渲染
+	def _cacheable(self):
+		return request.method in ('GET', 'HEAD') and \
+			request.endpoint in self.endpoints and \
+			not current_user.is_authenticated and \
+			'_flashes' not in session
+
+	#未命中时会写入缓存的请求，从主库读取(见app.routing)
+	def fills(self):
+		return self._cacheable()
+
+	def _key(self):
+		return (request.endpoint, tuple(sorted((request.view_args or {}).items())),
+				request.args.get('cursor'), request.args.get('page'))
+
+	#视图声明页面依赖的数据，如'posts'、'post:3'、'comments:3'、'user:5'
+	def tag(self, *tags):
+		if not hasattr(g, 'page_cache_tags'):
+			g.page_cache_tags = set()
+		g.page_cache_tags.update(tags)
+
+	#标签按散列分到固定数量的文件，文件数不随标签增长，同一文件中的标签一起失效
+	def _tag_path(self, tag):
+		return os.path.join(self.directory, '%03x' % (
+			zlib.crc32(tag.encode('utf-8')) % self.slots))
+
+	#其他进程在页面开始渲染之后使某个标签失效过
+	def _invalidated_since(self, tags, started):
+		if not self.directory:
+			return False
+		for tag in tags:
+			try:
+				if os.path.getmtime(self._tag_path(tag)) >= started:
+					return True
+			except OSError:
+				continue
+		return False
+
+	def serve(self):
+		if not self._cacheable():
+			return None
+		#页面依赖的数据在此之后读取，以此判断页面是否晚于其他进程的失效
+		g.page_cache_started = time.time()
+		key = self._key()
+		with self.lock:
+			entry = self.entries.get(key)
+		if entry is None:
+			return None
+		expires, status, headers, data, tags, started = entry
+		if expires < time.time() or self._invalidated_since(tags, started):
+			with self.lock:
+				if self.entries.get(key) is entry:
+					self._drop(key)
+			return None
+		with self.lock:
+			if key in self.entries:
+				self.entries.move_to_end(key)
+		response = current_app.response_class(data, status=status,
+											  headers=headers)
+		response.headers['X-Page-Cache'] = 'HIT'
+		return response
+
+	def store(self, response):
+		#带CSRF令牌的表单和修改了会话的响应不能共享
+		if response.status_code != 200 or response.direct_passthrough or \
+				'csrf_token' in g or session.modified or \
+				'X-Page-Cache' in response.headers or \
+				not self._cacheable():
+			return response
+		key = self._key()
+		tags = frozenset(getattr(g, 'page_cache_tags', ()))
+		started = g.get('page_cache_started', time.time())
+		entry = (time.time() + self.timeout, response.status_code,
+				 list(response.headers), response.get_data(), tags, started)
+		with self.lock:
+			self._drop(key)
+			self.entries[key] = entry
+			for tag in tags:
+				self.tags.setdefault(tag, set()).add(key)
+			while len(self.entries) > self.size:
+				self._drop(next(iter(self.entries)))
+		response.headers['X-Page-Cache'] = 'MISS'
+		return response
+
+	def _drop(self, key):
+		entry = self.entries.pop(key, None)
+		if entry is not None:
+			for tag in entry[4]:
+				keys = self.tags.get(tag)
+				if keys is not None:
+					keys.discard(key)
+					if not keys:
+						del self.tags[tag]
+
+	def invalidate(self, *tags):
+		with self.lock:
+			for tag in tags:
+				for key in list(self.tags.get(tag, ())):
+					self._drop(key)
+		if self.directory:
+			for tag in tags:
+				path = self._tag_path(tag)
+				with open(path, 'a'):
+					os.utime(path, None)
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.tags.clear()
+
+	#flush时收集失效标签，提交后才真正失效，回滚则丢弃
+	def listen(self, session):
+		event.listen(session, 'after_flush', self.on_after_flush)
+		event.listen(session, 'after_commit', self.on_after_commit)
+		event.listen(session, 'after_rollback', self.on_after_rollback)
+
+	#绕过工作单元的集合式UPDATE不会出现在flush中，由调用者登记需要失效的标签
+	def tag_session(self, session, *tags):
+		session.info.setdefault('page_cache_tags', set()).update(tags)
+
+	def on_after_flush(self, session, flush_context):
+		session.info.setdefault('page_cache_tags', set()).update(
+			changed_tags(session))
+
+	def on_after_commit(self, session):
+		tags = session.info.pop('page_cache_tags', None)
+		if tags:
+			self.invalidate(*tags)
+
+	def on_after_rollback(self, session):
+		session.info.pop('page_cache_tags', None)
+
+
+#由flush中变化的对象推导需要失效的标签
+def changed_tags(session):
+	from .models import Post, Comment, User, Follow
+	tags = set()
+	for obj in session.new | session.deleted:
+		if isinstance(obj, Post):
+			tags.update(['posts', 'user:%s' % obj.author_id])
+			if obj.id is not None:
+				tags.add('post:%d' % obj.id)
+		elif isinstance(obj, Comment):
+			tags.add('comments:%s' % obj.post_id)
+		elif isinstance(obj, Follow):
+			tags.update(['user:%s' % obj.follower_id,
+						 'user:%s' % obj.followed_id])
+		elif isinstance(obj, User) and obj.id is not None:
+			tags.add('user:%d' % obj.id)
+	for obj in session.dirty:
+		#只关心列的变化，关系集合的追加(如新增评论)由上面的new处理
+		state = inspect(obj)
+		changed = [attr.key for attr in state.mapper.column_attrs
+				   if state.attrs[attr.key].history.has_changes()]
+		if not changed:
+			continue
+		if isinstance(obj, Post):
+			tags.add('post:%d' % obj.id)
+		elif isinstance(obj, Comment):
+			tags.add('comments:%s' % obj.post_id)
+		elif isinstance(obj, User) and changed != ['last_seen']:
+			#只更新了最近访问时间时不失效，页面上的相对时间允许在超时内过期
+			tags.add('user:%d' % obj.id)
+	return tags
@@ -20,3 +20,9 @@ def permission_required(permission):
 
 def admin_required(f):
 	return permission_required(Permission.ADMINISTER)(f)
+
+
+#会写数据库的GET视图，其中的读取也走主库(见app.routing)
+def use_primary(f):
+	f.use_primary = True
+	return f
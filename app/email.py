@@ -1,20 +1,273 @@
-from threading import Thread
+# -*- coding:UTF-8 -*-
+#邮件先写入数据库中的持久化队列，再由后台工作线程分批取出发送
+
+import atexit
+import smtplib
+import time
+import uuid
+from datetime import datetime, timedelta
+from threading import Thread, Lock, Event
+from sqlalchemy import event
 from flask import current_app, render_template
-from flask_mail import Message
-from . import mail
+from flask_mail import Message, BadHeaderError
+
+
+#只影响单封邮件的错误：收件人、发件人或内容被拒绝，地址或邮件头不合法；SMTP连接仍可继续使用
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused,
+				  smtplib.SMTPDataError, smtplib.SMTPNotSupportedError,
+				  BadHeaderError, ValueError)
+
+
+#5xx回复和本地的地址错误重试也不会成功
+def permanent(error):
+	if isinstance(error, smtplib.SMTPRecipientsRefused):
+		return all(code >= 500 for code, message in error.recipients.values())
+	if isinstance(error, smtplib.SMTPResponseException):
+		return error.smtp_code >= 500
+	return isinstance(error, (BadHeaderError, ValueError))
+
+
+#连续失败达到阈值后熔断一段时间，冷却后放行一次试探
+class CircuitBreaker(object):
+	def __init__(self, threshold=5, cooldown=60):
+		self.threshold = threshold
+		self.cooldown = cooldown
+		self.failures = 0
+		self.opened_at = None
+		self.lock = Lock()
+
+	@property
+	def state(self):
+		if self.opened_at is None:
+			return 'closed'
+		if time.time() - self.opened_at >= self.cooldown:
+			return 'half-open'
+		return 'open'
+
+	def allow(self):
+		with self.lock:
+			if self.state == 'open':
+				return False
+			if self.state == 'half-open':
+				#只放行一个试探请求，其余继续等待
+				self.opened_at = time.time()
+			return True
+
+	def success(self):
+		with self.lock:
+			self.failures = 0
+			self.opened_at = None
+
+	def failure(self):
+		with self.lock:
+			self.failures += 1
+			if self.failures >= self.threshold:
+				self.opened_at = time.time()
+
+
+#从mail_queue表中领取邮件，由固定数量的工作线程复用SMTP连接批量发送
+class MailSpooler(object):
+	def __init__(self, app=None):
+		self.app = None
+		self.workers = []
+		self.lock = Lock()
+		self.stopping = Event()
+		self.wakeup = Event()
+		self.breaker = CircuitBreaker()
+		self.metrics = {'sent': 0, 'retried': 0, 'dead': 0, 'batches': 0,
+						'latency_total': 0.0, 'latency_max': 0.0}
+		atexit.register(self.stop)
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		self.app = app
+		self.worker_count = app.config['FLASKY_MAIL_WORKERS']
+		self.inprocess = app.config['FLASKY_MAIL_INPROCESS']
+		self.batch_size = app.config['FLASKY_MAIL_BATCH_SIZE']
+		self.max_attempts = app.config['FLASKY_MAIL_MAX_ATTEMPTS']
+		self.backoff = app.config['FLASKY_MAIL_BACKOFF']
+		self.lease = app.config['FLASKY_MAIL_LEASE']
+		self.poll_interval = app.config['FLASKY_MAIL_POLL_INTERVAL']
+		self.breaker = CircuitBreaker(app.config['FLASKY_MAIL_BREAKER_THRESHOLD'],
+									  app.config['FLASKY_MAIL_BREAKER_COOLDOWN'])
+
+	def start(self, count=None):
+		with self.lock:
+			if self.workers:
+				return
+			self.stopping.clear()
+			for i in range(count or self.worker_count):
+				worker = Thread(target=self.run, name='mail-worker-%d' % i)
+				worker.daemon = True
+				worker.start()
+				self.workers.append(worker)
+
+	def stop(self):
+		self.stopping.set()
+		self.wakeup.set()
+		with self.lock:
+			workers, self.workers = self.workers, []
+		for worker in workers:
+			worker.join(5)
+
+	#有新邮件入队时唤醒空闲的工作线程；进程内模式下第一次入队时启动线程
+	def notify(self):
+		if self.inprocess and not self.workers:
+			self.start()
+		self.wakeup.set()
+
+	#入队的邮件提交后才唤醒工作线程，否则工作线程可能在提交前查询而错过新邮件；回滚则不唤醒
+	def listen(self, session):
+		event.listen(session, 'after_commit', self.on_after_commit)
+		event.listen(session, 'after_rollback', self.on_after_rollback)
+
+	def on_after_commit(self, session):
+		if session.info.pop('mail_queued', None):
+			self.notify()
+
+	def on_after_rollback(self, session):
+		session.info.pop('mail_queued', None)
+
+	def run(self):
+		from . import db
+		with self.app.app_context():
+			while not self.stopping.is_set():
+				try:
+					sent = self.process_batch()
+				except Exception:
+					sent = 0
+					db.session.rollback()
+					self.app.logger.exception('Mail worker failed')
+				finally:
+					db.session.remove()
+				if not sent:
+					self.wakeup.wait(self.poll_interval)
+					self.wakeup.clear()
+
+	#先选出到期的id，再用带条件的UPDATE打上领取标记，多个线程或进程不会重复发送
+	def claim(self):
+		from . import db
+		from .models import QueuedMail
+		now = datetime.utcnow()
+		token = uuid.uuid4().hex
+		ready = db.or_(
+			db.and_(QueuedMail.status == 'pending',
+					QueuedMail.next_attempt <= now),
+			db.and_(QueuedMail.status == 'sending',
+					QueuedMail.claimed_at < now - timedelta(seconds=self.lease)))
+		ids = [id for id, in db.session.query(QueuedMail.id).filter(ready).order_by(
+			QueuedMail.id).limit(self.batch_size)]
+		if not ids:
+			db.session.rollback()
+			return []
+		QueuedMail.query.filter(QueuedMail.id.in_(ids), ready).update(
+			{'status': 'sending', 'claimed_by': token, 'claimed_at': now},
+			synchronize_session=False)
+		db.session.commit()
+		return QueuedMail.query.filter_by(claimed_by=token,
+										  status='sending').all()
+
+	def process_batch(self):
+		from . import db, mail
+		if not self.breaker.allow():
+			return 0
+		queued = self.claim()
+		if not queued:
+			return 0
+		sent = 0
+		done = 0
+		try:
+			with mail.connect() as connection:
+				for item in queued:
+					try:
+						msg = Message(item.subject, sender=item.sender,
+									  recipients=item.recipients.split(','))
+						msg.body = item.body
+						msg.html = item.html
+						connection.send(msg)
+					except MESSAGE_ERRORS as e:
+						#只有这封邮件重试或进入死信，不计入熔断
+						self._retry(item, e, permanent(e))
+						self.app.logger.warning('Mail %d rejected: %r' % (item.id, e))
+					else:
+						self._sent(item)
+						sent += 1
+					done += 1
+			self.breaker.success()
+		except Exception as e:
+			#连接层面的错误：整批未处理的邮件按退避时间重新排队
+			self.breaker.failure()
+			for item in queued[done:]:
+				self._retry(item, e)
+			self.app.logger.warning('SMTP delivery failed: %r' % e)
+		with self.lock:
+			self.metrics['batches'] += 1
+		db.session.commit()
+		return sent
+
+	def _sent(self, item):
+		item.status = 'sent'
+		item.sent_at = datetime.utcnow()
+		item.attempts = (item.attempts or 0) + 1
+		latency = (item.sent_at - item.created_at).total_seconds()
+		with self.lock:
+			self.metrics['sent'] += 1
+			self.metrics['latency_total'] += latency
+			self.metrics['latency_max'] = max(self.metrics['latency_max'], latency)
+
+	def _retry(self, item, error, permanent=False):
+		item.attempts = (item.attempts or 0) + 1
+		item.last_error = repr(error)
+		item.claimed_by = None
+		if permanent or item.attempts >= self.max_attempts:
+			item.status = 'dead'
+			key = 'dead'
+		else:
+			item.status = 'pending'
+			item.next_attempt = datetime.utcnow() + timedelta(
+				seconds=self.backoff * 2 ** (item.attempts - 1))
+			key = 'retried'
+		with self.lock:
+			self.metrics[key] += 1
 
+	def stats(self):
+		from .models import QueuedMail
+		with self.lock:
+			stats = dict(self.metrics)
+		stats['depth'] = QueuedMail.query.filter(
+			QueuedMail.status.in_(['pending', 'sending'])).count()
+		stats['breaker'] = self.breaker.state
+		stats['workers'] = len(self.workers)
+		return stats
 
-def send_async_email(app, msg):
-	with app.app_context():
-		mail.send(msg)
+	#只导出内存中的计数，不查询队列深度，写快照时不需要应用上下文
+	def collect(self):
+		with self.lock:
+			stats = dict(self.metrics)
+		return [
+			('flasky_mail_sent_total', (), stats['sent']),
+			('flasky_mail_failures_total', (('outcome', 'retried'),),
+			 stats['retried']),
+			('flasky_mail_failures_total', (('outcome', 'dead'),), stats['dead']),
+			('flasky_mail_batches_total', (), stats['batches']),
+			('flasky_mail_latency_seconds_total', (), stats['latency_total']),
+			('flasky_mail_breaker_open', (),
+			 0 if self.breaker.state == 'closed' else 1),
+			('flasky_mail_workers', (), len(self.workers)),
+		]
 
 
+#邮件写入持久化队列，随请求一起提交，提交后由MailSpooler异步发送
 def send_email(to, subject, template, **kwargs):
+	from . import db, mail_spooler
+	from .models import QueuedMail
 	app = current_app._get_current_object()
-	msg = Message(app.config['FLASKY_MAIL_SUBJECT_PREFIX'] + ' ' + subject,
-				  sender=app.config['FLASKY_MAIL_SENDER'], recipients=[to])
-	msg.body = render_template(template + '.txt', **kwargs)
-	msg.html = render_template(template + '.html', **kwargs)
-	thr = Thread(target=send_async_email, args=[app, msg])
-	thr.start()
-	return thr
\ No newline at end of file
+	queued = QueuedMail(
+		sender=app.config['FLASKY_MAIL_SENDER'], recipients=to,
+		subject=app.config['FLASKY_MAIL_SUBJECT_PREFIX'] + ' ' + subject,
+		body=render_template(template + '.txt', **kwargs),
+		html=render_template(template + '.html', **kwargs))
+	db.session.add(queued)
+	db.session.info['mail_queued'] = True
+	return queued
@@ -1,3 +1,13 @@
 #ValidationError异常
 class ValidationError(ValueError):
-	pass
\ No newline at end of file
+	pass
+
+
+#后台资源(如密码散列进程池)过载时抛出，API返回503
+class ServiceUnavailable(Exception):
+	pass
+
+
+#条件GET命中时中断视图，由conditional_get修饰器转换为304响应
+class NotModified(Exception):
+	pass
@@ -0,0 +1,209 @@
+# -*- coding:UTF-8 -*-
+#关注关系的成员判断：每个用户关注的人和关注者各保存为一个有序的整数数组，
+#进程内按LRU缓存(一级)，可选的共享目录作为各进程共用的二级缓存，
+#关注和取消关注提交后使两端用户的缓存失效，命中时用二分查找判断，不执行SQL
+
+import array
+import os
+import tempfile
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from threading import Lock
+from sqlalchemy import event
+
+
+FOLLOWED = 'followed'
+FOLLOWERS = 'followers'
+
+
+def contains(ids, id):
+	i = bisect_left(ids, id)
+	return i < len(ids) and ids[i] == id
+
+
+#二级缓存：每个数组一个文件，按id分目录，先写临时文件再改名
+class DirectoryStore(object):
+	def __init__(self, directory, ttl):
+		self.directory = directory
+		self.ttl = ttl
+
+	def _path(self, kind, user_id):
+		return os.path.join(self.directory, kind, '%02x' % (user_id % 256),
+							'%d' % user_id)
+
+	#超过有效期的文件视为不存在，防止失效与回填交错时留下的旧数据长期有效
+	def get(self, kind, user_id):
+		path = self._path(kind, user_id)
+		try:
+			if os.path.getmtime(path) < time.time() - self.ttl:
+				return None
+			with open(path, 'rb') as f:
+				data = f.read()
+		except (IOError, OSError):
+			return None
+		ids = array.array('i')
+		ids.frombytes(data)
+		return ids
+
+	def set(self, kind, user_id, ids):
+		path = self._path(kind, user_id)
+		folder = os.path.dirname(path)
+		if not os.path.isdir(folder):
+			os.makedirs(folder, exist_ok=True)
+		descriptor, temporary = tempfile.mkstemp(suffix='.tmp', dir=folder)
+		with os.fdopen(descriptor, 'wb') as f:
+			f.write(ids.tobytes())
+		os.replace(temporary, path)
+
+	def delete(self, kind, user_id):
+		try:
+			os.remove(self._path(kind, user_id))
+		except OSError:
+			pass
+
+
+class FollowGraph(object):
+	def __init__(self, app=None):
+		self.entries = OrderedDict()
+		self.lock = Lock()
+		self.size = 1000000
+		self.ttl = 60
+		self.total = 0
+		self.store = None
+		if app is not None:
+			self.init_app(app)
+
+	#缓存的内容属于程序所连接的数据库，重新初始化时清空
+	def init_app(self, app):
+		self.clear()
+		self.size = app.config['FLASKY_FOLLOW_CACHE_SIZE']
+		self.ttl = app.config['FLASKY_FOLLOW_CACHE_TTL']
+		directory = app.config['FLASKY_FOLLOW_CACHE_DIR']
+		self.store = None
+		if directory:
+			self.store = DirectoryStore(
+				directory, app.config['FLASKY_FOLLOW_CACHE_SHARED_TTL'])
+
+	#一级缓存按数组中id的总数限制内存，超过时淘汰最久未用的数组
+	def _get(self, key):
+		with self.lock:
+			entry = self.entries.get(key)
+			if entry is None:
+				return None
+			if entry[0] < time.time():
+				self._drop(key)
+				return None
+			self.entries.move_to_end(key)
+			return entry[1]
+
+	def _put(self, key, ids):
+		with self.lock:
+			self._drop(key)
+			self.entries[key] = (time.time() + self.ttl, ids)
+			self.total += len(ids)
+			while self.total > self.size and len(self.entries) > 1:
+				self._drop(next(iter(self.entries)))
+
+	def _drop(self, key):
+		entry = self.entries.pop(key, None)
+		if entry is not None:
+			self.total -= len(entry[1])
+
+	#会话中还有未flush的关注变化时先flush，与原来查询时的自动flush行为一致
+	def _autoflush(self):
+		from . import db
+		from .models import Follow
+		session = db.session()
+		if session.autoflush and any(isinstance(obj, Follow) for obj in
+									 session.new | session.deleted):
+			session.flush()
+
+	def _load(self, kind, user_id):
+		from . import db
+		from .models import Follow
+		key = (kind, user_id)
+		ids = self._get(key)
+		if ids is not None:
+			return ids
+		if self.store is not None:
+			ids = self.store.get(kind, user_id)
+		if ids is None:
+			if kind == FOLLOWED:
+				column, condition = Follow.followed_id, Follow.follower_id == user_id
+			else:
+				column, condition = Follow.follower_id, Follow.followed_id == user_id
+			with db.primary():
+				ids = array.array('i', [id for id, in db.session.query(column).filter(
+					condition).order_by(column)])
+			if self.store is not None:
+				self.store.set(kind, user_id, ids)
+		self._put(key, ids)
+		return ids
+
+	#用户关注的人，按id有序
+	def followed(self, user_id):
+		self._autoflush()
+		return self._load(FOLLOWED, user_id)
+
+	#用户的关注者，按id有序
+	def followers(self, user_id):
+		self._autoflush()
+		return self._load(FOLLOWERS, user_id)
+
+	#优先使用已经缓存的一端，都未缓存时读取关注者一方的关注列表，通常比被关注者的关注者列表小得多
+	def is_following(self, follower_id, followed_id):
+		if follower_id is None or followed_id is None:
+			return False
+		self._autoflush()
+		followed = self._get((FOLLOWED, follower_id))
+		if followed is None:
+			followers = self._get((FOLLOWERS, followed_id))
+			if followers is not None:
+				return contains(followers, follower_id)
+			followed = self._load(FOLLOWED, follower_id)
+		return contains(followed, followed_id)
+
+	def follows_you(self, user_id, viewer_id):
+		return self.is_following(user_id, viewer_id)
+
+	def is_mutual(self, user_id, other_id):
+		return self.is_following(user_id, other_id) and \
+			self.is_following(other_id, user_id)
+
+	def invalidate(self, *user_ids):
+		with self.lock:
+			for user_id in user_ids:
+				self._drop((FOLLOWED, user_id))
+				self._drop((FOLLOWERS, user_id))
+		if self.store is not None:
+			for user_id in user_ids:
+				self.store.delete(FOLLOWED, user_id)
+				self.store.delete(FOLLOWERS, user_id)
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+			self.total = 0
+
+	#flush时立即失效(同一事务中的后续判断从数据库读到新关系)，提交或回滚后再失效一次，
+	#清除事务进行期间其他线程读入的旧数据或本事务未提交的数据
+	def listen(self, session):
+		event.listen(session, 'after_flush', self.on_after_flush)
+		event.listen(session, 'after_commit', self.on_after_end)
+		event.listen(session, 'after_rollback', self.on_after_end)
+
+	def on_after_flush(self, session, flush_context):
+		from .models import Follow
+		user_ids = set()
+		for obj in session.new | session.deleted:
+			if isinstance(obj, Follow):
+				user_ids.update([obj.follower_id, obj.followed_id])
+		if user_ids:
+			self.invalidate(*user_ids)
+			session.info.setdefault('follow_graph_users', set()).update(user_ids)
+
+	def on_after_end(self, session):
+		user_ids = session.info.pop('follow_graph_users', None)
+		if user_ids:
+			self.invalidate(*user_ids)
@@ -0,0 +1,266 @@
+# -*- coding:UTF-8 -*-
+#索引顾问：收集语句指纹(度量快照中的缓慢语句、日志或一次爬取中执行的语句)，
+#逐条EXPLAIN，找出全表扫描和额外排序，按"等值列 + 排序列/范围列"推导复合索引，
+#跳过已有索引能覆盖的候选，生成一个供人工审阅的Alembic迁移
+
+import json
+import os
+import re
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from .metrics import normalize, fingerprint
+
+
+_slow_log = re.compile(r'Slow query \[(\w+)\] [\d.]+s: (.*)$')
+_order_by = re.compile(r'\bORDER BY (.*?)(?:\bLIMIT\b|\bOFFSET\b|\bFOR UPDATE\b|\)|$)',
+					   re.IGNORECASE)
+_explainable = re.compile(r'^\s*(SELECT|UPDATE|DELETE)\b', re.IGNORECASE)
+
+
+#度量快照(FLASKY_METRICS_DIR)中各进程记录的缓慢语句
+def from_snapshots(directory):
+	statements = OrderedDict()
+	if not directory or not os.path.isdir(directory):
+		return statements
+	for name in sorted(os.listdir(directory)):
+		if not name.endswith('.json'):
+			continue
+		try:
+			with open(os.path.join(directory, name)) as f:
+				statements.update(json.load(f).get('statements', {}))
+		except (IOError, OSError, ValueError):
+			continue
+	return statements
+
+
+#app.metrics写出的"Slow query [指纹] 秒数: 语句"日志行，其他行当作原始SQL
+def from_log(path):
+	statements = OrderedDict()
+	with open(path) as f:
+		for line in f:
+			match = _slow_log.search(line)
+			statement = match.group(2) if match else line
+			if _explainable.match(statement):
+				statement = normalize(statement)
+				statements[fingerprint(statement)] = statement
+	return statements
+
+
+#归一化后的语句用固定的字面量代替占位符，使EXPLAIN可以执行；计划只用于判断访问路径
+def explainable(statement):
+	if not _explainable.match(statement):
+		return None
+	statement = statement.replace('(?...)', '(1, 2)')
+	return statement.replace('?', '1')
+
+
+#各数据库的EXPLAIN输出统一成(表, 问题, 原始计划行)
+def explain(connection, statement, order_tables=()):
+	dialect = connection.dialect.name
+	findings = []
+	if dialect == 'sqlite':
+		for row in connection.execute('EXPLAIN QUERY PLAN ' + statement):
+			detail = row[-1]
+			match = re.match(r'SCAN (?:TABLE )?(\w+)(.*)', detail)
+			if match and 'INDEX' not in match.group(2):
+				findings.append((match.group(1), 'full scan', detail))
+			elif match:
+				findings.append((match.group(1), 'index scan', detail))
+			elif 'TEMP B-TREE' in detail:
+				findings.extend((table, 'filesort', detail) for table in order_tables)
+	elif dialect == 'mysql':
+		for row in connection.execute('EXPLAIN ' + statement):
+			row = dict(row.items())
+			extra = row.get('Extra') or ''
+			detail = '%s type=%s key=%s %s' % (row.get('table'), row.get('type'),
+											   row.get('key'), extra)
+			if row.get('type') == 'ALL':
+				findings.append((row.get('table'), 'full scan', detail))
+			elif row.get('type') == 'index':
+				findings.append((row.get('table'), 'index scan', detail))
+			if 'filesort' in extra or 'temporary' in extra:
+				findings.append((row.get('table'), 'filesort', detail))
+	else:
+		for row in connection.execute('EXPLAIN ' + statement):
+			detail = row[0].strip()
+			match = re.search(r'Seq Scan on (\w+)', detail)
+			if match:
+				findings.append((match.group(1), 'full scan', detail))
+			elif re.match(r'(->\s*)?(Incremental )?Sort\b', detail):
+				findings.extend((table, 'filesort', detail) for table in order_tables)
+	return findings
+
+
+def order_columns(statement):
+	columns = []
+	for match in _order_by.finditer(statement):
+		for term in match.group(1).split(','):
+			name = re.match(r'\s*(\w+)\.(\w+)', term)
+			if name:
+				columns.append((name.group(1), name.group(2)))
+	return columns
+
+
+def equality_columns(clause, table):
+	columns = [match.group(1) for match in re.finditer(
+		r'\b%s\.(\w+)\s*(?:=|\bIN\b|\bIS NULL\b)' % table, clause)]
+	columns.extend(match.group(1) for match in re.finditer(
+		r'=\s*%s\.(\w+)' % table, clause))
+	return columns
+
+
+#先放等值条件中的列(WHERE中没有时才用连接条件中的列)，再放排序列，没有排序时放第一个范围条件的列；
+#返回候选列和判断是否已覆盖时比较的前缀长度(等值列加第一个排序或范围列)
+def candidate(statement, table):
+	where = statement.find(' WHERE ')
+	columns = equality_columns(statement[where:], table) if where >= 0 else []
+	if not columns:
+		columns = equality_columns(statement, table)
+	columns = list(OrderedDict.fromkeys(columns))
+	key_length = len(columns)
+	ordered = [column for name, column in order_columns(statement) if name == table]
+	if not ordered:
+		ordered = re.findall(r'\b%s\.(\w+)\s*(?:<=?|>=?|\bBETWEEN\b)' % table,
+							 statement)[:1]
+	for column in ordered:
+		if column not in columns:
+			columns.append(column)
+	if len(columns) > key_length:
+		key_length += 1
+	return columns, key_length
+
+
+#已有索引(含主键和唯一约束)的前缀与候选相同即认为已覆盖
+def existing_indexes(inspector, table):
+	indexes = [index['column_names'] for index in inspector.get_indexes(table)]
+	primary = inspector.get_pk_constraint(table).get('constrained_columns')
+	if primary:
+		indexes.append(primary)
+	for constraint in inspector.get_unique_constraints(table):
+		indexes.append(constraint['column_names'])
+	return indexes
+
+
+def covered(columns, indexes):
+	return any(list(index[:len(columns)]) == columns for index in indexes)
+
+
+def index_name(table, columns):
+	return ('ix_%s_%s' % (table, '_'.join(columns)))[:60]
+
+
+#返回每条语句的计划问题和建议，以及去重后需要新建的索引{(表, 列元组): [指纹...]}
+def advise(connection, statements):
+	from sqlalchemy import inspect
+	inspector = inspect(connection)
+	tables = set(inspector.get_table_names())
+	report = []
+	suggestions = OrderedDict()
+	for key, statement in statements.items():
+		sql = explainable(statement)
+		if sql is None:
+			continue
+		order_tables = list(OrderedDict.fromkeys(
+			name for name, column in order_columns(sql) if name in tables))
+		try:
+			findings = explain(connection, sql, order_tables)
+		except Exception as e:
+			report.append({'fingerprint': key, 'statement': statement,
+						   'error': str(e).splitlines()[0], 'findings': [],
+						   'indexes': []})
+			continue
+		indexes = []
+		for table in OrderedDict.fromkeys(table for table, problem, detail
+										  in findings if table in tables):
+			columns, key_length = candidate(sql, table)
+			if columns and not covered(columns[:key_length],
+									   existing_indexes(inspector, table)):
+				indexes.append((table, tuple(columns)))
+				suggestions.setdefault((table, tuple(columns)), []).append(key)
+		report.append({'fingerprint': key, 'statement': statement, 'error': None,
+					   'findings': findings, 'indexes': indexes})
+	return report, suggestions
+
+
+def format_report(report):
+	lines = []
+	for entry in report:
+		if not entry['findings'] and not entry['error']:
+			continue
+		lines.append('[%s] %s' % (entry['fingerprint'], entry['statement'][:200]))
+		if entry['error']:
+			lines.append('    EXPLAIN failed: %s' % entry['error'])
+		for table, problem, detail in entry['findings']:
+			lines.append('    %-9s %-10s %s' % (problem, table, detail))
+		for table, columns in entry['indexes']:
+			lines.append('    suggest   %s(%s)' % (table, ', '.join(columns)))
+	return '\n'.join(lines)
+
+
+MIGRATION = '''"""advised indexes
+
+Revision ID: {revision}
+Revises: {down_revision}
+Create Date: {date}
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '{revision}'
+down_revision = '{down_revision}'
+branch_labels = None
+depends_on = None
+
+
+# 由 manage.py indexes advise 生成，合并前请逐条审阅
+def upgrade():
+{upgrade}
+
+
+def downgrade():
+{downgrade}
+'''
+
+
+def render_migration(suggestions, down_revision, revision=None):
+	revision = revision or uuid.uuid4().hex[-12:]
+	upgrade, downgrade = [], []
+	for (table, columns), keys in suggestions.items():
+		name = index_name(table, columns)
+		upgrade.append('    # %s' % ', '.join(keys))
+		upgrade.append('    op.create_index(%r, %r, %r, unique=False)'
+					   % (name, table, list(columns)))
+		downgrade.insert(0, '    op.drop_index(%r, table_name=%r)' % (name, table))
+	return revision, MIGRATION.format(
+		revision=revision, down_revision=down_revision,
+		date=datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f'),
+		upgrade='\n'.join(upgrade) or '    pass',
+		downgrade='\n'.join(downgrade) or '    pass')
+
+
+#按基准测试的场景把每个端点请求一次，记录执行过的全部语句
+def crawl(app):
+	from . import db
+	from .bench import Benchmark
+	statements = OrderedDict()
+	benchmark = Benchmark(app, requests=1, concurrency=1, writes=False)
+
+	#只记录被测量的请求中执行的语句(QueryStats.reset()过的线程)，
+	#不包括挑选测试对象、登录等准备工作中的查询
+	def record(conn, cursor, statement, parameters, context, executemany):
+		if not hasattr(benchmark.stats.local, 'statements'):
+			return
+		normalized = normalize(statement)
+		statements.setdefault(fingerprint(normalized), normalized)
+	with app.app_context():
+		engine = db.engine
+	db.event.listen(engine, 'before_cursor_execute', record)
+	try:
+		benchmark.run()
+	finally:
+		db.event.remove(engine, 'before_cursor_execute', record)
+	return statements
@@ -1,8 +1,9 @@
 # -*- coding:UTF-8 -*-
 #蓝本中的错误处理程序
 
-from flask import render_template, request
+from flask import render_template, request, jsonify
 from . import main
+from ..exceptions import ServiceUnavailable
 
 
 @main.app_errorhandler(404)
@@ -17,4 +18,15 @@ def page_not_found(e):
 
 @main.app_errorhandler(500)
 def internal_server_error(e):
-	return render_template('500.html'), 500
\ No newline at end of file
+	return render_template('500.html'), 500
+
+
+#后台资源过载(如密码散列队列已满)时返回503，API蓝本有自己的JSON处理程序
+@main.app_errorhandler(ServiceUnavailable)
+def service_unavailable(e):
+	if request.accept_mimetypes.accept_json and \
+	not request.accept_mimetypes.accept_html:
+		response = jsonify({'error': 'service unavailable', 'message': e.args[0]})
+		response.status_code = 503
+		return response
+	return render_template('503.html'), 503
@@ -61,3 +61,9 @@ class PostForm(FlaskForm):
 class CommentForm(FlaskForm):
 	body = StringField('', validators=[DataRequired()])
 	submit = SubmitField('提交')
+
+
+#评论审核表单，勾选的评论id由复选框提交
+class ModerateForm(FlaskForm):
+	enable = SubmitField('授权所选')
+	disable = SubmitField('禁用所选')
@@ -1,24 +1,53 @@
 
-from .. import db
+from .. import db, page_cache, metrics
 from . import main
 from datetime import datetime
-from ..decorators import admin_required, permission_required
-from .forms import NameForm, EditProfileForm, PostForm, CommentForm
-from ..models import Permission, Role, User, Post, Comment
+from ..decorators import admin_required, permission_required, use_primary
+from .forms import NameForm, EditProfileForm, PostForm, CommentForm, ModerateForm
+from ..models import Permission, Role, User, Post, Comment, load_authors
+from ..pagination import paginate_by_cursor, LAST_PAGE
+from ..search import search as full_text_search, load_hits
+from ..avatars import valid_hash, avatar_size, load_avatar
+from flask_sqlalchemy import Pagination
 from flask_login import login_required, current_user
-from flask_sqlalchemy import get_debug_queries
-from flask import render_template, session, redirect, url_for, current_app, flash, request, make_response
-
-#报告缓慢的数据库查询
-@main.after_app_request
-def after_request(response):
-	for query in get_debug_queries():
-		if query.duration >= current_app.config['FLASKY_DB_QUERY_TIMEOUT']:
-			current_app.logger.warning(
-				'Slow query:%s\nParameters: %s\nDuration: %fs\nContext: %s\n'
-				% (query.statement, query.parameters, query.duration,
-				 query.context))
-	return response
+from flask import render_template, session, redirect, url_for, current_app, flash, request, make_response, abort
+
+#整页缓存依赖的文章和作者标签
+def post_tags(items):
+	tags = set()
+	for item in items:
+		tags.add('post:%d' % getattr(item, 'post_id', item.id))
+		tags.add('user:%s' % item.author_id)
+	return tags
+
+
+#Prometheus度量，管理员登录后访问，或由抓取程序用管理员的API令牌作为Basic认证的用户名
+@main.route('/metrics')
+def metrics_view():
+	user = current_user
+	if not user.is_administrator() and request.authorization:
+		user = User.verify_auth_token(request.authorization.username)
+	if user is None or not user.is_administrator():
+		abort(403)
+	return current_app.response_class(
+		metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+#头像图片：地址由散列值和尺寸唯一确定，内容不会变化，允许浏览器和代理缓存一年
+@main.route('/avatar/<hash>/<int:size>')
+def avatar(hash, size):
+	if not valid_hash(hash):
+		abort(404)
+	sizes = current_app.config['FLASKY_AVATAR_SIZES']
+	if size not in sizes:
+		return redirect(url_for('.avatar', hash=hash, size=avatar_size(size, sizes)), 301)
+	response = current_app.response_class(
+		load_avatar(current_app.config['FLASKY_AVATAR_DIR'], hash, size),
+		mimetype='image/png')
+	response.set_etag('%s-%d' % (hash, size))
+	response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+	return response.make_conditional(request)
+
 
 #关闭服务器的路由
 @main.route('/shutdown')
@@ -40,18 +69,18 @@ def index():
 					author=current_user._get_current_object())
 		db.session.add(post)
 		return redirect(url_for('.index'))
-	page = request.args.get('page', 1, type=int)
 	show_followed = False
 	if current_user.is_authenticated:
 		show_followed = bool(request.cookies.get('show_followed', ''))
 	if show_followed:
-		query = current_user.followed_posts
+		query = current_user.timeline
 	else:
 		query = Post.query
-	pagination = query.order_by(Post.timestamp.desc()).paginate(
-		page, per_page=current_app.config['FLASKY_POSTS_PER_PAGE'],
-		error_out=False)
-	posts = pagination.items
+	pagination = paginate_by_cursor(
+		query, Post, request.args.get('cursor'),
+		per_page=current_app.config['FLASKY_POSTS_PER_PAGE'], error_out=True)
+	posts = load_authors(pagination.items)
+	page_cache.tag('posts', *post_tags(posts))
 	return render_template('index.html', form=form, posts=posts,
 						   show_followed=show_followed, pagination=pagination)
 
@@ -62,8 +91,17 @@ def user(username):
 	user = User.query.filter_by(username=username).first()
 	if user is None:
 		abort(404)
-	posts = user.posts.order_by(Post.timestamp.desc()).all()
-	return render_template('user.html', user=user, posts=posts)
+	pagination = paginate_by_cursor(
+		user.posts, Post, request.args.get('cursor'),
+		per_page=current_app.config['FLASKY_POSTS_PER_PAGE'], error_out=True)
+	posts = pagination.items
+	page_cache.tag('user:%d' % user.id, *post_tags(posts))
+	#关注推荐只显示在自己的资料页上
+	suggestions = []
+	if current_user.is_authenticated and current_user.id == user.id:
+		suggestions = user.suggestions(current_app.config['FLASKY_SUGGESTIONS_SHOWN'])
+	return render_template('user.html', user=user, posts=posts,
+						   pagination=pagination, suggestions=suggestions)
 
 
 #资料编辑路由
@@ -95,6 +133,8 @@ def edit_profile_admin(id):
 		user.email = form.email.data
 		user.username = form.username.data
 		user.confirmed = form.confirmed.data
+		if user.role_id != form.role.data:
+			user.revoke_auth_tokens()
 		user.role = Role.query.get(form.role.data)
 		user.name = form.name.data
 		user.location = form.location.data
@@ -122,14 +162,17 @@ def post(id):
 		comment = Comment(body=form.body.data, post=post, author=current_user._get_current_object())
 		db.session.add(comment)
 		flash('你的评论已发表.')
-		return redirect(url_for('.post', id=post.id, page=-1))
-	page = request.args.get('page', 1, type=int)
-	if page == -1:
-		page = (post.comments.count() - 1) / \
-		current_app.config['FLASKY_COMMENTS_PER_PAGE'] + 1
-	pagination = post.comments.order_by(Comment.timestamp.asc()).paginate(
-		page, per_page=current_app.config['FLASKY_COMMENTS_PER_PAGE'], error_out=False)
+		return redirect(url_for('.post', id=post.id, cursor=LAST_PAGE))
+	cursor = request.args.get('cursor')
+	if request.args.get('page', type=int) == -1:
+		cursor = LAST_PAGE
+	pagination = paginate_by_cursor(
+		post.comments, Comment, cursor,
+		per_page=current_app.config['FLASKY_COMMENTS_PER_PAGE'],
+		ascending=True, error_out=True)
 	comments = pagination.items
+	load_authors([post] + comments)
+	page_cache.tag('comments:%d' % post.id, *post_tags([post] + comments))
 	return render_template('post.html', posts=[post], form=form, comments=comments, pagination=pagination)
 
 
@@ -153,21 +196,38 @@ def edit(id):
 
 #‘关注’路由和视图函数
 @main.route('/follow/<username>')
+@use_primary
 @login_required
 @permission_required(Permission.FOLLOW)
 def follow(username):
 	user =  User.query.filter_by(username=username).first()
-	if user in None:
+	if user is None:
 		flash('无效的用户')
 		return redirect(url_for('.index'))
-	if current_user.is_following(user):
+	if not current_user.follow(user):
 		flash('你已经关注这个用户了')
 		return redirect(url_for('.user', username=username))
-	current_user.follow(user)
 	flash('你有新的关注者 %s.' %username )
 	return redirect(url_for('.user', username=username))
 
 
+#‘取消关注’路由和视图函数
+@main.route('/unfollow/<username>')
+@use_primary
+@login_required
+@permission_required(Permission.FOLLOW)
+def unfollow(username):
+	user = User.query.filter_by(username=username).first()
+	if user is None:
+		flash('无效的用户')
+		return redirect(url_for('.index'))
+	if not current_user.unfollow(user):
+		flash('你没有关注这个用户')
+		return redirect(url_for('.user', username=username))
+	flash('你已取消关注 %s.' % username)
+	return redirect(url_for('.user', username=username))
+
+
 #‘关注者’路由和视图函数
 @main.route('/followers/<username>')
 def followers(username):
@@ -216,39 +276,78 @@ def show_followed():
 	return resp
 
 
-#管理评论的路由
-@main.route('/moderate')
+#搜索文章和评论，结果按相关度排序
+@main.route('/search')
+def search():
+	q = request.args.get('q', '').strip()
+	type = request.args.get('type')
+	if type not in ('post', 'comment'):
+		type = None
+	page = request.args.get('page', 1, type=int)
+	per_page = current_app.config['FLASKY_SEARCH_RESULTS_PER_PAGE']
+	if page < 1 or page * per_page > current_app.config['FLASKY_SEARCH_MAX_RESULTS']:
+		abort(404)
+	hits, total = full_text_search(q, type, per_page, (page - 1) * per_page)
+	results = load_hits(hits)
+	load_authors([item for hit_type, item, score in results])
+	pagination = Pagination(None, page, per_page, total, results)
+	return render_template('search.html', q=q, type=type, results=results,
+						   pagination=pagination)
+
+
+def moderation_state():
+	show = request.args.get('show', 'enabled')
+	if show not in ('enabled', 'disabled'):
+		abort(404)
+	return show
+
+
+#评论审核队列：按状态过滤，由(disabled, timestamp, id)索引做游标分页；
+#勾选的评论一次提交，用一条UPDATE批量授权或禁用
+@main.route('/moderate', methods=['GET', 'POST'])
 @login_required
 @permission_required(Permission.MODERATE_COMMENTS)
 def moderate():
-	page = request.args.get('page', 1, type=int)
-	pagination = Comment.query.order_by(Comment.timestamp.desc()).paginate(
-		page, per_page=current_app.config['FLASKY_COMMENTS_PER_PAGE'],
-		error_out=False)
-	comments = pagination.items
-	return render_template('moderate.html', comments=comments,
-						   pagination=pagination, page=page)
+	show = moderation_state()
+	cursor = request.args.get('cursor')
+	form = ModerateForm()
+	if form.validate_on_submit() and (form.enable.data or form.disable.data):
+		ids = request.form.getlist('id', type=int)
+		if len(ids) > current_app.config['FLASKY_MODERATION_BATCH_LIMIT']:
+			abort(400)
+		changed = Comment.set_disabled(ids, bool(form.disable.data))
+		flash('已%s %d 条评论.' % ('禁用' if form.disable.data else '授权', len(changed)))
+		return redirect(url_for('.moderate', show=show, cursor=cursor))
+	pagination = paginate_by_cursor(
+		Comment.query.filter(Comment.disabled == (show == 'disabled')), Comment,
+		cursor, per_page=current_app.config['FLASKY_COMMENTS_PER_PAGE'],
+		error_out=True)
+	comments = load_authors(pagination.items)
+	return render_template('moderate.html', form=form, comments=comments,
+						   pagination=pagination, cursor=cursor, show=show)
 
 
 #评论管理路由
 @main.route('/moderate/enable/<int:id>')
+@use_primary
 @login_required
 @permission_required(Permission.MODERATE_COMMENTS)
 def moderate_enable(id):
 	comment = Comment.query.get_or_404(id)
-	comment.disabled = False
-	db.session.add(comment)
-	return redirect(url_for('.moderate', page=request.args.get('page', 1, type=int)))
+	Comment.set_disabled([comment.id], False)
+	return redirect(url_for('.moderate', show=moderation_state(),
+							cursor=request.args.get('cursor')))
 
 
 @main.route('/moderate/disable/<int:id>')
+@use_primary
 @login_required
 @permission_required(Permission.MODERATE_COMMENTS)
 def moderate_disable(id):
 	comment = Comment.query.get_or_404(id)
-	comment.disabled = True
-	db.session.add(comment)
-	return redirect(url_for('.moderate', page=request.args.get('page', 1, type=int)))
+	Comment.set_disabled([comment.id], True)
+	return redirect(url_for('.moderate', show=moderation_state(),
+							cursor=request.args.get('cursor')))
 
 
 
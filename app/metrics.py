@@ -0,0 +1,416 @@
+# -*- coding:UTF-8 -*-
+#轻量的请求度量：按端点统计请求延迟、每个请求的SQL语句数和耗时、模板渲染时间，
+#并按归一化后的语句指纹记录缓慢查询，以Prometheus文本格式输出。
+#多进程部署时各进程由后台线程定期把快照写到FLASKY_METRICS_DIR，输出时合并所有进程的快照；
+#超过FLASKY_METRICS_SNAPSHOT_TTL秒没有更新的快照(已退出的进程)并入归档文件后删除，
+#计数器不会因为进程退出而倒退
+
+import binascii
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from flask import request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+HISTOGRAMS = {
+	'flasky_request_duration_seconds':
+		('Request latency by endpoint.', LATENCY_BUCKETS),
+	'flasky_request_sql_statements':
+		('SQL statements executed per request.', SQL_COUNT_BUCKETS),
+	'flasky_request_sql_seconds':
+		('Time spent in SQL per request.', SQL_SECONDS_BUCKETS),
+	'flasky_template_render_seconds':
+		('Template render time.', LATENCY_BUCKETS),
+}
+COUNTERS = {
+	'flasky_requests_total': 'Requests by endpoint, method and status.',
+	'flasky_slow_statements_total': 'Statements slower than FLASKY_DB_QUERY_TIMEOUT.',
+	'flasky_slow_statement_seconds_total': 'Total time of slow statements.',
+	'flasky_password_operations_total': 'Password hashes and verifications.',
+	'flasky_password_rejected_total': 'Password operations rejected by the queue limit.',
+	'flasky_password_failures_total': 'Password operations that timed out or failed.',
+	'flasky_password_seconds_total': 'Total time of password operations.',
+	'flasky_mail_sent_total': 'Queued mails delivered.',
+	'flasky_mail_failures_total': 'Failed deliveries by outcome (retried or dead).',
+	'flasky_mail_batches_total': 'Mail batches processed.',
+	'flasky_mail_latency_seconds_total': 'Total time from queueing to delivery.',
+}
+GAUGES = {
+	'flasky_password_in_flight': 'Password operations queued or running.',
+	'flasky_mail_breaker_open': 'Processes whose SMTP circuit breaker is not closed.',
+	'flasky_mail_workers': 'Running mail worker threads.',
+}
+
+ARCHIVE = 'metrics-archive.json'
+
+_literals = [
+	(re.compile(r"'(?:[^']|'')*'"), '?'),
+	(re.compile(r'%\(\w+\)s|%s|:\w+|\$\d+'), '?'),
+	(re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+	(re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(?...)'),
+	(re.compile(r'\s+'), ' '),
+]
+
+
+#把语句中的字面量和占位符统一成?，IN列表折叠成一项，相同形状的语句得到相同的指纹
+def normalize(statement):
+	for pattern, replacement in _literals:
+		statement = pattern.sub(replacement, statement)
+	return statement.strip()
+
+
+def fingerprint(statement):
+	return hashlib.md5(statement.encode('utf-8')).hexdigest()[:12]
+
+
+def _escape(value):
+	return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels):
+	if not labels:
+		return ''
+	return '{%s}' % ','.join('%s="%s"' % (name, _escape(str(value)))
+							 for name, value in labels)
+
+
+#把多个快照按名称和标签相加
+def merge(snapshots):
+	histograms, counters, gauges, statements = {}, {}, {}, {}
+	for snapshot in snapshots:
+		for name, labels, entry in snapshot['histograms']:
+			key = tuple(tuple(label) for label in labels)
+			merged = histograms.setdefault(name, {}).get(key)
+			if merged is None:
+				histograms[name][key] = list(entry)
+			else:
+				for i, value in enumerate(entry):
+					merged[i] += value
+		for name, labels, value in snapshot['counters']:
+			key = tuple(tuple(label) for label in labels)
+			series = counters.setdefault(name, {})
+			series[key] = series.get(key, 0) + value
+		for name, labels, value in snapshot.get('gauges', ()):
+			key = tuple(tuple(label) for label in labels)
+			series = gauges.setdefault(name, {})
+			series[key] = series.get(key, 0) + value
+		statements.update(snapshot['statements'])
+	return histograms, counters, gauges, statements
+
+
+def as_snapshot(histograms, counters, gauges, statements):
+	return {
+		'histograms': [[name, list(labels), list(entry)]
+					   for name, series in histograms.items()
+					   for labels, entry in series.items()],
+		'counters': [[name, list(labels), value]
+					 for name, series in counters.items()
+					 for labels, value in series.items()],
+		'gauges': [[name, list(labels), value]
+				   for name, series in gauges.items()
+				   for labels, value in series.items()],
+		'statements': dict(statements)}
+
+
+class Metrics(object):
+	def __init__(self, app=None):
+		self.app = None
+		self.lock = threading.Lock()
+		self.local = threading.local()
+		self.directory = None
+		self.interval = 5
+		self.snapshot_ttl = 60
+		self.process = None
+		#(进程号, 定期写快照的线程)
+		self.refresher = (None, None)
+		self.slow_threshold = 0.5
+		self.slow_limit = 200
+		self.collectors = []
+		self.reset()
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		self.app = app
+		self.directory = app.config['FLASKY_METRICS_DIR']
+		self.interval = app.config['FLASKY_METRICS_FLUSH_INTERVAL']
+		self.snapshot_ttl = app.config['FLASKY_METRICS_SNAPSHOT_TTL']
+		self.slow_threshold = app.config['FLASKY_DB_QUERY_TIMEOUT']
+		self.slow_limit = app.config['FLASKY_METRICS_SLOW_STATEMENTS']
+		if self.directory:
+			os.makedirs(self.directory, exist_ok=True)
+		app.before_request(self.start_request)
+		app.after_request(self.finish_request)
+		before_render_template.connect(self.start_render, app)
+		template_rendered.connect(self.finish_render, app)
+		if not event.contains(Engine, 'before_cursor_execute', self.before_execute):
+			event.listen(Engine, 'before_cursor_execute', self.before_execute)
+			event.listen(Engine, 'after_cursor_execute', self.after_execute)
+
+	#collector()返回其他组件自己累计的[(名称, 标签, 值), ...]，名称在COUNTERS或GAUGES中，
+	#写快照时一并写入
+	def add_collector(self, collector):
+		if collector not in self.collectors:
+			self.collectors.append(collector)
+
+	def reset(self):
+		with self.lock:
+			#{名称: {标签元组: [各桶计数..., 总和, 次数]}}
+			self.histograms = {}
+			#{名称: {标签元组: 值}}
+			self.counters = {}
+			#{指纹: 归一化后的语句}
+			self.statements = {}
+
+	def observe(self, name, labels, value):
+		buckets = HISTOGRAMS[name][1]
+		with self.lock:
+			series = self.histograms.setdefault(name, {})
+			entry = series.get(labels)
+			if entry is None:
+				entry = series[labels] = [0] * len(buckets) + [0.0, 0]
+			for i, bound in enumerate(buckets):
+				if value <= bound:
+					entry[i] += 1
+			entry[-2] += value
+			entry[-1] += 1
+
+	def increment(self, name, labels, value=1):
+		with self.lock:
+			series = self.counters.setdefault(name, {})
+			series[labels] = series.get(labels, 0) + value
+
+	def start_request(self):
+		self.local.request_started = time.time()
+		self.local.statements = 0
+		self.local.sql_seconds = 0.0
+
+	def finish_request(self, response):
+		started = getattr(self.local, 'request_started', None)
+		if started is None:
+			return response
+		self.local.request_started = None
+		endpoint = request.endpoint or 'unknown'
+		self.observe('flasky_request_duration_seconds',
+					 (('endpoint', endpoint), ('method', request.method)),
+					 time.time() - started)
+		self.observe('flasky_request_sql_statements',
+					 (('endpoint', endpoint),), self.local.statements)
+		self.observe('flasky_request_sql_seconds',
+					 (('endpoint', endpoint),), self.local.sql_seconds)
+		self.increment('flasky_requests_total',
+					   (('endpoint', endpoint), ('method', request.method),
+						('status', str(response.status_code))))
+		if self.directory:
+			self.start_refresher()
+		return response
+
+	def start_render(self, app, template, context):
+		stack = getattr(self.local, 'renders', None)
+		if stack is None:
+			stack = self.local.renders = []
+		stack.append(time.time())
+
+	def finish_render(self, app, template, context):
+		stack = getattr(self.local, 'renders', None)
+		if stack:
+			self.observe('flasky_template_render_seconds',
+						 (('template', template.name or 'string'),),
+						 time.time() - stack.pop())
+
+	def before_execute(self, conn, cursor, statement, parameters, context,
+					   executemany):
+		self.local.sql_started = time.time()
+
+	def after_execute(self, conn, cursor, statement, parameters, context,
+					  executemany):
+		started = getattr(self.local, 'sql_started', None)
+		if started is None:
+			return
+		elapsed = time.time() - started
+		self.local.sql_started = None
+		if getattr(self.local, 'request_started', None) is not None:
+			self.local.statements += 1
+			self.local.sql_seconds += elapsed
+		if elapsed >= self.slow_threshold:
+			self.record_slow(statement, elapsed)
+
+	#缓慢语句按指纹聚合，指纹数量有上限，超过后归入other
+	def record_slow(self, statement, elapsed):
+		normalized = normalize(statement)
+		key = fingerprint(normalized)
+		with self.lock:
+			if key not in self.statements:
+				if len(self.statements) >= self.slow_limit:
+					key = 'other'
+				self.statements.setdefault(key, normalized)
+		labels = (('fingerprint', key),)
+		self.increment('flasky_slow_statements_total', labels)
+		self.increment('flasky_slow_statement_seconds_total', labels, elapsed)
+		if self.app is not None:
+			self.app.logger.warning('Slow query [%s] %.3fs: %s'
+									% (key, elapsed, normalized))
+
+	def snapshot(self):
+		collected = [[name, list(labels), value] for collector in self.collectors
+					 for name, labels, value in collector()]
+		with self.lock:
+			return {
+				'histograms': [[name, list(labels), list(entry)]
+							   for name, series in self.histograms.items()
+							   for labels, entry in series.items()],
+				'counters': [[name, list(labels), value]
+							 for name, series in self.counters.items()
+							 for labels, value in series.items()] +
+							[item for item in collected if item[0] in COUNTERS],
+				'gauges': [item for item in collected if item[0] in GAUGES],
+				'statements': dict(self.statements)}
+
+	#快照文件名带上进程号和随机数，进程号被复用时也不会与旧进程的快照混在一起
+	def snapshot_name(self):
+		pid = os.getpid()
+		if self.process is None or self.process[0] != pid:
+			nonce = binascii.hexlify(os.urandom(4)).decode('ascii')
+			self.process = (pid, 'metrics-%d-%s.json' % (pid, nonce))
+		return self.process[1]
+
+	#先写临时文件再改名，读取方不会看到写了一半的快照
+	def flush(self):
+		if not self.directory:
+			return
+		path = os.path.join(self.directory, self.snapshot_name())
+		with open(path + '.tmp', 'w') as f:
+			json.dump(self.snapshot(), f)
+		os.replace(path + '.tmp', path)
+
+	#空闲的进程也要定期刷新快照，否则会被当成已退出的进程；线程在fork出的子进程中重新启动
+	def start_refresher(self):
+		pid, thread = self.refresher
+		if pid == os.getpid() and thread is not None and thread.is_alive():
+			return
+		with self.lock:
+			pid, thread = self.refresher
+			if pid == os.getpid() and thread is not None and thread.is_alive():
+				return
+			thread = threading.Thread(target=self.refresh, name='metrics-flush')
+			thread.daemon = True
+			thread.start()
+			self.refresher = (os.getpid(), thread)
+
+	def refresh(self):
+		while True:
+			time.sleep(self.interval)
+			try:
+				self.flush()
+			except (IOError, OSError):
+				if self.app is not None:
+					self.app.logger.exception('Failed to write metrics snapshot')
+
+	#先把过期的快照改名认领(只有一个进程能成功)，再在文件锁内把所有认领的快照
+	#并入归档；计量值(gauge)是瞬时值，不归档
+	def archive(self, expired):
+		for path in expired:
+			try:
+				os.rename(path, path[:-len('.json')] + '.expired')
+			except OSError:
+				continue
+		with open(os.path.join(self.directory, 'archive.lock'), 'a') as lock:
+			fcntl.flock(lock, fcntl.LOCK_EX)
+			claimed = [os.path.join(self.directory, name)
+					   for name in os.listdir(self.directory)
+					   if name.endswith('.expired')]
+			if not claimed:
+				return
+			archive = os.path.join(self.directory, ARCHIVE)
+			snapshots = []
+			for path in [archive] + claimed:
+				try:
+					with open(path) as f:
+						snapshots.append(json.load(f))
+				except (IOError, OSError, ValueError):
+					continue
+			histograms, counters, gauges, statements = merge(snapshots)
+			with open(archive + '.tmp', 'w') as f:
+				json.dump(as_snapshot(histograms, counters, {}, statements), f)
+			os.replace(archive + '.tmp', archive)
+			for path in claimed:
+				os.remove(path)
+
+	#合并所有进程的快照和已退出进程的归档
+	def collect(self):
+		if not self.directory:
+			return [self.snapshot()]
+		self.flush()
+		expired = time.time() - self.snapshot_ttl
+		names = [name for name in os.listdir(self.directory)
+				 if name.endswith('.json')]
+		stale = []
+		for name in names:
+			path = os.path.join(self.directory, name)
+			try:
+				if name != ARCHIVE and os.path.getmtime(path) < expired:
+					stale.append(path)
+			except OSError:
+				continue
+		if stale:
+			self.archive(stale)
+		snapshots = []
+		for name in os.listdir(self.directory):
+			if not name.endswith('.json'):
+				continue
+			try:
+				with open(os.path.join(self.directory, name)) as f:
+					snapshots.append(json.load(f))
+			except (IOError, OSError, ValueError):
+				continue
+		return snapshots
+
+	def render(self):
+		histograms, counters, gauges, statements = merge(self.collect())
+		lines = []
+		for name in sorted(histograms):
+			help, buckets = HISTOGRAMS[name]
+			lines.append('# HELP %s %s' % (name, help))
+			lines.append('# TYPE %s histogram' % name)
+			for labels in sorted(histograms[name]):
+				entry = histograms[name][labels]
+				for bound, count in zip(buckets, entry):
+					lines.append('%s_bucket%s %d' % (
+						name, _labels(labels + (('le', repr(float(bound))),)),
+						count))
+				lines.append('%s_bucket%s %d' % (
+					name, _labels(labels + (('le', '+Inf'),)), entry[-1]))
+				lines.append('%s_sum%s %r' % (name, _labels(labels),
+											  float(entry[-2])))
+				lines.append('%s_count%s %d' % (name, _labels(labels), entry[-1]))
+		for name in sorted(counters):
+			lines.append('# HELP %s %s' % (name, COUNTERS[name]))
+			lines.append('# TYPE %s counter' % name)
+			for labels in sorted(counters[name]):
+				lines.append('%s%s %r' % (name, _labels(labels),
+										  float(counters[name][labels])))
+		for name in sorted(gauges):
+			lines.append('# HELP %s %s' % (name, GAUGES[name]))
+			lines.append('# TYPE %s gauge' % name)
+			for labels in sorted(gauges[name]):
+				lines.append('%s%s %r' % (name, _labels(labels),
+										  float(gauges[name][labels])))
+		if statements:
+			name = 'flasky_slow_statement_info'
+			lines.append('# HELP %s Normalized text of each slow statement '
+						 'fingerprint.' % name)
+			lines.append('# TYPE %s gauge' % name)
+			for key in sorted(statements):
+				lines.append('%s%s 1' % (name, _labels(
+					(('fingerprint', key), ('statement', statements[key][:1000])))))
+		return '\n'.join(lines) + '\n'
@@ -1,15 +1,18 @@
 # -*- coding:UTF-8 -*-
 
-import bleach
 import hashlib
 from datetime import datetime
-from markdown import markdown
-from . import db, login_manager
-from flask import current_app, request, url_for
+from . import db, login_manager, renderer, last_seen_buffer, password_hasher, \
+	follow_graph, page_cache
+from flask import current_app, url_for
 from flask_login import UserMixin, AnonymousUserMixin
+from sqlalchemy.orm.attributes import set_committed_value
 from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
-from werkzeug.security import generate_password_hash, check_password_hash
 from app.exceptions import ValidationError
+from app.tokens import generate_token, verify_token, epochs as token_epochs
+from app.search import index_document, index_documents, remove_document, \
+	remove_documents
+from app.avatars import avatar_size
 
 #权限常量
 class Permission:
@@ -55,6 +58,47 @@ class Role(db.Model):
 		return '<Role %r>' % self.name
 
 
+#在flush时原子地增减计数列，避免读取时再做COUNT
+def update_counter(connection, model, column, id, delta, **values):
+	if id is None:
+		return
+	table = model.__table__
+	values[column] = table.c[column] + delta
+	connection.execute(table.update().where(table.c.id == id).values(values))
+
+
+#用一次GROUP BY扫描重算计数列，再按主键批量写回，不依赖外键列上的索引
+def recount_column(model, column, key):
+	table = model.__table__
+	counts = db.session.query(key, db.func.count()).group_by(key).all()
+	db.session.execute(table.update().values({column: 0}))
+	if counts:
+		db.session.execute(table.update().where(
+			table.c.id == db.bindparam('_id')).values(
+			{column: db.bindparam('_count')}),
+			[{'_id': id, '_count': count} for id, count in counts
+			 if id is not None])
+
+
+#补渲染超时后body_html留空的正文，按主键分批；仍然超时的行继续留空，返回补上的行数
+def rerender_bodies(model, profile, batch_size):
+	done = 0
+	last_id = 0
+	while True:
+		items = model.query.filter(model.id > last_id, model.body_html == None,
+								   model.body != None).order_by(model.id).limit(
+			batch_size).all()
+		if not items:
+			return done
+		last_id = items[-1].id
+		for item, html in zip(items, renderer.render_many(
+				[item.body for item in items], profile)):
+			if html is not None:
+				item.body_html = html
+				done += 1
+		db.session.commit()
+
+
 #关注关联表的模型
 class Follow(db.Model):
 	__tablename__ = 'follows'
@@ -63,6 +107,116 @@ class Follow(db.Model):
 	followed_id = db.Column(db.Integer, db.ForeignKey('users.id'),
 							primary_key=True)
 	timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+	#关注时只回填了此时间及之后的文章，更早的文章读取时从posts表取；为空表示已全部回填
+	timeline_since = db.Column(db.DateTime)
+	#主键以follower_id开头，按被关注者查找(关注者列表、推送时间线)需要单独的索引，
+	#带上follower_id后这些查询只读索引
+	__table_args__ = (db.Index('ix_follows_followed_follower',
+							   'followed_id', 'follower_id'),)
+
+	#关注时回填被关注者最近的文章，取消关注时清除其文章；
+	#同时记下关注者的关注列表变化时间，下次manage.py suggest增量重算相关用户的推荐
+	@staticmethod
+	def on_insert(mapper, connection, target):
+		update_counter(connection, User, 'followed_count', target.follower_id, 1,
+					   follows_changed_at=datetime.utcnow())
+		update_counter(connection, User, 'follower_count', target.followed_id, 1)
+		Timeline.backfill(connection, target.follower_id, target.followed_id)
+		Timeline.check_pull_mode(connection, target.followed_id)
+
+	@staticmethod
+	def on_delete(mapper, connection, target):
+		update_counter(connection, User, 'followed_count', target.follower_id, -1,
+					   follows_changed_at=datetime.utcnow())
+		update_counter(connection, User, 'follower_count', target.followed_id, -1)
+		Timeline.purge(connection, target.follower_id, target.followed_id)
+
+db.event.listen(Follow, 'after_insert', Follow.on_insert)
+db.event.listen(Follow, 'after_delete', Follow.on_delete)
+
+
+#物化的关注文章时间线，新文章写入时推送给所有关注者
+class Timeline(db.Model):
+	__tablename__ = 'timelines'
+	user_id = db.Column(db.Integer, db.ForeignKey('users.id'),
+						primary_key=True)
+	post_id = db.Column(db.Integer, db.ForeignKey('posts.id'),
+						primary_key=True)
+	author_id = db.Column(db.Integer)
+	timestamp = db.Column(db.DateTime)
+	__table_args__ = (db.Index('ix_timelines_user_timestamp',
+							   'user_id', 'timestamp', 'post_id'),)
+
+	#把一篇新文章推送到作者所有关注者的时间线，拉取模式的作者除外
+	@staticmethod
+	def fan_out(connection, post_id):
+		follows = Follow.__table__
+		posts = Post.__table__
+		users = User.__table__
+		timelines = Timeline.__table__
+		source = db.select([follows.c.follower_id, posts.c.id,
+							posts.c.author_id, posts.c.timestamp]).select_from(
+			posts.join(follows, follows.c.followed_id == posts.c.author_id)
+			.join(users, users.c.id == posts.c.author_id)).where(
+			db.and_(posts.c.id == post_id, users.c.timeline_pull.isnot(True)))
+		connection.execute(timelines.insert().from_select(
+			['user_id', 'post_id', 'author_id', 'timestamp'], source))
+
+	#最多回填作者最近的FLASKY_TIMELINE_BACKFILL篇文章(与边界同一时间的也一并回填)，
+	#截断时把边界记在关注记录上，更早的文章由User.timeline从posts表读取
+	@staticmethod
+	def backfill(connection, user_id, author_id):
+		posts = Post.__table__
+		users = User.__table__
+		follows = Follow.__table__
+		timelines = Timeline.__table__
+		pull = connection.scalar(db.select([users.c.timeline_pull]).where(
+			users.c.id == author_id))
+		if pull:
+			return
+		since = connection.scalar(db.select([posts.c.timestamp]).where(
+			posts.c.author_id == author_id).order_by(
+			posts.c.timestamp.desc()).offset(
+			current_app.config['FLASKY_TIMELINE_BACKFILL'] - 1).limit(1))
+		condition = posts.c.author_id == author_id
+		if since is not None:
+			condition = db.and_(condition, posts.c.timestamp >= since)
+		source = db.select([db.literal(user_id), posts.c.id,
+							posts.c.author_id, posts.c.timestamp]).where(condition)
+		connection.execute(timelines.insert().from_select(
+			['user_id', 'post_id', 'author_id', 'timestamp'], source))
+		connection.execute(follows.update().where(db.and_(
+			follows.c.follower_id == user_id,
+			follows.c.followed_id == author_id)).values(timeline_since=since))
+
+	@staticmethod
+	def purge(connection, user_id, author_id):
+		timelines = Timeline.__table__
+		connection.execute(timelines.delete().where(db.and_(
+			timelines.c.user_id == user_id,
+			timelines.c.author_id == author_id)))
+
+	#关注者太多的用户不再推送，由读者在读取时拉取
+	@staticmethod
+	def check_pull_mode(connection, author_id):
+		users = User.__table__
+		count = connection.scalar(db.select([users.c.follower_count]).where(
+			users.c.id == author_id))
+		if count > current_app.config['FLASKY_TIMELINE_FANOUT_LIMIT']:
+			connection.execute(users.update().where(
+				db.and_(users.c.id == author_id,
+						users.c.timeline_pull.isnot(True))).values(
+				timeline_pull=True))
+
+	#按关注关系重建所有时间线
+	@staticmethod
+	def rebuild():
+		Timeline.query.delete()
+		connection = db.session.connection()
+		for follow in Follow.query.yield_per(1000):
+			Timeline.backfill(connection, follow.follower_id,
+							  follow.followed_id)
+		db.session.commit()
 
 
 #User模型
@@ -80,6 +234,16 @@ class User(UserMixin, db.Model):
 	member_since = db.Column(db.DateTime(), default=datetime.utcnow)
 	last_seen = db.Column(db.DateTime(), default=datetime.utcnow)
 	avatar_hash = db.Column(db.String(32))
+	timeline_pull = db.Column(db.Boolean, default=False)
+	#递增后此前签发的所有API令牌失效
+	token_epoch = db.Column(db.Integer, default=0)
+	#由Post、Follow的flush事件维护的计数，manage.py recount可修复偏差
+	post_count = db.Column(db.Integer, default=0)
+	follower_count = db.Column(db.Integer, default=0)
+	followed_count = db.Column(db.Integer, default=0)
+	#关注列表最近变化的时间和关注推荐最近计算的时间，前者较新时推荐需要重算
+	follows_changed_at = db.Column(db.DateTime)
+	suggestions_at = db.Column(db.DateTime)
 	posts = db.relationship('Post', backref='author', lazy='dynamic')
 	#使用两个一对多关系实现多对多关系
 	followed = db.relationship('Follow',
@@ -115,11 +279,17 @@ class User(UserMixin, db.Model):
 	#注册密码
 	@password.setter
 	def password(self,password):
-		self.password_hash = generate_password_hash(password)
+		self.password_hash = password_hasher.hash(password)
+		self.revoke_auth_tokens()
 	
-	#验证密码
+	#验证密码，散列参数已改变时顺便用新参数重新散列
 	def verify_password(self, password):
-		return check_password_hash(self.password_hash, password)
+		if not password_hasher.verify(self.password_hash, password):
+			return False
+		if password_hasher.needs_rehash(self.password_hash):
+			self.password_hash = password_hasher.hash(password)
+			db.session.add(self)
+		return True
 	
 	def __repr__(self):
 		return '<User %r>' % self.username
@@ -142,10 +312,14 @@ class User(UserMixin, db.Model):
 		db.session.add(self)
 		return True
 
-	#刷新用户的最后访问时间
+	#刷新用户的最后访问时间，先写入缓冲区，由last_seen_buffer批量写回
 	def ping(self):
-		self.last_seen = datetime.utcnow()
-		db.session.add(self)
+		last_seen_buffer.record(self.id, datetime.utcnow())
+
+	#合并缓冲区中尚未写回的访问时间
+	@property
+	def last_seen_at(self):
+		return last_seen_buffer.get(self.id) or self.last_seen
 
 	def can(self, permissions):
 		return self.role is not None and (self.role.permissions & permissions) == permissions
@@ -154,19 +328,11 @@ class User(UserMixin, db.Model):
 	def is_administrator(self):
 		return self.can(Permission.ADMINISTER)
 
-	def ping(self):
-		self.last_seen = datetime.utcnow()
-		db.session.add(self)
-
-	#生成Gravatar URL
-	def gravatar(self, size=100, default='identicon', rating='g'):
-		if request.is_secure:
-			url = 'https://secure.gravatar.com/avatar'
-		else:
-			url = 'https://gravatar.com/avatar'
-		hash = hashlib.md5(self.email.encode('utf-8')).hexdigest()
-		return '{url}/{hash}?s={size}&d={default}&r={rating}'.format(
-			url=url, hash=hash, size=size, default=default, rating=rating)
+	#本地头像服务的URL，使用保存的avatar_hash，尺寸取允许的一档
+	def gravatar(self, size=100):
+		hash = self.avatar_hash or hashlib.md5(self.email.encode('utf-8')).hexdigest()
+		return url_for('main.avatar', hash=hash, size=avatar_size(
+			size, current_app.config['FLASKY_AVATAR_SIZES']))
 
 	def generate_email_change_token(self, new_email, expiration=3600):
 		s = Serializer(current_app.config['SECRET_KEY'], expiration)
@@ -191,15 +357,6 @@ class User(UserMixin, db.Model):
 		db.session.add(self)
 		return True
 
-	def gravatar(self, size=100, default='identicon', rating='g'):
-		if request.is_secure:
-			url = 'https://secure.gravatar.com/avatar'
-		else:
-			url = 'http://www.gravater.com/avatar'
-		hash = self.avatar_hash or hashlib.md5(self.email.encode('utf-8')).hexdigest()
-		return '{url}/{hash}?s={size}&d={default}&r={rating}'.format(
-			url=url, hash=hash, size=size, default=default, rating=rating)
-
 	#生成虚拟用户
 	@staticmethod
 	def generate_fake(count=100):
@@ -223,6 +380,14 @@ class User(UserMixin, db.Model):
 			except IntegrityError:
 				db.session.rollback()
 
+	#批量重算计数列
+	@staticmethod
+	def recount():
+		recount_column(User, 'post_count', Post.author_id)
+		recount_column(User, 'follower_count', Follow.followed_id)
+		recount_column(User, 'followed_count', Follow.follower_id)
+		db.session.commit()
+
 	#获取所关注用户的文章
 	@property
 	def followed_post(self):
@@ -237,54 +402,84 @@ class User(UserMixin, db.Model):
 				db.session.add(user)
 				db.session.commit()
 
+	#关注和取消关注以主库中的关注记录为准(follow_graph可能落后于其他进程的提交，只用于显示)，
+	#返回关注关系是否发生了变化
 	def follow(self, user):
-		if not self.is_following(user):
-			f = Follow(follower=self, followed=user)
-			db.session.add(f)
+		with db.primary():
+			if Follow.query.get((self.id, user.id)) is not None:
+				return False
+		db.session.add(Follow(follower=self, followed=user))
+		return True
 
 	def unfollow(self, user):
-		f = self.followed.filter_by(followed_id=user.id).first()
-		if f:
-			db.session.delete(f)
+		with db.primary():
+			f = Follow.query.get((self.id, user.id))
+		if f is None:
+			return False
+		db.session.delete(f)
+		return True
 
+	#关注关系的判断由follow_graph缓存，命中时不执行SQL
 	def is_following(self, user):
-		return self.followed.filter_by(
-			followed_id=user.id).first() is not None
+		return follow_graph.is_following(self.id, user.id)
 
 	def is_followed_by(self, user):
-		return self.followers.filter_by(
-			follower_id=user.id).first() is not None
+		return follow_graph.is_following(user.id, self.id)
+
+	def is_mutual_follow(self, user):
+		return follow_graph.is_mutual(self.id, user.id)
+
+	#离线计算的关注推荐，按主键一次读出，跳过计算之后已经关注的用户；返回(用户, 共同关注数)
+	def suggestions(self, limit=5):
+		rows = db.session.query(User, FollowSuggestion.mutual_count).join(
+			FollowSuggestion, FollowSuggestion.suggested_id == User.id).filter(
+			FollowSuggestion.user_id == self.id).order_by(FollowSuggestion.rank)
+		return [(user, mutual_count) for user, mutual_count in rows
+				if not self.is_following(user)][:limit]
 
 	@property
 	def followed_posts(self):
 		return Post.query.join(Follow, Follow.followed_id == Post.author_id).filter(Follow.follower_id == self.id)
 
-	#支持基于令牌的认证
-	def generate_quth_tolen(self, expiration):
-		s = Serializer(current_app.config·['SECRET_KEY'],
-					   expires_in=expiration)
-		return s.dumps({'id': self.id})
+	#读取物化时间线，再合并拉取模式作者的文章和回填边界之前的文章，供paginate_by_cursor使用
+	@property
+	def timeline(self):
+		pushed = Post.query.join(Timeline, Timeline.post_id == Post.id).filter(
+			Timeline.user_id == self.id)
+		pulled = self.followed_posts.join(
+			User, User.id == Post.author_id).filter(User.timeline_pull == True)
+		older = self.followed_posts.join(
+			User, User.id == Post.author_id).filter(
+			User.timeline_pull.isnot(True), Follow.timeline_since != None,
+			Post.timestamp < Follow.timeline_since)
+		return [(pushed, (Timeline.timestamp, Timeline.post_id)),
+				(pulled, (Post.timestamp, Post.id)),
+				(older, (Post.timestamp, Post.id))]
+
+	#支持基于令牌的认证，令牌自带权限声明，验证时不查询数据库
+	def generate_auth_token(self, expiration):
+		return generate_token(self, expiration)
 
 	@staticmethod
 	def verify_auth_token(token):
-		s = Serializer(current_app.config['SECRET_KEY'])
-		try:
-			data = s.loads(token)
-		except:
-			return None
-		return User.query.get(data['id'])
+		return verify_token(token)
+
+	def revoke_auth_tokens(self):
+		self.token_epoch = (self.token_epoch or 0) + 1
+		if self.id is not None:
+			token_epochs.set(self.id, self.token_epoch)
 
 	#将用户转换成JSON格式的序列化字典
 	def to_json(self):
 		json_user = {
-			'url': url_for('api.get_user', id=self.id, _external=Trne),
+			'url': url_for('api.get_user', id=self.id, _external=True),
 			'username': self.username,
 			'member_since': self.member_since,
-			'last_seen': self.last_seen,
+			'last_seen': self.last_seen_at,
 			'post': url_for('api.get_user_posts', id=self.id, _external=True),
 			'followed_posts': url_for('api.get_user_followed_posts',
 									  id=self.id, _external=True),
-			'post_count': self.posts.count()
+			'post_count': self.post_count
 		}
 		return json_user
 
@@ -297,10 +492,14 @@ class Post(db.Model):
 	__tablename__ = 'posts'
 	id = db.Column(db.Integer, primary_key=True)
 	body = db.Column(db.Text)
-	#body_html = db.Column(db.Text)
+	body_html = db.Column(db.Text)
 	timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
 	author_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+	comment_count = db.Column(db.Integer, default=0)
 	comments = db.relationship('Comment', backref='post', lazy='dynamic')
+	#用户主页按作者过滤、按(timestamp, id)分页
+	__table_args__ = (db.Index('ix_posts_author_timestamp',
+							   'author_id', 'timestamp', 'id'),)
 
 	#生成虚拟博客文章
 	@staticmethod
@@ -321,12 +520,32 @@ class Post(db.Model):
 	#在Post模型中处理Markdown文本
 	@staticmethod
 	def on_changed_body(target, value, oldvalue, initiator):
-		allowed_tags = ['a', 'abbr', 'acronym', 'b', 'blockquote', 'code',
-						'em', 'i', 'li', 'ol', 'pre', 'strong', 'ul',
-						'h1', 'h2', 'h3', 'p']
-		target.body_html = bleach.linkify(bleach.clean(
-			markdown(value, output_format='html'),
-			tags=allowed_tags, strip=True))
+		target.body_html = renderer.render(value, 'post')
+
+	@staticmethod
+	def on_insert(mapper, connection, target):
+		update_counter(connection, User, 'post_count', target.author_id, 1)
+		Timeline.fan_out(connection, target.id)
+		index_document(connection, 'post', target.id, target.body)
+
+	#正文改变时重建这篇文章的搜索索引
+	@staticmethod
+	def on_update(mapper, connection, target):
+		if db.inspect(target).attrs.body.history.has_changes():
+			index_document(connection, 'post', target.id, target.body)
+
+	@staticmethod
+	def on_delete(mapper, connection, target):
+		update_counter(connection, User, 'post_count', target.author_id, -1)
+		timelines = Timeline.__table__
+		connection.execute(timelines.delete().where(
+			timelines.c.post_id == target.id))
+		remove_document(connection, 'post', target.id)
+
+	@staticmethod
+	def recount():
+		recount_column(Post, 'comment_count', Comment.post_id)
+		db.session.commit()
 
 	#将文章转换成JSON格式的序列化字典
 	def to_json(self):
@@ -339,7 +558,7 @@ class Post(db.Model):
 							  _external=True),
 			'comments': url_for('api.get_post_comments', id=self.id,
 								_external=True),
-			'comment_count': self.comments.count()
+			'comment_count': self.comment_count
 		}
 		return json_post
 
@@ -352,6 +571,9 @@ class Post(db.Model):
 		return Post(body=body)
 
 db.event.listen(Post.body, 'set', Post.on_changed_body)
+db.event.listen(Post, 'after_insert', Post.on_insert)
+db.event.listen(Post, 'after_update', Post.on_update)
+db.event.listen(Post, 'before_delete', Post.on_delete)
 
 
 #方便在用户没检查用户是否登录前调用can等函数
@@ -365,6 +587,19 @@ class AnonymousUser(AnonymousUserMixin):
 login_manager.anonymous_user = AnonymousUser
 
 
+#用一次查询加载一页文章或评论的作者及其角色，避免模板中逐行懒加载
+def load_authors(items):
+	ids = set(item.author_id for item in items if item.author_id is not None)
+	if not ids:
+		return items
+	users = User.query.options(db.joinedload(User.role)).filter(
+		User.id.in_(ids)).all()
+	authors = dict((user.id, user) for user in users)
+	for item in items:
+		set_committed_value(item, 'author', authors.get(item.author_id))
+	return items
+
+
 #加载用户的回调函数
 @login_manager.user_loader
 def load_user(user_id):
@@ -378,17 +613,163 @@ class Comment(db.Model):
 	body = db.Column(db.Text)
 	body_html = db.Column(db.Text)
 	timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
-	disabled = db.Column(db.Boolean)
+	disabled = db.Column(db.Boolean, default=False)
 	author_id = db.Column(db.Integer, db.ForeignKey('users.id'))
 	post_id = db.Column(db.Integer, db.ForeignKey('posts.id'))
+	#文章页按文章过滤、按(timestamp, id)分页；审核队列按状态过滤、按(timestamp, id)分页
+	__table_args__ = (db.Index('ix_comments_post_timestamp',
+							   'post_id', 'timestamp', 'id'),
+					  db.Index('ix_comments_disabled_timestamp',
+							   'disabled', 'timestamp', 'id'))
 
 	@staticmethod
 	def on_changed_body(target, value, oldvalue, initiator):
-		allowed_tags = ['a', 'abbr', 'acronym', 'b', 'code', 'em', 'i', 'strong']
-		target.body_html = bleach.linkify(bleach.clean(markdown(value, output_format='html'),
-													   tags=allowed_tags, strip=True))
+		target.body_html = renderer.render(value, 'comment')
+
+	def to_json(self):
+		json_comment = {
+			'url': url_for('api.get_comment', id=self.id, _external=True),
+			'post': url_for('api.get_post', id=self.post_id, _external=True),
+			'body': self.body,
+			'body_html': self.body_html,
+			'timestamp': self.timestamp,
+			'author': url_for('api.get_user', id=self.author_id,
+							  _external=True),
+		}
+		return json_comment
+
+	@staticmethod
+	def from_json(json_comment):
+		body = json_comment.get('body')
+		if body is None or body == '':
+			raise ValidationError('comment does not have a body')
+		return Comment(body=body)
+
+	#被屏蔽的评论不进入搜索索引
+	def update_search_index(self, connection):
+		if self.disabled:
+			remove_document(connection, 'comment', self.id)
+		else:
+			index_document(connection, 'comment', self.id, self.body)
+
+	#批量授权或禁用：只取出状态确实变化的评论，用一条UPDATE修改，返回它们的id。
+	#集合式UPDATE不触发映射器事件和flush，搜索索引、会话中已加载的对象和整页缓存在这里显式更新
+	@staticmethod
+	def set_disabled(ids, disabled):
+		comments = Comment.__table__
+		connection = db.session.connection()
+		rows = connection.execute(db.select(
+			[comments.c.id, comments.c.body, comments.c.post_id]).where(db.and_(
+				comments.c.id.in_(ids), comments.c.disabled.isnot(disabled)))).fetchall()
+		changed = [row.id for row in rows]
+		if not changed:
+			return changed
+		connection.execute(comments.update().where(
+			comments.c.id.in_(changed)).values(disabled=disabled))
+		if disabled:
+			remove_documents(connection, 'comment', changed)
+		else:
+			index_documents(connection, 'comment', [(row.id, row.body) for row in rows])
+		mapper = db.inspect(Comment)
+		for id in changed:
+			comment = db.session.identity_map.get(
+				mapper.identity_key_from_primary_key([id]))
+			if comment is not None:
+				set_committed_value(comment, 'disabled', disabled)
+		page_cache.tag_session(db.session, *set(
+			'comments:%s' % row.post_id for row in rows))
+		return changed
+
+	@staticmethod
+	def on_insert(mapper, connection, target):
+		update_counter(connection, Post, 'comment_count', target.post_id, 1)
+		target.update_search_index(connection)
+
+	@staticmethod
+	def on_update(mapper, connection, target):
+		attrs = db.inspect(target).attrs
+		if attrs.body.history.has_changes() or \
+		attrs.disabled.history.has_changes():
+			target.update_search_index(connection)
+
+	@staticmethod
+	def on_delete(mapper, connection, target):
+		update_counter(connection, Post, 'comment_count', target.post_id, -1)
+		remove_document(connection, 'comment', target.id)
 
 db.event.listen(Comment.body, 'set', Comment.on_changed_body)
+db.event.listen(Comment, 'after_insert', Comment.on_insert)
+db.event.listen(Comment, 'after_update', Comment.on_update)
+db.event.listen(Comment, 'after_delete', Comment.on_delete)
+
+
+#离线计算的关注推荐，每个用户保存得分最高的若干个二度关注候选，由manage.py suggest写入
+class FollowSuggestion(db.Model):
+	__tablename__ = 'follow_suggestions'
+	user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+	rank = db.Column(db.Integer, primary_key=True, autoincrement=False)
+	suggested_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+	#关注的人中有多少人关注了候选用户
+	mutual_count = db.Column(db.Integer)
+	score = db.Column(db.Float)
+
+
+#复制心跳：只有一行，由app.routing定期在主库更新，比较主库和从库中的时间得到复制延迟
+class ReplicationHeartbeat(db.Model):
+	__tablename__ = 'replication_heartbeat'
+	id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+	timestamp = db.Column(db.DateTime)
+
+
+#全文搜索的文档表，记录每篇文章或评论的词数，用于BM25的长度归一化
+class SearchDocument(db.Model):
+	__tablename__ = 'search_documents'
+	doc_type = db.Column(db.String(8), primary_key=True)
+	doc_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+	length = db.Column(db.Integer)
+
+
+#全文搜索每类文档的文档数和总长度，随索引增量更新，用于BM25的平均文档长度
+class SearchStats(db.Model):
+	__tablename__ = 'search_stats'
+	doc_type = db.Column(db.String(8), primary_key=True)
+	documents = db.Column(db.Integer, default=0)
+	total_length = db.Column(db.BigInteger, default=0)
+
+
+#全文搜索的倒排表：词 -> (文档, 词频)
+class SearchPosting(db.Model):
+	__tablename__ = 'search_postings'
+	term = db.Column(db.String(64), primary_key=True)
+	doc_type = db.Column(db.String(8), primary_key=True)
+	doc_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+	tf = db.Column(db.Integer)
+	__table_args__ = (db.Index('ix_search_postings_document',
+							   'doc_type', 'doc_id'),)
+
+
+#持久化的待发邮件队列，由app.email.MailSpooler的工作线程发送
+class QueuedMail(db.Model):
+	__tablename__ = 'mail_queue'
+	id = db.Column(db.Integer, primary_key=True)
+	sender = db.Column(db.String(128))
+	recipients = db.Column(db.Text)
+	subject = db.Column(db.String(256))
+	body = db.Column(db.Text)
+	html = db.Column(db.Text)
+	status = db.Column(db.String(16), default='pending')
+	attempts = db.Column(db.Integer, default=0)
+	last_error = db.Column(db.Text)
+	created_at = db.Column(db.DateTime, default=datetime.utcnow)
+	next_attempt = db.Column(db.DateTime, default=datetime.utcnow)
+	claimed_by = db.Column(db.String(32), index=True)
+	claimed_at = db.Column(db.DateTime)
+	sent_at = db.Column(db.DateTime)
+	__table_args__ = (db.Index('ix_mail_queue_status_next_attempt',
+							   'status', 'next_attempt'),)
+
+	def __repr__(self):
+		return '<QueuedMail %r>' % self.id
 	
 
 
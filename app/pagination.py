@@ -0,0 +1,128 @@
+# -*- coding:UTF-8 -*-
+#基于(timestamp, id)的游标分页，每一页的代价与页码无关
+
+import base64
+from datetime import datetime, timedelta
+from flask import abort, g, has_app_context
+from sqlalchemy import and_, or_
+from .exceptions import ValidationError
+
+
+EPOCH = datetime(1970, 1, 1)
+#跳到最后一页(例如刚发表评论后)的特殊游标
+LAST_PAGE = 'last'
+
+
+def _to_micros(timestamp):
+	delta = timestamp - EPOCH
+	return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+#把翻页方向和排序键编码成不透明的令牌
+def encode_cursor(direction, timestamp, id):
+	raw = '%s:%d:%d' % (direction, _to_micros(timestamp), id)
+	return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+	try:
+		raw = base64.urlsafe_b64decode((token + '=' * (-len(token) % 4)).encode('ascii'))
+		direction, micros, id = raw.decode('utf-8').split(':')
+		if direction not in ('n', 'p'):
+			raise ValueError(direction)
+		return direction, EPOCH + timedelta(microseconds=int(micros)), int(id)
+	except (ValueError, TypeError, UnicodeError):
+		raise ValidationError('invalid cursor')
+
+
+#与Flask-SQLAlchemy的Pagination对象接口相近，供模板和API使用
+class CursorPagination(object):
+	cursor_mode = True
+
+	def __init__(self, items, per_page, has_prev, has_next):
+		self.items = items
+		self.per_page = per_page
+		self.has_prev = has_prev and bool(items)
+		self.has_next = has_next and bool(items)
+
+	@property
+	def prev_cursor(self):
+		if not self.has_prev:
+			return None
+		first = self.items[0]
+		return encode_cursor('p', first.timestamp, first.id)
+
+	@property
+	def next_cursor(self):
+		if not self.has_next:
+			return None
+		last = self.items[-1]
+		return encode_cursor('n', last.timestamp, last.id)
+
+
+#在一个按(时间戳列, id列)排序的查询上取limit行
+def _scan(query, keys, key, scan_asc, limit):
+	ts_col, id_col = keys
+	if key is not None:
+		timestamp, id = key
+		if scan_asc:
+			query = query.filter(or_(ts_col > timestamp,
+									 and_(ts_col == timestamp, id_col > id)))
+		else:
+			query = query.filter(or_(ts_col < timestamp,
+									 and_(ts_col == timestamp, id_col < id)))
+	if scan_asc:
+		query = query.order_by(ts_col.asc(), id_col.asc())
+	else:
+		query = query.order_by(ts_col.desc(), id_col.desc())
+	return query.limit(limit).all()
+
+
+#按(timestamp, id)做键集分页，只读取per_page + 1行，不做OFFSET和COUNT
+#query也可以是[(查询, (时间戳列, id列)), ...]，各自取行后按键归并去重
+def paginate_by_cursor(query, model, cursor=None, per_page=20,
+					   ascending=False, error_out=False):
+	key = None
+	if cursor == LAST_PAGE:
+		forward = False
+	elif cursor:
+		try:
+			direction, timestamp, id = decode_cursor(cursor)
+		except ValidationError:
+			if error_out:
+				abort(404)
+			raise
+		forward = direction == 'n'
+		key = (timestamp, id)
+	else:
+		forward = True
+
+	#向前翻页时按显示顺序扫描，向后翻页时反向扫描再倒序
+	scan_asc = ascending == forward
+	if isinstance(query, (list, tuple)):
+		sources = query
+	else:
+		sources = [(query, (model.timestamp, model.id))]
+	items = []
+	for source, keys in sources:
+		items.extend(_scan(source, keys, key, scan_asc, per_page + 1))
+	if len(sources) > 1:
+		items.sort(key=lambda item: (item.timestamp, item.id),
+				   reverse=not scan_asc)
+		merged, seen = [], set()
+		for item in items:
+			if item.id not in seen:
+				seen.add(item.id)
+				merged.append(item)
+		items = merged
+	more = len(items) > per_page
+	items = items[:per_page]
+	if forward:
+		pagination = CursorPagination(items, per_page, key is not None, more)
+	else:
+		items.reverse()
+		pagination = CursorPagination(items, per_page, more, key is not None)
+	#让条件GET在序列化之前比较这一页的校验值
+	if has_app_context() and g.get('conditional_window') is not None:
+		g.conditional_window(pagination)
+	return pagination
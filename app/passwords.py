@@ -0,0 +1,131 @@
+# -*- coding:UTF-8 -*-
+#密码散列和验证交给有界的进程池执行，避免PBKDF2占住请求线程
+
+import atexit
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from werkzeug.security import generate_password_hash, check_password_hash, \
+	DEFAULT_PBKDF2_ITERATIONS
+from .exceptions import ServiceUnavailable
+
+
+#'pbkdf2:sha256'和'pbkdf2:sha256:50000'这类写法统一成(算法, 散列函数, 迭代次数)
+def _parameters(method):
+	if not method.startswith('pbkdf2:'):
+		return (method,)
+	args = method[len('pbkdf2:'):].split(':')
+	iterations = len(args) > 1 and int(args[1] or 0) or DEFAULT_PBKDF2_ITERATIONS
+	return ('pbkdf2', args[0], iterations)
+
+
+class PasswordHasher(object):
+	def __init__(self, app=None):
+		self.pool = None
+		self.lock = Lock()
+		self.method = 'pbkdf2:sha256:50000'
+		self.salt_length = 8
+		self.pool_size = 0
+		self.queue_limit = 32
+		self.timeout = 5.0
+		self.in_flight = 0
+		self.metrics = {'hash': 0, 'verify': 0, 'rejected': 0, 'failed': 0,
+						'max_in_flight': 0, 'seconds': 0.0}
+		atexit.register(self.close)
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		self.method = app.config['FLASKY_PASSWORD_METHOD']
+		self.salt_length = app.config['FLASKY_PASSWORD_SALT_LENGTH']
+		self.pool_size = app.config['FLASKY_PASSWORD_POOL_SIZE']
+		self.queue_limit = app.config['FLASKY_PASSWORD_QUEUE_LIMIT']
+		self.timeout = app.config['FLASKY_PASSWORD_TIMEOUT']
+
+	def _get_pool(self):
+		with self.lock:
+			if self.pool is None:
+				self.pool = ProcessPoolExecutor(self.pool_size)
+			return self.pool
+
+	#正常关闭(包括退出时)等待工作进程结束
+	def close(self):
+		with self.lock:
+			pool, self.pool = self.pool, None
+		if pool is not None:
+			pool.shutdown(wait=True)
+
+	#超时的任务无法取消：先换上新的进程池，后续请求不受影响，再终止旧进程池的工作进程
+	def _discard(self, pool):
+		if pool is None:
+			return
+		with self.lock:
+			if self.pool is pool:
+				self.pool = ProcessPoolExecutor(self.pool_size)
+		for process in list((pool._processes or {}).values()):
+			process.terminate()
+		pool.shutdown(wait=False)
+
+	#排队的任务超过上限时直接拒绝，而不是让请求无限等待
+	def _run(self, kind, fn, *args):
+		with self.lock:
+			if self.in_flight >= self.queue_limit:
+				self.metrics['rejected'] += 1
+				raise ServiceUnavailable('password hashing queue is full')
+			self.in_flight += 1
+			self.metrics[kind] += 1
+			self.metrics['max_in_flight'] = max(self.metrics['max_in_flight'],
+												self.in_flight)
+		start = time.time()
+		pool = None
+		try:
+			if not self.pool_size:
+				return fn(*args)
+			pool = self._get_pool()
+			return pool.submit(fn, *args).result(self.timeout)
+		except (TimeoutError, BrokenProcessPool):
+			with self.lock:
+				self.metrics['failed'] += 1
+			self._discard(pool)
+			raise ServiceUnavailable('password hashing is unavailable')
+		finally:
+			with self.lock:
+				self.in_flight -= 1
+				self.metrics['seconds'] += time.time() - start
+
+	def hash(self, password):
+		return self._run('hash', generate_password_hash, password,
+						 self.method, self.salt_length)
+
+	def verify(self, password_hash, password):
+		if not password_hash:
+			return False
+		return self._run('verify', check_password_hash, password_hash, password)
+
+	#散列参数改变后，登录成功时用新参数重新散列；比较解析后的参数，
+	#配置中省略迭代次数(使用werkzeug的默认值)时不会每次都重新散列
+	def needs_rehash(self, password_hash):
+		method, _, rest = password_hash.partition('$')
+		salt = rest.partition('$')[0]
+		return _parameters(method) != _parameters(self.method) or \
+			len(salt) != self.salt_length
+
+	def stats(self):
+		with self.lock:
+			stats = dict(self.metrics)
+			stats['in_flight'] = self.in_flight
+		return stats
+
+	#供/metrics输出的(名称, 标签, 值)
+	def collect(self):
+		stats = self.stats()
+		return [
+			('flasky_password_operations_total', (('kind', 'hash'),), stats['hash']),
+			('flasky_password_operations_total', (('kind', 'verify'),),
+			 stats['verify']),
+			('flasky_password_rejected_total', (), stats['rejected']),
+			('flasky_password_failures_total', (), stats['failed']),
+			('flasky_password_seconds_total', (), stats['seconds']),
+			('flasky_password_in_flight', (), stats['in_flight']),
+		]
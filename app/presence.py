@@ -0,0 +1,85 @@
+# -*- coding:UTF-8 -*-
+#最近访问时间的写后缓冲：在内存中按用户合并，定期用一条UPDATE ... CASE批量写回；
+#缓冲区非空时由定时器在FLASKY_LAST_SEEN_FLUSH_INTERVAL秒后写回，空闲的进程也不会一直攒着
+
+import atexit
+import os
+import time
+from threading import Lock, Timer
+from flask import has_app_context
+from sqlalchemy import case
+
+
+class LastSeenBuffer(object):
+	def __init__(self, app=None):
+		self.pending = {}
+		self.lock = Lock()
+		self.app = None
+		self.interval = 60
+		self.size = 500
+		self.last_flush = time.time()
+		#(进程号, 定时器)，fork出的子进程不会继承父进程的定时器线程
+		self.timer = (None, None)
+		atexit.register(self.flush)
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		self.app = app
+		self.interval = app.config['FLASKY_LAST_SEEN_FLUSH_INTERVAL']
+		self.size = app.config['FLASKY_LAST_SEEN_FLUSH_SIZE']
+
+	def record(self, user_id, when):
+		with self.lock:
+			self.pending[user_id] = when
+			due = len(self.pending) >= self.size or \
+				time.time() - self.last_flush >= self.interval
+			if not due:
+				self._schedule()
+		if due:
+			self.flush()
+
+	#定时器在写回时结束，下一次缓冲时再启动
+	def _schedule(self):
+		pid, timer = self.timer
+		if pid == os.getpid() and timer is not None and timer.is_alive():
+			return
+		timer = Timer(self.interval, self.flush)
+		timer.daemon = True
+		timer.start()
+		self.timer = (os.getpid(), timer)
+
+	#尚未写回数据库的访问时间，显示时优先使用
+	def get(self, user_id):
+		with self.lock:
+			return self.pending.get(user_id)
+
+	def flush(self):
+		with self.lock:
+			pending, self.pending = self.pending, {}
+			self.last_flush = time.time()
+		if not pending or self.app is None:
+			return
+		from . import db
+		from .models import User
+		users = User.__table__
+		statement = users.update().where(users.c.id.in_(list(pending))).values(
+			last_seen=case(pending, value=users.c.id))
+		#定时器线程和退出时的调用不在应用上下文中；已有上下文时不能再压入新的，
+		#新上下文弹出时会移除当前线程的数据库会话
+		context = None if has_app_context() else self.app.app_context()
+		if context is not None:
+			context.push()
+		try:
+			with db.get_engine(self.app).begin() as connection:
+				connection.execute(statement)
+		except Exception:
+			#写回失败时放回缓冲区，保留更新的值，下次再试
+			with self.lock:
+				for user_id, when in pending.items():
+					if user_id not in self.pending:
+						self.pending[user_id] = when
+			self.app.logger.exception('Failed to flush last_seen updates')
+		finally:
+			if context is not None:
+				context.pop()
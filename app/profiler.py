@@ -0,0 +1,126 @@
+# -*- coding:UTF-8 -*-
+#按需的采样分析器：管理员用签名令牌(请求头或查询参数)触发，或按比例随机抽取请求，
+#分析期间由后台线程定时抓取请求线程的调用栈，按端点追加到折叠栈文件，可直接交给flamegraph.pl
+
+import os
+import random
+import sys
+import threading
+import time
+from flask import request, g
+from itsdangerous import TimestampSigner, BadSignature
+
+
+HEADER = 'X-Flasky-Profile'
+QUERY_FLAG = '_profile'
+
+
+def _frame_name(frame):
+	code = frame.f_code
+	path = code.co_filename.replace('\\', '/').split('/')
+	return ('%s:%s' % ('/'.join(path[-2:]), code.co_name)).replace(';', ':')
+
+
+#从最外层到最内层用分号连接，即折叠栈格式
+def collapse(frame):
+	names = []
+	while frame is not None:
+		names.append(_frame_name(frame))
+		frame = frame.f_back
+	names.reverse()
+	return ';'.join(names)
+
+
+#定时抓取一个线程的调用栈并计数
+class Sampler(threading.Thread):
+	def __init__(self, thread_id, interval):
+		super(Sampler, self).__init__(name='profile-sampler')
+		self.daemon = True
+		self.thread_id = thread_id
+		self.interval = interval
+		self.counts = {}
+		self.stopped = threading.Event()
+
+	def run(self):
+		while not self.stopped.wait(self.interval):
+			frame = sys._current_frames().get(self.thread_id)
+			if frame is not None:
+				stack = collapse(frame)
+				self.counts[stack] = self.counts.get(stack, 0) + 1
+
+	def stop(self):
+		self.stopped.set()
+		self.join()
+		return self.counts
+
+
+class Profiler(object):
+	def __init__(self, app=None):
+		self.app = None
+		self.rate = 0.0
+		self.interval = 0.005
+		self.directory = None
+		self.max_age = 3600
+		self.lock = threading.Lock()
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		self.app = app
+		self.rate = app.config['FLASKY_PROFILE_SAMPLE_RATE']
+		self.interval = app.config['FLASKY_PROFILE_INTERVAL']
+		self.directory = app.config['FLASKY_PROFILE_DIR']
+		self.max_age = app.config['FLASKY_PROFILE_TOKEN_MAX_AGE']
+		app.before_request(self.start)
+		app.teardown_request(self.finish)
+
+	def _signer(self):
+		return TimestampSigner(self.app.config['SECRET_KEY'], salt='profile')
+
+	#管理员通过manage.py profile_token获取，在有效期内可以多次使用
+	def generate_token(self):
+		return self._signer().sign(b'profile').decode('ascii')
+
+	def verify_token(self, token):
+		try:
+			self._signer().unsign(token, max_age=self.max_age)
+		except BadSignature:
+			return False
+		return True
+
+	#未启用时只有一次随机数比较和一次请求头查找
+	def _requested(self):
+		token = request.headers.get(HEADER) or request.args.get(QUERY_FLAG)
+		if token:
+			return self.verify_token(token)
+		return self.rate > 0 and random.random() < self.rate
+
+	def start(self):
+		if not self._requested():
+			return
+		sampler = Sampler(threading.current_thread().ident, self.interval)
+		sampler.started = time.time()
+		g.profile_sampler = sampler
+		sampler.start()
+
+	def finish(self, exc=None):
+		sampler = g.pop('profile_sampler', None)
+		if sampler is None:
+			return
+		counts = sampler.stop()
+		if counts:
+			self.write(request.endpoint or 'unknown', counts)
+		self.app.logger.info('Profiled %s %s: %d samples in %.3fs'
+							 % (request.method, request.path,
+								sum(counts.values()), time.time() - sampler.started))
+
+	#相同的折叠栈重复出现时flamegraph.pl会自动累加，所以直接追加
+	def write(self, endpoint, counts):
+		if not os.path.isdir(self.directory):
+			os.makedirs(self.directory)
+		path = os.path.join(self.directory, '%s.folded' % endpoint)
+		lines = ['%s %d\n' % (stack, count) for stack, count in counts.items()]
+		with self.lock:
+			with open(path, 'a') as f:
+				f.writelines(lines)
+		return path
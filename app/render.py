@@ -0,0 +1,141 @@
+# -*- coding:UTF-8 -*-
+#Markdown渲染服务：按内容散列缓存结果，在进程池中渲染并限制渲染时间；
+#超时的文本返回None，不缓存，由manage.py rerender之后补渲染
+
+import atexit
+import bleach
+import hashlib
+import multiprocessing
+from collections import OrderedDict
+from threading import Lock
+from flask import g, has_request_context
+from markdown import markdown
+
+
+#各类内容允许保留的HTML标签，只构建一次
+PROFILES = {
+	'post': ['a', 'abbr', 'acronym', 'b', 'blockquote', 'code',
+			 'em', 'i', 'li', 'ol', 'pre', 'strong', 'ul',
+			 'h1', 'h2', 'h3', 'p'],
+	'comment': ['a', 'abbr', 'acronym', 'b', 'code', 'em', 'i', 'strong'],
+}
+
+
+#在子进程中执行，必须是模块级函数才能被pickle
+def _render(text, tags):
+	return bleach.linkify(bleach.clean(markdown(text, output_format='html'),
+									   tags=tags, strip=True))
+
+
+class Renderer(object):
+	def __init__(self, app=None):
+		self.cache = OrderedDict()
+		self.lock = Lock()
+		self.pool = None
+		self.cache_size = 1024
+		self.pool_size = 2
+		self.timeout = 2.0
+		self.logger = None
+		atexit.register(self.close)
+		if app is not None:
+			self.init_app(app)
+
+	def init_app(self, app):
+		self.cache_size = app.config['FLASKY_RENDER_CACHE_SIZE']
+		self.pool_size = app.config['FLASKY_RENDER_POOL_SIZE']
+		self.timeout = app.config['FLASKY_RENDER_TIMEOUT']
+		self.logger = app.logger
+
+	#进程池在第一次需要时才创建，避免在fork之前启动子进程
+	def _get_pool(self):
+		with self.lock:
+			if self.pool is None:
+				self.pool = multiprocessing.Pool(self.pool_size)
+			return self.pool
+
+	def close(self):
+		with self.lock:
+			pool, self.pool = self.pool, None
+		if pool is not None:
+			pool.terminate()
+
+	#只终止提交任务时用的那个进程池；其他线程可能已经换上了新的进程池
+	def _discard(self, pool):
+		with self.lock:
+			if self.pool is pool:
+				self.pool = None
+		pool.terminate()
+
+	#每一项从开始等待起有自己的timeout；超时后卡住的子进程无法单独取消，只能终止整个进程池
+	def _collect(self, pool, text, result):
+		try:
+			return result.get(self.timeout)
+		except multiprocessing.TimeoutError:
+			self._discard(pool)
+			if self.logger is not None:
+				self.logger.warning('Markdown render timed out after %.1fs '
+									'(%d chars)' % (self.timeout, len(text)))
+			return None
+
+	def _key(self, text, profile):
+		return hashlib.sha1(('%s\0%s' % (profile, text)).encode('utf-8')).hexdigest()
+
+	def _cached(self, key):
+		with self.lock:
+			html = self.cache.get(key)
+			if html is not None:
+				self.cache.move_to_end(key)
+			return html
+
+	def _store(self, key, html):
+		with self.lock:
+			self.cache[key] = html
+			while len(self.cache) > self.cache_size:
+				self.cache.popitem(last=False)
+
+	#本次请求中已经超时的文本不再重新渲染，例如批量创建时先集中渲染、
+	#随后逐条赋值正文又触发渲染；请求之外(如manage.py rerender)照常重试
+	def _timed_out(self):
+		if not has_request_context():
+			return set()
+		return g.setdefault('render_timeouts', set())
+
+	def render(self, text, profile):
+		if text is None:
+			return None
+		return self.render_many([text], profile)[0]
+
+	#批量渲染：先查缓存，未命中的文本同时提交给进程池并行渲染，每一项都有自己的时间限制；
+	#某一项超时后进程池被终止，其后尚未完成的项重新提交给新的进程池。
+	#成功的结果写入缓存，随后逐条赋值正文时直接命中；超时的项返回None且不缓存，
+	#在同一个请求中也不再重试
+	def render_many(self, texts, profile):
+		tags = PROFILES[profile]
+		timed_out_keys = self._timed_out()
+		rendered = {}
+		pending = []
+		for text in OrderedDict.fromkeys(t for t in texts if t is not None):
+			key = self._key(text, profile)
+			html = self._cached(key)
+			if html is not None:
+				rendered[text] = html
+			elif key not in timed_out_keys:
+				pending.append((key, text))
+		while pending:
+			pool = self._get_pool()
+			results = [(key, text, pool.apply_async(_render, (text, tags)))
+					   for key, text in pending]
+			pending = []
+			timed_out = False
+			for key, text, result in results:
+				if timed_out and not result.ready():
+					pending.append((key, text))
+					continue
+				html = self._collect(pool, text, result)
+				if html is None:
+					timed_out = True
+					timed_out_keys.add(key)
+				else:
+					rendered[text] = html
+					self._store(key, html)
+		return [rendered.get(text) for text in texts]
@@ -0,0 +1,195 @@
+# -*- coding:UTF-8 -*-
+#读写分离：GET请求中的查询发往从库(SQLALCHEMY_BINDS中FLASKY_DB_REPLICAS列出的绑定)，
+#flush、UPDATE/INSERT/DELETE、SELECT ... FOR UPDATE和直接取连接的操作都发往主库。
+#会话写过一次之后本请求余下的读取都走主库；用户写入后的FLASKY_DB_REPLICA_MAX_LAG秒内
+#(按用户id记在FLASKY_DB_STICKY_DIR中，各进程共享)也只读主库，保证读到自己的写入。
+#认证完成之前的读取、会填充缓存的读取(整页缓存未命中、关注关系、令牌纪元)也走主库，
+#避免把从库的旧数据缓存得比复制延迟更久。从库的延迟由心跳行判断，超过上限的从库不再使用
+
+import array
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask import current_app, request, g, _request_ctx_stack
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql.expression import SelectBase
+from .graph import DirectoryStore
+
+
+#还没有认证出当前用户
+UNKNOWN = object()
+STICKY = 'sticky'
+
+
+#不查询数据库地取出请求的用户id：API认证得到的g.current_user或Flask-Login已加载的用户；
+#匿名用户返回None
+def request_user_id():
+	user = g.get('current_user')
+	if user is None:
+		user = getattr(_request_ctx_stack.top, 'user', None)
+	if user is None:
+		return UNKNOWN
+	if user.is_anonymous:
+		return None
+	return user.id
+
+
+class RoutingSession(SignallingSession):
+	def __init__(self, db, **options):
+		self.db = db
+		SignallingSession.__init__(self, db, **options)
+
+	def get_bind(self, mapper=None, clause=None):
+		primary = SignallingSession.get_bind(self, mapper, clause)
+		if self._flushing or not isinstance(clause, SelectBase) or \
+				getattr(clause, '_for_update_arg', None) is not None:
+			#除普通SELECT外都当作写操作
+			self.info['wrote'] = True
+			return primary
+		if not self.info.get('read_replica') or self.info.get('wrote') or \
+				self.info.get('primary') or primary is not self.db.get_engine(self.app):
+			return primary
+		#一个会话只选一次从库，同一请求内的读取来自同一个从库
+		if 'replica' not in self.info:
+			user_id = request_user_id()
+			if user_id is UNKNOWN:
+				return primary
+			if user_id is not None and self.db.is_sticky(self.app, user_id):
+				self.info['read_replica'] = False
+				return primary
+			self.info['replica'] = self.db.replicas.choose(self.app)
+		if self.info['replica'] is None:
+			return primary
+		return self.db.get_engine(self.app, bind=self.info['replica'])
+
+
+#按心跳行判断从库延迟，每个从库最多每FLASKY_DB_REPLICA_CHECK_INTERVAL秒检查一次
+class ReplicaMonitor(object):
+	def __init__(self, db):
+		self.db = db
+		self.lock = threading.Lock()
+		self.status = {}
+
+	def init_app(self, app):
+		with self.lock:
+			self.status.clear()
+
+	def choose(self, app):
+		healthy = [key for key in app.config['FLASKY_DB_REPLICAS']
+				   if self.healthy(app, key)]
+		return random.choice(healthy) if healthy else None
+
+	def healthy(self, app, key):
+		now = time.time()
+		checked, healthy = self.status.get(key, (0, False))
+		if now - checked < app.config['FLASKY_DB_REPLICA_CHECK_INTERVAL']:
+			return healthy
+		with self.lock:
+			checked, healthy = self.status.get(key, (0, False))
+			if now - checked >= app.config['FLASKY_DB_REPLICA_CHECK_INTERVAL']:
+				lag = self.lag(app, key)
+				healthy = lag is not None and \
+					lag <= app.config['FLASKY_DB_REPLICA_MAX_LAG']
+				if not healthy:
+					app.logger.warning('Replica %s unavailable or lagging (%s), '
+									   'reading from the primary', key, lag)
+				self.status[key] = (time.time(), healthy)
+		return healthy
+
+	#主库的心跳超过检查间隔才更新(多个进程同时检查时只有一个生效)，
+	#延迟 = 主库心跳 - 从库心跳；从库不可用或没有心跳时返回None
+	def lag(self, app, key):
+		from .models import ReplicationHeartbeat
+		heartbeat = ReplicationHeartbeat.__table__
+		select = self.db.select([heartbeat.c.timestamp]).where(heartbeat.c.id == 1)
+		interval = timedelta(seconds=app.config['FLASKY_DB_REPLICA_CHECK_INTERVAL'])
+		now = datetime.utcnow()
+		primary_engine = self.db.get_engine(app)
+		try:
+			with primary_engine.begin() as connection:
+				result = connection.execute(heartbeat.update().where(
+					heartbeat.c.timestamp < now - interval).values(timestamp=now))
+				if result.rowcount == 0 and connection.scalar(select) is None:
+					connection.execute(heartbeat.insert(), {'id': 1, 'timestamp': now})
+			primary = primary_engine.scalar(select)
+			replica = self.db.get_engine(app, bind=key).scalar(select)
+		except SQLAlchemyError as e:
+			app.logger.warning('Replica check for %s failed: %s', key, e)
+			return None
+		if replica is None:
+			return None
+		return max((primary - replica).total_seconds(), 0.0)
+
+
+#在每个请求开始时决定会话是否可以读从库，请求结束时记下写过数据的用户
+class RoutingSQLAlchemy(SQLAlchemy):
+	def __init__(self, *args, **kwargs):
+		self.replicas = ReplicaMonitor(self)
+		self.primary_checks = []
+		SQLAlchemy.__init__(self, *args, **kwargs)
+
+	#check()为真的请求只读主库，例如未命中时会写入整页缓存的请求
+	def primary_when(self, check):
+		self.primary_checks.append(check)
+
+	#块中的读取走主库，用于结果会被缓存的查询
+	@contextmanager
+	def primary(self):
+		info = self.session().info
+		depth = info.get('primary', 0)
+		info['primary'] = depth + 1
+		try:
+			yield
+		finally:
+			info['primary'] = depth
+
+	def _sticky_store(self, app):
+		return DirectoryStore(app.config['FLASKY_DB_STICKY_DIR'],
+							  app.config['FLASKY_DB_REPLICA_MAX_LAG'])
+
+	def is_sticky(self, app, user_id):
+		return self._sticky_store(app).get(STICKY, user_id) is not None
+
+	def create_session(self, options):
+		return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+	def init_app(self, app):
+		SQLAlchemy.init_app(self, app)
+		self.replicas.init_app(app)
+		app.before_request(self.route_request)
+		app.after_request(self.stick_after_write)
+		app.teardown_request(self.end_request)
+
+	def route_request(self):
+		self.end_request()
+		self.session().info['read_replica'] = self.readable()
+
+	#应用上下文比请求长时(测试、命令行中发出的请求)，请求之后的会话回到只用主库
+	def end_request(self, exception=None):
+		info = self.session().info
+		for key in ('read_replica', 'replica', 'wrote'):
+			info.pop(key, None)
+
+	def readable(self):
+		if not current_app.config['FLASKY_DB_REPLICAS'] or \
+				request.method not in ('GET', 'HEAD') or \
+				request.blueprint not in current_app.config['FLASKY_DB_REPLICA_BLUEPRINTS']:
+			return False
+		view = current_app.view_functions.get(request.endpoint)
+		if getattr(view, 'use_primary', False):
+			return False
+		return not any(check() for check in self.primary_checks)
+
+	def stick_after_write(self, response):
+		session = self.session()
+		if current_app.config['FLASKY_DB_REPLICAS'] and (
+				session.info.get('wrote') or session.new or session.dirty or
+				session.deleted):
+			user_id = request_user_id()
+			if user_id is not UNKNOWN and user_id is not None:
+				self._sticky_store(current_app).set(STICKY, user_id, array.array('i'))
+		return response
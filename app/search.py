@@ -0,0 +1,230 @@
+# -*- coding:UTF-8 -*-
+#文章和评论的全文搜索：倒排索引保存在search_documents和search_postings两张表中，
+#随文章、评论的写入增量更新，文档数和总长度记在search_stats中同步增减；
+#中日韩文字按单字和相邻两字切分，结果按BM25排序
+
+import heapq
+import math
+import re
+from collections import Counter, OrderedDict
+from . import db
+
+
+K1 = 1.2
+B = 0.75
+MAX_QUERY_TERMS = 32
+MAX_TERM_LENGTH = 64
+#每个查询词最多取出的倒排项，常见词只取最新的文档
+MAX_TERM_POSTINGS = 10000
+
+_tokens = re.compile(r'[0-9a-z]+|[぀-ヿ㐀-䶿一-鿿가-힯]+')
+_ascii = re.compile(r'[0-9a-z]')
+STOPWORDS = frozenset(['a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for',
+					   'in', 'is', 'it', 'of', 'on', 'or', 'the', 'to', 'with'])
+
+
+#拉丁字母和数字按单词切分；中日韩文字没有空格，索引时连续的一段切成单字和相邻两字的词，
+#查询时只用相邻两字的词(单字段用单字)，这样单字查询也能命中较长的词
+def tokenize(text, query=False):
+	terms = []
+	for run in _tokens.findall((text or '').lower()):
+		if _ascii.match(run):
+			if len(run) > 1 and run not in STOPWORDS:
+				terms.append(run[:MAX_TERM_LENGTH])
+		elif len(run) == 1:
+			terms.append(run)
+		else:
+			if not query:
+				terms.extend(run)
+			terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+	return terms
+
+
+def _tables():
+	from .models import SearchDocument, SearchPosting
+	return SearchDocument.__table__, SearchPosting.__table__
+
+
+def _stats_table():
+	from .models import SearchStats
+	return SearchStats.__table__
+
+
+#原子地增减一类文档的文档数和总长度，搜索时不必扫描search_documents
+def _update_stats(connection, doc_type, documents, length):
+	if not documents and not length:
+		return
+	stats = _stats_table()
+	result = connection.execute(stats.update().where(
+		stats.c.doc_type == doc_type).values(
+		documents=stats.c.documents + documents,
+		total_length=stats.c.total_length + length))
+	if result.rowcount == 0:
+		connection.execute(stats.insert(), {'doc_type': doc_type,
+											'documents': documents,
+											'total_length': length})
+
+
+def remove_documents(connection, doc_type, doc_ids):
+	documents, postings = _tables()
+	selected = db.and_(documents.c.doc_type == doc_type,
+					   documents.c.doc_id.in_(doc_ids))
+	count, length = connection.execute(db.select(
+		[db.func.count(), db.func.sum(documents.c.length)]).where(selected)).first()
+	if not count:
+		return
+	connection.execute(postings.delete().where(db.and_(
+		postings.c.doc_type == doc_type, postings.c.doc_id.in_(doc_ids))))
+	connection.execute(documents.delete().where(selected))
+	_update_stats(connection, doc_type, -count, -(length or 0))
+
+
+def remove_document(connection, doc_type, doc_id):
+	remove_documents(connection, doc_type, [doc_id])
+
+
+def _rows(doc_type, doc_id, text):
+	terms = tokenize(text)
+	document = {'doc_type': doc_type, 'doc_id': doc_id, 'length': len(terms)}
+	postings = [{'term': term, 'doc_type': doc_type, 'doc_id': doc_id, 'tf': tf}
+				for term, tf in Counter(terms).items()]
+	return document, postings
+
+
+#在flush所用的连接上重写文档的索引，与文章、评论的写入在同一个事务中；
+#documents是[(id, 正文), ...]，整批只做一次删除和两次批量插入
+def index_documents(connection, doc_type, documents):
+	documents_table, postings = _tables()
+	documents = list(documents)
+	if not documents:
+		return
+	remove_documents(connection, doc_type, [doc_id for doc_id, text in documents])
+	document_rows, posting_rows = [], []
+	for doc_id, text in documents:
+		document, rows = _rows(doc_type, doc_id, text)
+		document_rows.append(document)
+		posting_rows.extend(rows)
+	connection.execute(documents_table.insert(), document_rows)
+	if posting_rows:
+		connection.execute(postings.insert(), posting_rows)
+	_update_stats(connection, doc_type, len(document_rows),
+				  sum(row['length'] for row in document_rows))
+
+
+def index_document(connection, doc_type, doc_id, text):
+	index_documents(connection, doc_type, [(doc_id, text)])
+
+
+#从索引中删除(low, high]范围内不在keep中的文档(已删除的文章、已屏蔽的评论)
+def _sweep(connection, doc_type, low, high, keep):
+	documents, postings = _tables()
+	condition = db.and_(documents.c.doc_type == doc_type, documents.c.doc_id > low)
+	if high is not None:
+		condition = db.and_(condition, documents.c.doc_id <= high)
+	stale = [id for id, in connection.execute(
+		db.select([documents.c.doc_id]).where(condition))
+			 if id not in keep]
+	if stale:
+		remove_documents(connection, doc_type, stale)
+
+
+#按search_documents重算文档数和总长度，修正统计行的偏差
+def _recount_stats(connection):
+	documents, postings = _tables()
+	stats = _stats_table()
+	counts = connection.execute(db.select(
+		[documents.c.doc_type, db.func.count(), db.func.sum(documents.c.length)]
+	).group_by(documents.c.doc_type)).fetchall()
+	connection.execute(stats.delete())
+	if counts:
+		connection.execute(stats.insert(), [
+			{'doc_type': doc_type, 'documents': count, 'total_length': length or 0}
+			for doc_type, count, length in counts])
+
+
+#按id分批读取全部文章和评论重建索引，每批一个事务，内存占用与总行数无关；
+#每批只替换这一批文档的索引，重建期间搜索照常可用，期间新增的文档也不会重复插入
+def reindex(batch_size=1000):
+	from .models import Post, Comment
+	counts = {}
+	sources = [('post', Post, db.true()),
+			   ('comment', Comment, Comment.disabled.isnot(True))]
+	for doc_type, model, condition in sources:
+		counts[doc_type] = 0
+		last = 0
+		while True:
+			rows = db.session.query(model.id, model.body).filter(
+				condition, model.id > last).order_by(model.id).limit(
+				batch_size).all()
+			connection = db.session.connection()
+			if not rows:
+				_sweep(connection, doc_type, last, None, ())
+				db.session.commit()
+				break
+			_sweep(connection, doc_type, last, rows[-1][0],
+				   set(id for id, body in rows))
+			index_documents(connection, doc_type, rows)
+			db.session.commit()
+			counts[doc_type] += len(rows)
+			last = rows[-1][0]
+	_recount_stats(db.session.connection())
+	db.session.commit()
+	return counts
+
+
+#按BM25为包含任一查询词的文档打分，返回得分最高的limit个(类型, id, 得分)和命中总数；
+#每个词最多取MAX_TERM_POSTINGS个倒排项，常见词的命中总数因此是下限
+def search(query, doc_type=None, limit=20, offset=0):
+	documents, postings = _tables()
+	stats = _stats_table()
+	terms = list(OrderedDict.fromkeys(tokenize(query, query=True)))[:MAX_QUERY_TERMS]
+	if not terms:
+		return [], 0
+	type_filter = postings.c.doc_type == doc_type if doc_type else db.true()
+	total_docs, total_length = db.session.execute(
+		db.select([db.func.sum(stats.c.documents),
+				   db.func.sum(stats.c.total_length)]).where(
+			stats.c.doc_type == doc_type if doc_type else db.true())).first()
+	if not total_docs:
+		return [], 0
+	average_length = float(total_length or 0) / total_docs or 1.0
+	df = dict(db.session.execute(
+		db.select([postings.c.term, db.func.count()]).where(db.and_(
+			postings.c.term.in_(terms), type_filter)).group_by(
+			postings.c.term)).fetchall())
+	scores = {}
+	for term, n in df.items():
+		idf = math.log(1 + (total_docs - n + 0.5) / (n + 0.5))
+		rows = db.session.execute(
+			db.select([postings.c.doc_type, postings.c.doc_id, postings.c.tf,
+					   documents.c.length]).select_from(
+				postings.join(documents, db.and_(
+					documents.c.doc_type == postings.c.doc_type,
+					documents.c.doc_id == postings.c.doc_id))).where(db.and_(
+				postings.c.term == term, type_filter)).order_by(
+				postings.c.doc_id.desc()).limit(MAX_TERM_POSTINGS))
+		for type, id, tf, length in rows:
+			norm = K1 * (1 - B + B * length / average_length)
+			key = (type, id)
+			scores[key] = scores.get(key, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+	top = heapq.nlargest(offset + limit, scores.items(),
+						 key=lambda item: (item[1], item[0][1]))
+	total = max([len(scores)] + list(df.values()))
+	return [(type, id, score) for (type, id), score in top[offset:]], total
+
+
+#取出一页命中的文章和评论对象，保持得分顺序
+def load_hits(hits):
+	from .models import Post, Comment
+	ids = {'post': [], 'comment': []}
+	for type, id, score in hits:
+		ids[type].append(id)
+	objects = {}
+	if ids['post']:
+		for post in Post.query.filter(Post.id.in_(ids['post'])):
+			objects[('post', post.id)] = post
+	if ids['comment']:
+		for comment in Comment.query.filter(Comment.id.in_(ids['comment'])):
+			objects[('comment', comment.id)] = comment
+	return [(type, objects[(type, id)], score) for type, id, score in hits
+			if (type, id) in objects]
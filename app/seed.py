@@ -0,0 +1,218 @@
+# -*- coding:UTF-8 -*-
+#用Core批量插入生成压测数据：用户、文章、评论和幂律分布的关注关系，
+#同一个随机种子总是生成同样的数据
+
+import hashlib
+import random
+from array import array
+from datetime import datetime, timedelta
+from flask import current_app
+from . import db, password_hasher
+
+
+#生成数据的时间范围截止的日期，固定下来使同一个种子在哪天运行都生成同样的数据
+END = datetime(2017, 1, 1)
+WORDS_ZH = ['今天', '我们', '数据库', '性能', '优化', '缓存', '查询', '索引',
+			'服务器', '用户', '文章', '评论', '关注', '时间线', '分页', '测试',
+			'北京', '上海', '天气', '周末', '电影', '音乐', '读书', '旅行',
+			'代码', '程序', '设计', '学习', '工作', '生活', '朋友', '晚饭']
+WORDS_EN = ['flask', 'python', 'query', 'index', 'cache', 'latency', 'server',
+			'timeline', 'cursor', 'follow', 'comment', 'post', 'weekend', 'music',
+			'coffee', 'deploy', 'commit', 'review', 'backend', 'database']
+
+
+#按幂律分布抽取[0, n)中的编号，再用与n互素的步长和偏移打散，热门编号不集中在开头，
+#不同的偏移让两个分布的热门编号互不相关
+class PowerLaw(object):
+	def __init__(self, n, alpha, rng, offset=0):
+		self.n = n
+		self.alpha = alpha
+		self.rng = rng
+		self.offset = offset
+		self.stride = 1
+		for stride in (7919, 104729, 1299709, 15485863):
+			if n % stride:
+				self.stride = stride
+				break
+
+	def sample(self):
+		#连续幂律分布在[1, n + 1)上的反函数采样
+		u = self.rng.random()
+		a = 1.0 - self.alpha
+		rank = int(((float(self.n + 1) ** a - 1.0) * u + 1.0) ** (1.0 / a)) - 1
+		return (min(rank, self.n - 1) * self.stride + self.offset) % self.n
+
+
+class Seeder(object):
+	def __init__(self, users=1000, posts=10000, comments=20000, follows=20,
+				 seed=42, chunk_size=10000, days=365, end=None):
+		self.users = users
+		self.posts = posts
+		self.comments = comments
+		self.follows = follows
+		self.chunk_size = chunk_size
+		self.rng = random.Random(seed)
+		self.end = end or END
+		self.start = self.end - timedelta(days=days)
+		self.counts = {}
+		self.buffers = {}
+		#被关注者 -> 关注者id数组，用来直接生成推送的时间线行
+		self.followers = {}
+
+	def _next_id(self, table):
+		return (db.session.query(db.func.max(table.c.id)).scalar() or 0) + 1
+
+	#按表缓冲行，攒满一块后用一条executemany插入；引用其他缓冲表的行(时间线)
+	#传flush=False，由调用者先写被引用的表再写它
+	def _add(self, table, row, flush=True):
+		buffer = self.buffers.setdefault(table.name, [])
+		buffer.append(row)
+		if flush and len(buffer) >= self.chunk_size:
+			self._flush(table)
+
+	#每块一个事务，失败时只损失当前块
+	def _flush(self, table):
+		buffer = self.buffers.pop(table.name, None)
+		if not buffer:
+			return
+		with db.engine.begin() as connection:
+			connection.execute(table.insert(), buffer)
+		self.counts[table.name] = self.counts.get(table.name, 0) + len(buffer)
+
+	def _sentence(self):
+		rng = self.rng
+		if rng.random() < 0.7:
+			return ''.join(rng.choice(WORDS_ZH) for i in range(rng.randint(4, 16))) + '。'
+		return ' '.join(rng.choice(WORDS_EN) for i in range(rng.randint(5, 15))).capitalize() + '.'
+
+	def _body(self, sentences):
+		body = ' '.join(self._sentence() for i in range(sentences))
+		#词表中没有Markdown标记，渲染结果就是一个段落，不必逐条调用渲染器
+		return body, '<p>%s</p>' % body
+
+	#文章时间随编号递增，评论可以直接算出所属文章的时间
+	def _post_timestamp(self, index):
+		span = (self.end - self.start).total_seconds()
+		return self.start + timedelta(seconds=span * index / max(self.posts, 1))
+
+	def _seed_users(self):
+		from .models import Role, User
+		users = User.__table__
+		role = Role.query.filter_by(default=True).first()
+		password_hash = password_hasher.hash('password')
+		self.first_user = first = self._next_id(users)
+		span = (self.end - self.start).total_seconds()
+		rng = self.rng
+		for id in range(first, first + self.users):
+			email = 'seed%d@example.com' % id
+			member_since = self.start + timedelta(seconds=rng.random() * span)
+			self._add(users, {
+				'id': id, 'email': email, 'username': 'seed%d' % id,
+				'role_id': role.id if role else None,
+				'password_hash': password_hash, 'confirmed': True,
+				'name': 'Seed User %d' % id, 'location': rng.choice(WORDS_ZH),
+				'about_me': self._sentence(), 'member_since': member_since,
+				'last_seen': self.end,
+				'avatar_hash': hashlib.md5(email.encode('utf-8')).hexdigest(),
+				'timeline_pull': False, 'token_epoch': 0,
+				'post_count': 0, 'follower_count': 0, 'followed_count': 0})
+		self._flush(users)
+
+	#出度服从帕累托分布，被关注者按幂律抽取，少数用户拥有大量关注者
+	def _seed_follows(self):
+		from .models import Follow
+		follows = Follow.__table__
+		first = self.first_user
+		popular = PowerLaw(self.users, 1.2, self.rng)
+		rng = self.rng
+		for follower in range(first, first + self.users):
+			degree = min(self.users - 1,
+						 int(self.follows * rng.paretovariate(2.0) / 2.0))
+			followed = set([follower])
+			for attempt in range(degree * 3):
+				if len(followed) > degree:
+					break
+				followed.add(first + popular.sample())
+			for id in sorted(followed):
+				self._add(follows, {'follower_id': follower, 'followed_id': id,
+									'timestamp': self.start})
+				self.followers.setdefault(id, array('l')).append(follower)
+		self._flush(follows)
+
+	#文章写入时按关注关系直接生成时间线行，与Timeline.fan_out的结果相同
+	def _seed_posts(self):
+		from .models import Post, Timeline
+		posts = Post.__table__
+		timelines = Timeline.__table__
+		self.first_post = first = self._next_id(posts)
+		authors = PowerLaw(self.users, 1.1, self.rng, self.users // 2)
+		limit = current_app.config['FLASKY_TIMELINE_FANOUT_LIMIT']
+		for index in range(self.posts):
+			body, body_html = self._body(self.rng.randint(1, 3))
+			id = first + index
+			author_id = self.first_user + authors.sample()
+			timestamp = self._post_timestamp(index)
+			self._add(posts, {'id': id, 'body': body, 'body_html': body_html,
+							  'timestamp': timestamp, 'author_id': author_id,
+							  'comment_count': 0})
+			followers = self.followers.get(author_id, ())
+			if len(followers) > limit:
+				continue
+			for follower in followers:
+				self._add(timelines, {'user_id': follower, 'post_id': id,
+									  'author_id': author_id,
+									  'timestamp': timestamp}, flush=False)
+			#时间线行引用文章，先写文章
+			if len(self.buffers.get('timelines', ())) >= self.chunk_size // 2:
+				self._flush(posts)
+				self._flush(timelines)
+		self._flush(posts)
+		self._flush(timelines)
+
+	def _seed_comments(self):
+		from .models import Comment
+		if not self.posts:
+			return
+		comments = Comment.__table__
+		targets = PowerLaw(self.posts, 1.1, self.rng)
+		rng = self.rng
+		for index in range(self.comments):
+			post = targets.sample()
+			timestamp = min(self.end, self._post_timestamp(post) +
+							timedelta(seconds=rng.expovariate(1.0 / 3600)))
+			body, body_html = self._body(1)
+			self._add(comments, {
+				'body': body, 'body_html': body_html, 'timestamp': timestamp,
+				'disabled': rng.random() < 0.02,
+				'author_id': self.first_user + rng.randrange(self.users),
+				'post_id': self.first_post + post})
+		self._flush(comments)
+
+	#Core插入不会触发映射器事件，最后批量重算计数列并重建全文搜索索引
+	def _finish(self):
+		from .models import User, Post
+		from .search import reindex
+		User.recount()
+		Post.recount()
+		users = User.__table__
+		db.session.execute(users.update().where(
+			users.c.id >= self.first_user).values(
+			timeline_pull=users.c.follower_count >
+			current_app.config['FLASKY_TIMELINE_FANOUT_LIMIT']))
+		db.session.commit()
+		#PostgreSQL的序列不会因为显式指定id而前进
+		if db.engine.dialect.name == 'postgresql':
+			for table in ('users', 'posts'):
+				db.session.execute(
+					"SELECT setval('%s_id_seq', (SELECT max(id) FROM %s))"
+					% (table, table))
+			db.session.commit()
+		reindex(self.chunk_size)
+
+	def run(self):
+		self._seed_users()
+		self._seed_follows()
+		self._seed_posts()
+		self._seed_comments()
+		self._finish()
+		return self.counts
@@ -0,0 +1,63 @@
+# -*- coding:UTF-8 -*-
+#API列表的批量序列化：每批只调用一次url_for生成各端点的URL模板，逐行只做字符串拼接，
+#输出与各模型的to_json()完全相同
+
+from flask import url_for
+
+
+#占位的id只出现在URL的路径部分，从右边切开即可得到前缀和后缀
+SENTINEL = 2147483647
+
+
+class UrlTemplate(object):
+	def __init__(self, endpoint):
+		url = url_for(endpoint, id=SENTINEL, _external=True)
+		self.prefix, self.suffix = url.rsplit(str(SENTINEL), 1)
+
+	def __call__(self, id):
+		return '%s%d%s' % (self.prefix, id, self.suffix)
+
+
+#文章和用户的计数已经是反规范化的列，随行一起读出，不需要额外的查询
+def posts_to_json(posts):
+	post_url = UrlTemplate('api.get_post')
+	user_url = UrlTemplate('api.get_user')
+	comments_url = UrlTemplate('api.get_post_comments')
+	return [{
+		'url': post_url(post.id),
+		'body': post.body,
+		'body_html': post.body_html,
+		'timestamp': post.timestamp,
+		'author': user_url(post.author_id),
+		'comments': comments_url(post.id),
+		'comment_count': post.comment_count
+	} for post in posts]
+
+
+def users_to_json(users):
+	user_url = UrlTemplate('api.get_user')
+	posts_url = UrlTemplate('api.get_user_posts')
+	timeline_url = UrlTemplate('api.get_user_followed_posts')
+	return [{
+		'url': user_url(user.id),
+		'username': user.username,
+		'member_since': user.member_since,
+		'last_seen': user.last_seen_at,
+		'post': posts_url(user.id),
+		'followed_posts': timeline_url(user.id),
+		'post_count': user.post_count
+	} for user in users]
+
+
+def comments_to_json(comments):
+	comment_url = UrlTemplate('api.get_comment')
+	post_url = UrlTemplate('api.get_post')
+	user_url = UrlTemplate('api.get_user')
+	return [{
+		'url': comment_url(comment.id),
+		'post': post_url(comment.post_id),
+		'body': comment.body,
+		'body_html': comment.body_html,
+		'timestamp': comment.timestamp,
+		'author': user_url(comment.author_id),
+	} for comment in comments]
@@ -0,0 +1,108 @@
+# -*- coding:UTF-8 -*-
+#离线的关注推荐：把follows表流式读入稀疏邻接矩阵，分块用矩阵乘法求二度关注的路径数，
+#每个用户保留得分最高的若干候选写入follow_suggestions，请求时按主键一次读出。
+#增量模式只重算关注列表变化过的用户及其关注者(他们的二度关注经过这些用户)。
+#依赖NumPy和SciPy，只在运行manage.py suggest时导入
+
+import itertools
+from datetime import datetime
+from . import db
+
+
+def load_graph(batch_size=100000):
+	import numpy as np
+	from scipy import sparse
+	from .models import Follow, User
+	follows = Follow.__table__
+	#服务器端游标分批读取，不在内存中保存结果行对象
+	result = db.session.connection(execution_options={'stream_results': True}).execute(
+		db.select([follows.c.follower_id, follows.c.followed_id]).where(
+			follows.c.follower_id != follows.c.followed_id))
+	chunks = []
+	while True:
+		rows = result.fetchmany(batch_size)
+		if not rows:
+			break
+		chunks.append(np.fromiter(itertools.chain.from_iterable(rows),
+								  dtype=np.int32, count=2 * len(rows)))
+	result.close()
+	edges = np.concatenate(chunks).reshape(-1, 2) if chunks else \
+		np.zeros((0, 2), dtype=np.int32)
+	#读完关注关系之后再取最大的用户id，读取期间注册的用户也在矩阵范围内
+	size = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+	return sparse.csr_matrix(
+		(np.ones(len(edges), dtype=np.int32), (edges[:, 0], edges[:, 1])),
+		shape=(size, size))
+
+
+#对一块用户(行)求二度候选：R·A的每个元素是"我关注的人中关注了该候选的人数"，
+#去掉已经关注的人和自己；同票时关注者多的候选在前，得分 = 路径数 + 关注者数/(最大关注者数+1)
+def rank_candidates(graph, popularity, users, top_k):
+	import numpy as np
+	from scipy import sparse
+	rows = graph[users]
+	paths = rows.dot(graph).tocsr()
+	own = sparse.csr_matrix(
+		(np.ones(len(users), dtype=np.int32), (np.arange(len(users)), users)),
+		shape=paths.shape)
+	paths = (paths - paths.multiply(rows) - paths.multiply(own)).tocoo()
+	keep = paths.data > 0
+	row, column, count = paths.row[keep], paths.col[keep], paths.data[keep]
+	score = count + popularity[column]
+	order = np.lexsort((column, -score, row))
+	row, column, count, score = row[order], column[order], count[order], score[order]
+	rank = np.arange(len(row)) - np.searchsorted(row, row, side='left')
+	keep = rank < top_k
+	return (users[row[keep]], rank[keep], column[keep], count[keep], score[keep])
+
+
+#增量模式下需要重算的用户：从未计算过、或计算后关注列表变化的用户，再加上他们的关注者
+def stale_users(graph):
+	import numpy as np
+	from .models import User
+	changed = np.array([id for id, in db.session.query(User.id).filter(db.or_(
+		User.suggestions_at.is_(None),
+		User.follows_changed_at > User.suggestions_at))], dtype=np.int32)
+	followers = graph.tocsc()[:, changed].indices if len(changed) else changed
+	return np.union1d(changed, followers).astype(np.int32)
+
+
+#每块一个事务：先删除这些用户原有的推荐再写入新的，并记下计算开始的时间
+def store(users, suggestions, started):
+	from .models import User, FollowSuggestion
+	table = FollowSuggestion.__table__
+	ids = [int(id) for id in users]
+	db.session.execute(table.delete().where(table.c.user_id.in_(ids)))
+	rows = [{'user_id': int(user_id), 'rank': int(rank),
+			 'suggested_id': int(suggested_id), 'mutual_count': int(count),
+			 'score': float(score)}
+			for user_id, rank, suggested_id, count, score in zip(*suggestions)]
+	if rows:
+		db.session.execute(table.insert(), rows)
+	users_table = User.__table__
+	db.session.execute(users_table.update().where(
+		users_table.c.id.in_(ids)).values(suggestions_at=started))
+	db.session.commit()
+	return len(rows)
+
+
+def refresh(full=False, top_k=10, chunk_size=1000):
+	import numpy as np
+	from .models import User
+	started = datetime.utcnow()
+	graph = load_graph()
+	if full:
+		users = np.array([id for id, in db.session.query(User.id).order_by(User.id)],
+						 dtype=np.int32)
+	else:
+		users = stale_users(graph)
+	#读取关注关系之后注册的用户还不在矩阵中，留给下一次计算
+	users = users[users < graph.shape[0]]
+	followers = np.asarray(graph.sum(axis=0)).ravel()
+	popularity = followers / (followers.max() + 1.0)
+	written = 0
+	for start in range(0, len(users), chunk_size):
+		chunk = users[start:start + chunk_size]
+		written += store(chunk, rank_candidates(graph, popularity, chunk, top_k),
+						 started)
+	return {'edges': int(graph.nnz), 'users': len(users), 'suggestions': written}
@@ -0,0 +1,104 @@
+# -*- coding:UTF-8 -*-
+#无状态的API认证令牌：令牌中带有用户id、确认状态、权限位和吊销纪元，
+#验证时不访问数据库，只有视图真正需要完整的User时才加载
+
+import time
+from threading import Lock
+from flask import current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+
+
+def _serializer():
+	return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='api-auth')
+
+
+#各用户当前的吊销纪元，按FLASKY_TOKEN_EPOCH_TTL缓存在进程内
+class EpochCache(object):
+	def __init__(self):
+		self.epochs = {}
+		self.lock = Lock()
+
+	def get(self, user_id):
+		with self.lock:
+			entry = self.epochs.get(user_id)
+		if entry is not None and entry[1] > time.time():
+			return entry[0]
+		from . import db
+		from .models import User
+		with db.primary():
+			epoch = User.query.with_entities(User.token_epoch).filter_by(
+				id=user_id).scalar()
+		self.set(user_id, epoch)
+		return epoch
+
+	def set(self, user_id, epoch):
+		with self.lock:
+			self.epochs[user_id] = (
+				epoch, time.time() + current_app.config['FLASKY_TOKEN_EPOCH_TTL'])
+
+	def clear(self):
+		with self.lock:
+			self.epochs.clear()
+
+epochs = EpochCache()
+
+
+#由令牌声明构造的轻量用户，访问声明之外的属性时才加载User
+class TokenUser(object):
+	is_anonymous = False
+	is_authenticated = True
+	is_active = True
+
+	def __init__(self, id, confirmed, permissions, epoch):
+		self.id = id
+		self.confirmed = confirmed
+		self.permissions = permissions
+		self.epoch = epoch
+		self._user = None
+
+	def can(self, permissions):
+		return (self.permissions & permissions) == permissions
+
+	def is_administrator(self):
+		from .models import Permission
+		return self.can(Permission.ADMINISTER)
+
+	def _get_current_object(self):
+		if self._user is None:
+			from .models import User
+			self._user = User.query.get(self.id)
+		return self._user
+
+	def __getattr__(self, name):
+		if name.startswith('_'):
+			raise AttributeError(name)
+		return getattr(self._get_current_object(), name)
+
+	def __eq__(self, other):
+		return getattr(other, 'id', None) == self.id
+
+	def __ne__(self, other):
+		return not self.__eq__(other)
+
+	def __repr__(self):
+		return '<TokenUser %r>' % self.id
+
+
+def generate_token(user, expiration):
+	permissions = user.role.permissions if user.role is not None else 0
+	return _serializer().dumps([user.id, int(bool(user.confirmed)),
+								permissions or 0, user.token_epoch or 0,
+								int(time.time()) + expiration])
+
+
+def verify_token(token):
+	try:
+		id, confirmed, permissions, epoch, expires = _serializer().loads(token)
+	except (BadSignature, TypeError, ValueError):
+		return None
+	if expires < time.time():
+		return None
+	current = epochs.get(id)
+	if current is None or epoch != current:
+		return None
+	return TokenUser(id, bool(confirmed), permissions, epoch)
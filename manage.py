@@ -23,6 +23,8 @@ migrate = Migrate(app, db)
 
 
 manager.add_command('db', MigrateCommand)
+indexes = Manager(usage='Inspect recorded statements and advise indexes')
+manager.add_command('indexes', indexes)
 
 
 @app.shell_context_processor
@@ -54,15 +56,157 @@ def test(coverage=False):
 		COV.erase()
 
 
-#在请求分析器的监视下运行程序
+#在采样分析器的监视下运行程序，按比例分析请求，折叠栈文件写入profile_dir
 @manager.command
-def profile(length=25, profile_dir=None):
-	#代码探查器在启动应用
-	from werkzeug.contrib.profiler import ProfilerMiddleware
-	app.wsgi_app = ProfilerMiddleware(app.wsgi_app, restrictions=[length],
-									  profile_dir=profile_dir)
+def profile(sample_rate=1.0, profile_dir=None):
+	"""Run the app with the sampling profiler enabled for a share of requests."""
+	from app import profiler
+	profiler.rate = float(sample_rate)
+	if profile_dir:
+		profiler.directory = profile_dir
 	app.run()
 
+
+#生成触发单个请求分析的签名令牌，放在X-Flasky-Profile请求头或_profile查询参数中
+@manager.command
+def profile_token():
+	"""Print a signed token that profiles any request carrying it."""
+	from app import profiler
+	print(profiler.generate_token())
+
+
+#重建物化的关注文章时间线
+@manager.command
+def rebuild_timelines():
+	"""Rebuild the materialized followed-posts timelines."""
+	from app.models import Timeline
+	Timeline.rebuild()
+
+
+#分批读取全部文章和评论，重建全文搜索索引
+@manager.command
+def reindex(batch_size=1000):
+	"""Rebuild the full-text search index from posts and comments."""
+	from app.search import reindex
+	counts = reindex(int(batch_size))
+	print('Indexed %d posts and %d comments' % (counts['post'], counts['comment']))
+
+
+#补渲染Markdown渲染超时、body_html留空的文章和评论
+@manager.command
+def rerender(batch_size=100):
+	"""Render post and comment bodies whose Markdown render timed out."""
+	from app.models import Comment, rerender_bodies
+	posts = rerender_bodies(Post, 'post', int(batch_size))
+	comments = rerender_bodies(Comment, 'comment', int(batch_size))
+	print('Rendered %d posts and %d comments' % (posts, comments))
+
+
+#批量重算用户和文章上的计数列，修复偏差
+@manager.command
+def recount():
+	"""Recompute the denormalized post, comment and follow counters."""
+	User.recount()
+	Post.recount()
+
+
+#离线计算关注推荐，默认只重算关注列表变化过的用户及其关注者
+@manager.command
+def suggest(full=False, batch_size=1000):
+	"""Compute who-to-follow suggestions from the follow graph."""
+	import time
+	from app.suggestions import refresh
+	start = time.time()
+	counts = refresh(full, app.config['FLASKY_SUGGESTIONS_TOP_K'], int(batch_size))
+	print('Refreshed %d users (%d suggestions, %d edges) in %.1fs' % (
+		counts['users'], counts['suggestions'], counts['edges'],
+		time.time() - start))
+
+
+#对记录的语句逐条EXPLAIN，报告全表扫描和额外排序，生成添加缺失索引的迁移
+@indexes.command
+def advise(log=None, crawl=False, write=False):
+	"""Explain recorded statements and suggest missing composite indexes."""
+	from alembic.script import ScriptDirectory
+	from app import indexes as advisor
+	statements = advisor.from_snapshots(app.config['FLASKY_METRICS_DIR'])
+	if log:
+		statements.update(advisor.from_log(log))
+	if crawl:
+		statements.update(advisor.crawl(app))
+	with db.engine.connect() as connection:
+		report, suggestions = advisor.advise(connection, statements)
+	print(advisor.format_report(report) or
+		  'No full scans or filesorts in %d statements' % len(statements))
+	if not suggestions:
+		return
+	directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+	revision, source = advisor.render_migration(
+		suggestions, ScriptDirectory(directory).get_current_head())
+	if not write:
+		print('\n' + source)
+		return
+	path = os.path.join(directory, 'versions', '%s_advised_indexes.py' % revision)
+	with open(path, 'w') as f:
+		f.write(source)
+	print('Wrote %s, review it before running "manage.py db upgrade"' % path)
+
+
+#用批量插入生成压测数据，相同的random_seed和end(YYYY-MM-DD)生成相同的数据
+@manager.command
+def seed(users=1000, posts=10000, comments=20000, follows=20,
+		 random_seed=42, batch_size=10000, end=None):
+	"""Bulk-generate users, posts, comments and a power-law follow graph."""
+	import time
+	from datetime import datetime
+	from app.seed import Seeder
+	start = time.time()
+	if end is not None:
+		end = datetime.strptime(end, '%Y-%m-%d')
+	counts = Seeder(int(users), int(posts), int(comments), int(follows),
+					int(random_seed), int(batch_size), end=end).run()
+	for table in sorted(counts):
+		print('%-10s %d' % (table, counts[table]))
+	print('Seeded in %.1fs' % (time.time() - start))
+
+
+#在已生成数据的数据库上并发压测各端点，结果写入JSON文件，可与上一次的结果比较
+@manager.command
+def bench(requests=200, concurrency=4, endpoint=None, output=None,
+		  baseline=None, skip_writes=False):
+	"""Benchmark the main and API endpoints against a seeded database."""
+	import json
+	from app.bench import Benchmark, format_results
+	report = Benchmark(app, int(requests), int(concurrency),
+					   writes=not skip_writes).run(endpoint)
+	if baseline:
+		with open(baseline) as f:
+			baseline = json.load(f)
+	print(format_results(report, baseline))
+	if output is None:
+		basedir = os.path.abspath(os.path.dirname(__file__))
+		output = os.path.join(basedir, 'tmp', 'bench-%s.json' %
+							  report['timestamp'][:19].replace(':', ''))
+	with open(output, 'w') as f:
+		json.dump(report, f, indent=2)
+	print('Results written to %s' % output)
+
+
+#在独立进程中运行邮件发送工作线程，直到被中断
+@manager.command
+def mailworker(workers=None):
+	"""Deliver queued mail until interrupted."""
+	import time
+	from app import mail_spooler
+	mail_spooler.start(int(workers) if workers else None)
+	try:
+		while True:
+			time.sleep(60)
+			print(mail_spooler.stats())
+	except KeyboardInterrupt:
+		mail_spooler.stop()
+
+
 #部署命令
 @manager.command
 def deploy():
@@ -0,0 +1,30 @@
+"""composite indexes
+
+Revision ID: b17d3e5c8a42
+Revises: 6c2e8f4a9b10
+Create Date: 2026-10-19 11:48:05.207614
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b17d3e5c8a42'
+down_revision = '6c2e8f4a9b10'
+branch_labels = None
+depends_on = None
+
+
+# 由 manage.py indexes advise --crawl 对种子数据的建议整理而来：索引名与模型一致，
+# follows 的索引带上 follower_id 使关注者列表只读索引
+def upgrade():
+    op.create_index('ix_posts_author_timestamp', 'posts', ['author_id', 'timestamp', 'id'], unique=False)
+    op.create_index('ix_comments_post_timestamp', 'comments', ['post_id', 'timestamp', 'id'], unique=False)
+    op.create_index('ix_follows_followed_follower', 'follows', ['followed_id', 'follower_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_follows_followed_follower', table_name='follows')
+    op.drop_index('ix_comments_post_timestamp', table_name='comments')
+    op.drop_index('ix_posts_author_timestamp', table_name='posts')
@@ -0,0 +1,27 @@
+"""comment moderation index
+
+Revision ID: c4f81a2d6e97
+Revises: b17d3e5c8a42
+Create Date: 2026-10-19 15:02:44.518306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f81a2d6e97'
+down_revision = 'b17d3e5c8a42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 审核队列按 disabled = false/true 过滤，原来为 NULL 的评论视为未禁用
+    comments = sa.table('comments', sa.column('disabled', sa.Boolean))
+    op.execute(comments.update().where(comments.c.disabled.is_(None)).values(disabled=False))
+    op.create_index('ix_comments_disabled_timestamp', 'comments', ['disabled', 'timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_comments_disabled_timestamp', table_name='comments')
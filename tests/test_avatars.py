@@ -0,0 +1,82 @@
+# -*- coding:UTF-8 -*-
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+from app import create_app, db
+from app.models import User, Role
+from app.avatars import identicon, pattern, avatar_size, avatar_path
+
+
+#本地头像服务测试
+class AvatarTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.directory = tempfile.mkdtemp()
+		self.app.config['FLASKY_AVATAR_DIR'] = self.directory
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		self.client = self.app.test_client()
+
+	def tearDown(self):
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+		shutil.rmtree(self.directory)
+
+	def test_identicon_png(self):
+		hash = 'a' * 32
+		data = identicon(hash, 40)
+		self.assertTrue(data.startswith(b'\x89PNG\r\n\x1a\n'))
+		self.assertEqual(struct.unpack('>II', data[16:24]), (40, 40))
+		self.assertEqual(data, identicon(hash, 40))
+		cells, color = pattern(hash)
+		for row in cells:
+			self.assertEqual(row, row[::-1])
+		self.assertNotEqual(pattern('b' * 32), (cells, color))
+
+	def test_avatar_size(self):
+		sizes = [18, 32, 40, 256]
+		self.assertEqual(avatar_size(32, sizes), 32)
+		self.assertEqual(avatar_size(33, sizes), 40)
+		self.assertEqual(avatar_size(1000, sizes), 256)
+
+	def test_gravatar_uses_stored_hash(self):
+		u = User(email='john@example.com', password='cat')
+		db.session.add(u)
+		db.session.commit()
+		with self.app.test_request_context('/'):
+			self.assertEqual(u.gravatar(size=40), '/avatar/%s/40' % u.avatar_hash)
+			self.assertEqual(u.gravatar(size=50), '/avatar/%s/64' % u.avatar_hash)
+			u.avatar_hash = 'f' * 32
+			self.assertEqual(u.gravatar(size=40), '/avatar/%s/40' % ('f' * 32))
+
+	def test_avatar_endpoint(self):
+		hash = '0123456789abcdef0123456789abcdef'
+		response = self.client.get('/avatar/%s/40' % hash)
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.mimetype, 'image/png')
+		self.assertIn('immutable', response.headers['Cache-Control'])
+		self.assertEqual(response.get_data(), identicon(hash, 40))
+		path = avatar_path(self.directory, hash, 40)
+		self.assertTrue(os.path.exists(path))
+
+		#第二次请求直接读取磁盘上的文件
+		with open(path, 'wb') as f:
+			f.write(b'cached')
+		response = self.client.get('/avatar/%s/40' % hash)
+		self.assertEqual(response.get_data(), b'cached')
+
+		response = self.client.get('/avatar/%s/40' % hash, headers={
+			'If-None-Match': response.headers['ETag']})
+		self.assertEqual(response.status_code, 304)
+
+		response = self.client.get('/avatar/%s/50' % hash)
+		self.assertEqual(response.status_code, 301)
+		self.assertTrue(response.location.endswith('/avatar/%s/64' % hash))
+		response = self.client.get('/avatar/not-a-hash/40')
+		self.assertEqual(response.status_code, 404)
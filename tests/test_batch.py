@@ -0,0 +1,94 @@
+# -*- coding:UTF-8 -*-
+
+import json
+import unittest
+from base64 import b64encode
+from collections import Counter
+from app import create_app, db, renderer
+from app.models import User, Role, Post, Comment
+
+
+#API批量创建测试
+class BatchCreateTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		self.john = User(email='john@example.com', username='john',
+						 password='cat', confirmed=True)
+		db.session.add(self.john)
+		db.session.commit()
+		self.client = self.app.test_client()
+		self.commits = 0
+		db.event.listen(db.session, 'after_commit', self.count_commit)
+
+	def tearDown(self):
+		db.event.remove(db.session, 'after_commit', self.count_commit)
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def count_commit(self, session):
+		self.commits += 1
+
+	def post(self, url, data):
+		credentials = b64encode(b'john@example.com:cat').decode('ascii')
+		self.commits = 0
+		return self.client.post(url, data=json.dumps(data), headers={
+			'Authorization': 'Basic ' + credentials,
+			'Content-Type': 'application/json'})
+
+	def test_batch_posts(self):
+		response = self.post('/api/v1.0/posts/batch', [
+			{'body': 'first *post*'}, {'body': ''}, 'not an object',
+			{'body': 'second post'}])
+		self.assertEqual(response.status_code, 200)
+		data = json.loads(response.get_data(as_text=True))
+		self.assertEqual(data['created'], 2)
+		self.assertEqual([r['status'] for r in data['results']], [201, 400, 400, 201])
+		self.assertEqual(data['results'][0]['post']['body_html'],
+						 '<p>first <em>post</em></p>')
+		self.assertEqual(self.commits, 1)
+		self.assertEqual(Post.query.count(), 2)
+		self.assertEqual(User.query.get(self.john.id).post_count, 2)
+
+	#渲染超时的正文在同一个请求中只渲染一次，逐条赋值时不再重试
+	def test_batch_timeout_is_not_retried(self):
+		collected = Counter()
+		#每一项都按超时处理
+		def timed_out_collect(pool, text, result):
+			collected[text] += 1
+			return None
+		renderer._collect = timed_out_collect
+		try:
+			response = self.post('/api/v1.0/posts/batch', [
+				{'body': 'slow *one*'}, {'body': 'slow *two*'}])
+		finally:
+			del renderer._collect
+		data = json.loads(response.get_data(as_text=True))
+		self.assertEqual([r['status'] for r in data['results']], [201, 201])
+		self.assertEqual(collected, Counter({'slow *one*': 1, 'slow *two*': 1}))
+		self.assertEqual(Post.query.filter(Post.body_html != None).count(), 0)
+
+	def test_batch_comments(self):
+		post = Post(body='post', author=self.john)
+		db.session.add(post)
+		db.session.commit()
+		response = self.post('/api/v1.0/posts/%d/comments/batch' % post.id,
+							 [{'body': 'comment %d' % i} for i in range(3)])
+		data = json.loads(response.get_data(as_text=True))
+		self.assertEqual([r['status'] for r in data['results']], [201] * 3)
+		self.assertEqual(Comment.query.filter_by(post_id=post.id).count(), 3)
+		self.assertEqual(Post.query.get(post.id).comment_count, 3)
+		response = self.post('/api/v1.0/posts/999/comments/batch', [{'body': 'x'}])
+		self.assertEqual(response.status_code, 404)
+
+	def test_batch_limits(self):
+		self.app.config['FLASKY_API_BATCH_LIMIT'] = 2
+		response = self.post('/api/v1.0/posts/batch', [{'body': 'x'}] * 3)
+		self.assertEqual(response.status_code, 400)
+		response = self.post('/api/v1.0/posts/batch', {'body': 'x'})
+		self.assertEqual(response.status_code, 400)
+		self.assertEqual(Post.query.count(), 0)
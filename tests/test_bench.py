@@ -0,0 +1,70 @@
+# -*- coding:UTF-8 -*-
+
+import unittest
+from datetime import datetime
+from app import create_app, db
+from app.bench import Benchmark, QueryStats, percentile, format_results
+from app.models import Role, Post
+from app.seed import Seeder
+
+
+#基准测试命令的测试
+class BenchTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+
+	def tearDown(self):
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def test_percentile(self):
+		values = list(range(1, 101))
+		self.assertEqual(percentile(values, 50), 50)
+		self.assertEqual(percentile(values, 95), 95)
+		self.assertEqual(percentile(values, 99), 99)
+		self.assertEqual(percentile([7], 99), 7)
+		self.assertEqual(percentile([], 50), 0.0)
+
+	def test_query_stats_per_thread(self):
+		stats = QueryStats()
+		stats.install(db.engine)
+		try:
+			stats.reset()
+			Post.query.all()
+			db.session.query(db.func.count(Post.id)).scalar()
+			statements, seconds, rows = stats.snapshot()
+		finally:
+			stats.remove(db.engine)
+		self.assertEqual(statements, 2)
+		self.assertEqual(rows, 0)
+
+	def test_requires_seeded_database(self):
+		with self.assertRaises(ValueError):
+			Benchmark(self.app, requests=1, concurrency=1).scenarios()
+
+	def test_run_reports_every_endpoint(self):
+		Seeder(users=20, posts=60, comments=60, follows=4, seed=3,
+			   end=datetime(2017, 1, 1)).run()
+		db.session.remove()
+		self.app_context.pop()
+		try:
+			report = Benchmark(self.app, requests=4, concurrency=1).run()
+		finally:
+			self.app_context.push()
+		names = [r['endpoint'] for r in report['results']]
+		self.assertIn('main.index (followed)', names)
+		self.assertIn('api.get_user_followed_posts', names)
+		self.assertIn('api.new_post', names)
+		self.assertEqual(report['dataset']['users'], 20)
+		for result in report['results']:
+			self.assertEqual(result['errors'], 0, result['endpoint'])
+			self.assertEqual(result['requests'], 4)
+			self.assertTrue(result['statements'] > 0, result['endpoint'])
+			self.assertTrue(result['latency_ms']['p99'] >=
+							result['latency_ms']['p50'])
+		self.assertIn('main.post', format_results(report, report))
@@ -0,0 +1,90 @@
+# -*- coding:UTF-8 -*-
+
+import shutil
+import tempfile
+import unittest
+from app import create_app, db, page_cache
+from app.cache import PageCache
+from app.models import User, Role, Post, Comment
+
+
+#匿名整页缓存测试
+class PageCacheTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		page_cache.clear()
+		self.john = User(email='john@example.com', username='john',
+						 password='cat', confirmed=True)
+		self.post = Post(body='first post', author=self.john)
+		db.session.add_all([self.john, self.post])
+		db.session.commit()
+		self.client = self.app.test_client(use_cookies=True)
+
+	def tearDown(self):
+		page_cache.clear()
+		page_cache.directory = None
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def get(self, url):
+		response = self.client.get(url)
+		self.assertEqual(response.status_code, 200)
+		return response.headers.get('X-Page-Cache'), \
+			response.get_data(as_text=True)
+
+	def test_anonymous_pages_are_cached(self):
+		for url in ('/', '/user/john', '/post/%d' % self.post.id):
+			self.assertEqual(self.get(url)[0], 'MISS')
+			self.assertEqual(self.get(url)[0], 'HIT')
+
+	def test_commit_invalidates_dependent_pages(self):
+		post_url = '/post/%d' % self.post.id
+		for url in ('/', '/user/john', post_url):
+			self.get(url)
+		db.session.add(Comment(body='a comment', post=self.post,
+							   author=self.john))
+		db.session.commit()
+		self.assertEqual(self.get('/')[0], 'HIT')
+		state, data = self.get(post_url)
+		self.assertEqual(state, 'MISS')
+		self.assertIn('a comment', data)
+		db.session.add(Post(body='second post', author=self.john))
+		db.session.commit()
+		self.assertEqual(self.get('/')[0], 'MISS')
+		self.assertEqual(self.get('/user/john')[0], 'MISS')
+
+	def test_rollback_keeps_cache(self):
+		self.get('/')
+		self.post.body = 'changed'
+		db.session.flush()
+		db.session.rollback()
+		self.assertEqual(self.get('/')[0], 'HIT')
+
+	def test_authenticated_and_flashed_requests_bypass(self):
+		self.client.post('/auth/login', data={'email': 'john@example.com',
+											  'password': 'cat'})
+		self.assertIsNone(self.get('/')[0])
+		self.client.get('/auth/logout')
+		state, data = self.get('/')
+		self.assertIsNone(state)
+		self.assertIn('你已经注销了', data)
+
+	#另一个进程提交后通过共享目录使本进程缓存的页面失效
+	def test_invalidation_shared_across_processes(self):
+		directory = tempfile.mkdtemp()
+		try:
+			page_cache.directory = directory
+			other = PageCache()
+			other.directory = directory
+			post_url = '/post/%d' % self.post.id
+			self.get(post_url)
+			other.invalidate('post:%d' % self.post.id)
+			self.assertEqual(self.get(post_url)[0], 'MISS')
+			self.assertEqual(self.get(post_url)[0], 'HIT')
+		finally:
+			shutil.rmtree(directory)
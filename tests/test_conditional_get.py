@@ -0,0 +1,76 @@
+# -*- coding:UTF-8 -*-
+
+import unittest
+from base64 import b64encode
+from unittest import mock
+from app import create_app, db
+from app.models import User, Role, Post
+from app.serializers import posts_to_json
+
+
+#API条件GET测试
+class ConditionalGetTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		self.john = User(email='john@example.com', username='john',
+						 password='cat', confirmed=True)
+		self.post = Post(body='first post', author=self.john)
+		db.session.add_all([self.john, self.post])
+		db.session.commit()
+		self.client = self.app.test_client()
+		self.headers = {
+			'Authorization': 'Basic ' + b64encode(
+				b'john@example.com:cat').decode('utf-8'),
+			'Accept': 'application/json'}
+
+	def tearDown(self):
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def get(self, **headers):
+		headers.update(self.headers)
+		return self.client.get('/api/v1.0/posts/', headers=headers)
+
+	def test_etag_round_trip(self):
+		response = self.get()
+		self.assertEqual(response.status_code, 200)
+		etag = response.headers['ETag']
+		self.assertTrue(etag.startswith('W/'))
+		self.assertIsNone(response.headers.get('Last-Modified'))
+		with mock.patch('app.api_1_0.posts.posts_to_json',
+						wraps=posts_to_json) as to_json:
+			response = self.get(**{'If-None-Match': etag})
+			self.assertEqual(response.status_code, 304)
+			self.assertFalse(to_json.called)
+			self.assertEqual(self.get().status_code, 200)
+			self.assertTrue(to_json.called)
+		self.assertEqual(response.headers['ETag'], etag)
+
+	def test_edits_change_etag(self):
+		etag = self.get().headers['ETag']
+		self.post.body = 'edited post'
+		db.session.commit()
+		response = self.get(**{'If-None-Match': etag})
+		self.assertEqual(response.status_code, 200)
+		self.assertNotEqual(response.headers['ETag'], etag)
+
+	def test_deletes_change_etag(self):
+		newer = Post(body='second post', author=self.john)
+		db.session.add(newer)
+		db.session.commit()
+		etag = self.get().headers['ETag']
+		db.session.delete(self.post)
+		db.session.commit()
+		response = self.get(**{'If-None-Match': etag})
+		self.assertEqual(response.status_code, 200)
+
+	#只按ETag判断，If-Modified-Since被忽略
+	def test_if_modified_since_ignored(self):
+		response = self.get(**{'If-Modified-Since':
+							   'Fri, 01 Jan 2100 00:00:00 GMT'})
+		self.assertEqual(response.status_code, 200)
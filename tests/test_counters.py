@@ -0,0 +1,53 @@
+# -*- coding:UTF-8 -*-
+
+import unittest
+from app import create_app, db
+from app.models import User, Role, Post, Comment
+
+
+#计数列测试
+class CountersTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		self.john = User(email='john@example.com', username='john',
+						 password='cat')
+		self.susan = User(email='susan@example.com', username='susan',
+						  password='dog')
+		db.session.add_all([self.john, self.susan])
+		db.session.commit()
+
+	def tearDown(self):
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def test_counters_follow_writes(self):
+		post = Post(body='post', author=self.john)
+		db.session.add(post)
+		db.session.add(Comment(body='comment', post=post, author=self.susan))
+		self.susan.follow(self.john)
+		db.session.commit()
+		self.assertEqual(self.john.post_count, 1)
+		self.assertEqual(post.comment_count, 1)
+		#自己关注自己也计算在内，与followers.count()一致
+		self.assertEqual(self.john.follower_count, 2)
+		self.assertEqual(self.susan.followed_count, 2)
+		self.susan.unfollow(self.john)
+		db.session.commit()
+		self.assertEqual(self.john.follower_count, 1)
+		self.assertEqual(self.susan.followed_count, 1)
+
+	def test_recount_repairs_drift(self):
+		db.session.add(Post(body='post', author=self.john))
+		db.session.commit()
+		self.john.post_count = 42
+		self.john.follower_count = 0
+		db.session.commit()
+		User.recount()
+		Post.recount()
+		self.assertEqual(self.john.post_count, 1)
+		self.assertEqual(self.john.follower_count, 1)
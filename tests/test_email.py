@@ -0,0 +1,176 @@
+# -*- coding:UTF-8 -*-
+
+import smtplib
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db, mail, mail_spooler, metrics
+from app.email import send_email, CircuitBreaker
+from app.models import User, Role, QueuedMail
+
+
+#持久化邮件队列测试
+class MailQueueTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		self.user = User(email='john@example.com', username='john', password='cat')
+		db.session.add(self.user)
+		db.session.commit()
+		self.connect = mail.connect
+
+	def tearDown(self):
+		mail.connect = self.connect
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def queue(self, count=1):
+		with self.app.test_request_context():
+			for i in range(count):
+				send_email('user%d@example.com' % i, 'Confirm', 'auth/email/confirm',
+						   user=self.user, token='token')
+		db.session.commit()
+
+	def fail_connect(self):
+		def connect():
+			raise IOError('smtp down')
+		mail.connect = connect
+
+	def test_send_email_is_persisted(self):
+		self.queue()
+		queued = QueuedMail.query.one()
+		self.assertEqual(queued.status, 'pending')
+		self.assertEqual(queued.recipients, 'user0@example.com')
+		self.assertTrue(queued.subject.endswith('Confirm'))
+		self.assertIn('token', queued.body)
+		self.assertEqual(mail_spooler.workers, [])
+
+	#提交后才唤醒工作线程，回滚的邮件不唤醒
+	def test_notify_after_commit(self):
+		notified = []
+		mail_spooler.notify = lambda: notified.append(True)
+		try:
+			with self.app.test_request_context():
+				send_email('user@example.com', 'Confirm', 'auth/email/confirm',
+						   user=self.user, token='token')
+			self.assertEqual(notified, [])
+			db.session.commit()
+			self.assertEqual(notified, [True])
+			with self.app.test_request_context():
+				send_email('user@example.com', 'Confirm', 'auth/email/confirm',
+						   user=self.user, token='token')
+			db.session.rollback()
+			db.session.commit()
+			self.assertEqual(notified, [True])
+		finally:
+			del mail_spooler.notify
+
+	#发送结果和熔断状态通过/metrics导出
+	def test_stats_are_collected(self):
+		def collected():
+			return dict(((name, labels), value)
+						for name, labels, value in mail_spooler.collect())
+		before = collected()
+		self.queue(2)
+		self.fail_connect()
+		mail_spooler.process_batch()
+		mail.connect = self.connect
+		QueuedMail.query.update({'next_attempt': datetime.utcnow()})
+		db.session.commit()
+		with mail.record_messages():
+			mail_spooler.process_batch()
+		after = collected()
+		self.assertEqual(after[('flasky_mail_sent_total', ())] -
+						 before[('flasky_mail_sent_total', ())], 2)
+		self.assertEqual(after[('flasky_mail_failures_total', (('outcome', 'retried'),))] -
+						 before[('flasky_mail_failures_total', (('outcome', 'retried'),))], 2)
+		self.assertIn('flasky_mail_breaker_open', metrics.render())
+
+	def test_batch_delivered_over_one_connection(self):
+		self.queue(3)
+		with mail.record_messages() as outbox:
+			self.assertEqual(mail_spooler.process_batch(), 3)
+		self.assertEqual([m.recipients for m in outbox],
+						 [['user0@example.com'], ['user1@example.com'],
+						  ['user2@example.com']])
+		self.assertEqual(QueuedMail.query.filter_by(status='sent').count(), 3)
+		self.assertEqual(mail_spooler.process_batch(), 0)
+		self.assertEqual(mail_spooler.stats()['depth'], 0)
+
+	def test_failure_backs_off_then_dies(self):
+		self.queue()
+		self.fail_connect()
+		self.assertEqual(mail_spooler.process_batch(), 0)
+		queued = QueuedMail.query.one()
+		self.assertEqual(queued.status, 'pending')
+		self.assertEqual(queued.attempts, 1)
+		self.assertIn('smtp down', queued.last_error)
+		self.assertTrue(queued.next_attempt > datetime.utcnow())
+		#退避期间不会再次领取
+		self.assertEqual(mail_spooler.claim(), [])
+		mail_spooler.max_attempts = 2
+		try:
+			queued.next_attempt = datetime.utcnow()
+			db.session.commit()
+			mail_spooler.process_batch()
+		finally:
+			mail_spooler.init_app(self.app)
+		self.assertEqual(QueuedMail.query.one().status, 'dead')
+
+	def test_rejected_message_does_not_fail_batch(self):
+		self.queue(3)
+		attempted = []
+
+		class Connection(object):
+			def __enter__(self):
+				return self
+
+			def __exit__(self, *args):
+				pass
+
+			def send(self, msg):
+				attempted.append(msg.recipients[0])
+				if msg.recipients[0] == 'user0@example.com':
+					raise smtplib.SMTPRecipientsRefused(
+						{'user0@example.com': (550, b'no such user')})
+				if msg.recipients[0] == 'user1@example.com':
+					raise smtplib.SMTPRecipientsRefused(
+						{'user1@example.com': (450, b'mailbox busy')})
+		mail.connect = Connection
+		self.assertEqual(mail_spooler.process_batch(), 1)
+		#被拒绝的邮件之后的邮件照常发送，熔断器不计失败
+		self.assertEqual(attempted, ['user0@example.com', 'user1@example.com',
+									 'user2@example.com'])
+		self.assertEqual(mail_spooler.breaker.state, 'closed')
+		self.assertEqual(mail_spooler.breaker.failures, 0)
+		statuses = dict((q.recipients, q.status) for q in QueuedMail.query)
+		self.assertEqual(statuses, {'user0@example.com': 'dead',
+									'user1@example.com': 'pending',
+									'user2@example.com': 'sent'})
+
+	def test_expired_lease_is_reclaimed(self):
+		self.queue()
+		self.assertEqual(len(mail_spooler.claim()), 1)
+		self.assertEqual(mail_spooler.claim(), [])
+		queued = QueuedMail.query.one()
+		queued.claimed_at = datetime.utcnow() - timedelta(
+			seconds=mail_spooler.lease + 1)
+		db.session.commit()
+		self.assertEqual(len(mail_spooler.claim()), 1)
+
+	def test_circuit_breaker(self):
+		breaker = CircuitBreaker(threshold=2, cooldown=60)
+		breaker.failure()
+		self.assertTrue(breaker.allow())
+		breaker.failure()
+		self.assertEqual(breaker.state, 'open')
+		self.assertFalse(breaker.allow())
+		breaker.opened_at -= 60
+		self.assertEqual(breaker.state, 'half-open')
+		self.assertTrue(breaker.allow())
+		self.assertFalse(breaker.allow())
+		breaker.success()
+		self.assertEqual(breaker.state, 'closed')
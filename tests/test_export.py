@@ -0,0 +1,74 @@
+# -*- coding:UTF-8 -*-
+
+import gzip
+import json
+import unittest
+from base64 import b64encode
+from app import create_app, db
+from app.models import User, Role, Post, Comment
+
+
+#NDJSON流式导出测试
+class ExportTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app.config['FLASKY_EXPORT_BATCH_SIZE'] = 2
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		self.john = User(email='john@example.com', username='john',
+						 password='cat', confirmed=True)
+		db.session.add(self.john)
+		for i in range(5):
+			post = Post(body='post %d' % i, author=self.john)
+			db.session.add(post)
+			db.session.add(Comment(body='comment %d' % i, post=post,
+								   author=self.john))
+		db.session.commit()
+		self.client = self.app.test_client()
+		credentials = b64encode(b'john@example.com:cat').decode('ascii')
+		self.headers = {'Authorization': 'Basic ' + credentials}
+
+	def tearDown(self):
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def lines(self, response):
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.mimetype, 'application/x-ndjson')
+		data = response.get_data()
+		if response.headers.get('Content-Encoding') == 'gzip':
+			data = gzip.decompress(data)
+		return [json.loads(line) for line in data.decode('utf-8').splitlines()]
+
+	def test_export_posts(self):
+		rows = self.lines(self.client.get('/api/v1.0/posts/export',
+										  headers=self.headers))
+		self.assertEqual([row['body'] for row in rows],
+						 ['post %d' % i for i in range(5)])
+		self.assertTrue(rows[0]['url'].endswith('/api/v1.0/posts/%d' % rows[0]['id']))
+
+		#从中断处继续
+		rows = self.lines(self.client.get(
+			'/api/v1.0/posts/export?since=%d' % rows[2]['id'], headers=self.headers))
+		self.assertEqual([row['body'] for row in rows], ['post 3', 'post 4'])
+
+		response = self.client.get('/api/v1.0/posts/export?since=x',
+								   headers=self.headers)
+		self.assertEqual(response.status_code, 400)
+
+	def test_export_gzip(self):
+		headers = dict(self.headers)
+		headers['Accept-Encoding'] = 'gzip'
+		response = self.client.get('/api/v1.0/comments/export', headers=headers)
+		self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+		rows = self.lines(response)
+		self.assertEqual(len(rows), 5)
+		self.assertEqual(rows[4]['body'], 'comment 4')
+
+		rows = self.lines(self.client.get('/api/v1.0/users/export',
+										  headers=self.headers))
+		self.assertEqual([row['username'] for row in rows], ['john'])
+		self.assertEqual(rows[0]['post_count'], 5)
@@ -0,0 +1,119 @@
+# -*- coding:UTF-8 -*-
+
+import shutil
+import tempfile
+import unittest
+from app import create_app, db, follow_graph
+from app.graph import FollowGraph
+from app.models import User, Role, Follow
+
+
+#关注关系缓存测试
+class FollowGraphTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		self.users = [User(email='user%d@example.com' % i, username='user%d' % i,
+						   password='cat') for i in range(4)]
+		db.session.add_all(self.users)
+		db.session.commit()
+		self.statements = []
+		db.event.listen(db.engine, 'before_cursor_execute', self.count)
+
+	def tearDown(self):
+		db.event.remove(db.engine, 'before_cursor_execute', self.count)
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def count(self, conn, cursor, statement, parameters, context, executemany):
+		self.statements.append(statement)
+
+	def test_membership_is_cached(self):
+		a, b, c, d = self.users
+		a.follow(b)
+		a.follow(d)
+		b.follow(a)
+		db.session.commit()
+		self.assertTrue(a.is_following(b))
+		#提交后先重新加载过期的用户对象，之后只有读取b和d的关注列表需要查询
+		[u.id for u in self.users]
+		del self.statements[:]
+		self.assertTrue(a.is_following(d))
+		self.assertFalse(a.is_following(c))
+		self.assertTrue(b.is_followed_by(a))
+		self.assertTrue(a.is_mutual_follow(b))
+		self.assertFalse(a.is_mutual_follow(d))
+		self.assertTrue(follow_graph.follows_you(b.id, a.id))
+		self.assertEqual(len(self.statements), 2)
+		self.assertEqual(list(follow_graph.followed(a.id)), sorted([a.id, b.id, d.id]))
+		self.assertEqual(list(follow_graph.followers(a.id)), sorted([a.id, b.id]))
+
+	def test_invalidation(self):
+		a, b, c, d = self.users
+		self.assertFalse(a.is_following(b))
+		a.follow(b)
+		#未提交的关注在同一事务中也能判断出来
+		self.assertTrue(a.is_following(b))
+		db.session.commit()
+		self.assertTrue(a.is_following(b))
+		a.unfollow(b)
+		db.session.commit()
+		self.assertFalse(a.is_following(b))
+		self.assertTrue(a.is_following(a))
+
+		a.follow(c)
+		self.assertTrue(a.is_following(c))
+		db.session.rollback()
+		self.assertFalse(a.is_following(c))
+
+	def test_writes_ignore_stale_cache(self):
+		a, b, c, d = self.users
+		follows = Follow.__table__
+		#缓存之后其他进程提交的关注：follow不重复插入
+		self.assertFalse(a.is_following(b))
+		db.engine.execute(follows.insert(), {'follower_id': a.id, 'followed_id': b.id})
+		self.assertFalse(a.is_following(b))
+		self.assertFalse(a.follow(b))
+		db.session.commit()
+		follow_graph.invalidate(a.id)
+		self.assertTrue(a.is_following(b))
+
+		#缓存之后其他进程取消的关注：unfollow不是空操作，也不报错
+		self.assertTrue(a.follow(c))
+		db.session.commit()
+		self.assertTrue(a.is_following(c))
+		db.engine.execute(follows.delete().where(db.and_(
+			follows.c.follower_id == a.id, follows.c.followed_id == c.id)))
+		self.assertFalse(a.unfollow(c))
+		self.assertTrue(a.unfollow(b))
+		db.session.commit()
+		self.assertFalse(a.is_following(b))
+
+	def test_shared_store(self):
+		directory = tempfile.mkdtemp()
+		try:
+			self.app.config['FLASKY_FOLLOW_CACHE_DIR'] = directory
+			first, second = FollowGraph(self.app), FollowGraph(self.app)
+			a, b = self.users[:2]
+			a.follow(b)
+			db.session.commit()
+			self.assertEqual(list(first.followed(a.id)), sorted([a.id, b.id]))
+			del self.statements[:]
+			self.assertTrue(second.is_following(a.id, b.id))
+			self.assertEqual(self.statements, [])
+			first.invalidate(a.id)
+			self.assertIsNone(second.store.get('followed', a.id))
+		finally:
+			shutil.rmtree(directory)
+
+	def test_size_limit(self):
+		graph = FollowGraph(self.app)
+		graph.size = 2
+		for u in self.users:
+			graph.followed(u.id)
+		self.assertEqual(len(graph.entries), 2)
+		self.assertEqual(graph.total, 2)
@@ -0,0 +1,73 @@
+# -*- coding:UTF-8 -*-
+
+import os
+import tempfile
+import unittest
+from app import create_app, db
+from app import indexes
+
+
+#索引顾问测试
+class IndexAdvisorTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+
+	def tearDown(self):
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def test_explainable(self):
+		self.assertEqual(indexes.explainable(
+			'SELECT posts.id FROM posts WHERE posts.id IN (?...) AND posts.author_id = ?'),
+			'SELECT posts.id FROM posts WHERE posts.id IN (1, 2) AND posts.author_id = 1')
+		self.assertIsNone(indexes.explainable('INSERT INTO posts (body) VALUES (?)'))
+
+	def test_candidate(self):
+		statement = ('SELECT posts.id FROM posts WHERE posts.author_id = 1 '
+					 'ORDER BY posts.timestamp DESC, posts.id DESC LIMIT 1')
+		self.assertEqual(indexes.candidate(statement, 'posts'),
+						 (['author_id', 'timestamp', 'id'], 2))
+		#WHERE中的条件优先于连接条件
+		statement = ('SELECT users.id FROM follows JOIN users ON users.id = '
+					 'follows.follower_id WHERE 1 = follows.followed_id')
+		self.assertEqual(indexes.candidate(statement, 'follows'), (['followed_id'], 1))
+		statement = 'SELECT posts.id FROM posts WHERE posts.timestamp > 1'
+		self.assertEqual(indexes.candidate(statement, 'posts'), (['timestamp'], 1))
+
+	def test_from_log(self):
+		fd, path = tempfile.mkstemp()
+		try:
+			with os.fdopen(fd, 'w') as f:
+				f.write('Slow query [abc] 0.812s: SELECT posts.id FROM posts '
+						'WHERE posts.author_id = 3\n')
+				f.write('INSERT INTO posts (body) VALUES (1)\n')
+			statements = list(indexes.from_log(path).values())
+		finally:
+			os.remove(path)
+		self.assertEqual(statements,
+						 ['SELECT posts.id FROM posts WHERE posts.author_id = ?'])
+
+	def test_advise(self):
+		#文章按作者分页已有复合索引，去掉评论的复合索引后应该建议重建
+		covered = ('SELECT posts.id FROM posts WHERE posts.author_id = ? '
+				   'ORDER BY posts.timestamp DESC, posts.id DESC LIMIT ?')
+		statement = ('SELECT comments.id FROM comments WHERE comments.post_id = ? '
+					 'ORDER BY comments.timestamp DESC, comments.id DESC LIMIT ?')
+		with db.engine.connect() as connection:
+			connection.execute('DROP INDEX ix_comments_post_timestamp')
+			report, suggestions = indexes.advise(connection, {'p': covered,
+															  'a': statement})
+		self.assertEqual(list(suggestions),
+						 [('comments', ('post_id', 'timestamp', 'id'))])
+		self.assertIn('suggest   comments(post_id, timestamp, id)',
+					  indexes.format_report(report))
+		revision, source = indexes.render_migration(suggestions, 'b17d3e5c8a42')
+		self.assertIn("down_revision = 'b17d3e5c8a42'", source)
+		self.assertIn("op.create_index('ix_comments_post_id_timestamp_id', 'comments', "
+					  "['post_id', 'timestamp', 'id'], unique=False)", source)
+		self.assertIn("op.drop_index('ix_comments_post_id_timestamp_id'", source)
+		compile(source, 'migration', 'exec')
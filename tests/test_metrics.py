@@ -0,0 +1,146 @@
+# -*- coding:UTF-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from base64 import b64encode
+from app import create_app, db, metrics, page_cache
+from app.metrics import normalize, fingerprint
+from app.models import User, Role
+
+
+#请求度量和/metrics端点测试
+class MetricsTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		admin = Role.query.filter_by(name='Administrator').first()
+		self.admin = User(email='admin@example.com', username='admin',
+						  password='cat', confirmed=True, role=admin)
+		self.user = User(email='john@example.com', username='john',
+						 password='cat', confirmed=True)
+		db.session.add_all([self.admin, self.user])
+		db.session.commit()
+		metrics.reset()
+		page_cache.clear()
+		self.client = self.app.test_client()
+
+	def tearDown(self):
+		metrics.init_app(self.app)
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def scrape(self, user):
+		token = user.generate_auth_token(3600)
+		credentials = b64encode((token + ':').encode('utf-8')).decode('ascii')
+		return self.client.get('/metrics', headers={
+			'Authorization': 'Basic ' + credentials})
+
+	def test_normalize(self):
+		self.assertEqual(
+			normalize("SELECT * FROM posts WHERE id IN (?, ?, ?) AND body = 'x''y'\n LIMIT 20"),
+			'SELECT * FROM posts WHERE id IN (?...) AND body = ? LIMIT ?')
+		self.assertEqual(normalize('SELECT a FROM t WHERE b = %(b_1)s'),
+						 normalize('SELECT a FROM t WHERE b = :b_1'))
+		self.assertEqual(fingerprint(normalize('SELECT 1')),
+						 fingerprint(normalize('SELECT  2')))
+
+	def test_metrics_requires_administrator(self):
+		self.assertEqual(self.client.get('/metrics').status_code, 403)
+		self.assertEqual(self.scrape(self.user).status_code, 403)
+		response = self.scrape(self.admin)
+		self.assertEqual(response.status_code, 200)
+		self.assertTrue(response.content_type.startswith('text/plain'))
+
+	def test_request_histograms(self):
+		self.client.get('/')
+		self.client.get('/user/john')
+		text = self.scrape(self.admin).get_data(as_text=True)
+		self.assertIn('# TYPE flasky_request_duration_seconds histogram', text)
+		self.assertIn('flasky_request_duration_seconds_count{endpoint="main.index",'
+					  'method="GET"} 1', text)
+		self.assertIn('flasky_request_sql_statements_bucket{endpoint="main.user",'
+					  'le="+Inf"} 1', text)
+		self.assertIn('flasky_template_render_seconds_count{template="index.html"} 1',
+					  text)
+		self.assertIn('flasky_requests_total{endpoint="main.index",method="GET",'
+					  'status="200"} 1.0', text)
+
+	def test_slow_statements_are_fingerprinted(self):
+		metrics.slow_threshold = 0
+		self.client.get('/user/john')
+		self.client.get('/user/admin')
+		metrics.slow_threshold = 10
+		text = metrics.render()
+		lines = [line for line in text.splitlines()
+				 if line.startswith('flasky_slow_statement_info')]
+		#两次请求的同形语句合并成一个指纹
+		by_username = [statement for statement in metrics.statements.values()
+					   if 'WHERE users.username = ?' in statement]
+		self.assertEqual(len(by_username), 1)
+		self.assertNotIn('john', '\n'.join(lines))
+
+	def test_snapshots_merge_across_processes(self):
+		directory = tempfile.mkdtemp()
+		try:
+			metrics.directory = directory
+			self.client.get('/')
+			#模拟另一个工作进程写入的快照
+			other = metrics.snapshot()
+			with open(os.path.join(directory, 'metrics-0.json'), 'w') as f:
+				json.dump(other, f)
+			text = metrics.render()
+			self.assertIn('flasky_request_duration_seconds_count{endpoint="main.index",'
+						  'method="GET"} 2', text)
+			self.assertTrue(os.path.exists(os.path.join(
+				directory, metrics.snapshot_name())))
+			self.assertTrue(metrics.snapshot_name().startswith(
+				'metrics-%d-' % os.getpid()))
+		finally:
+			metrics.directory = None
+			shutil.rmtree(directory)
+
+	#已退出进程的快照过期后并入归档，计数不会倒退
+	def test_stale_snapshots_are_archived(self):
+		directory = tempfile.mkdtemp()
+		try:
+			metrics.directory = directory
+			self.client.get('/')
+			stale = os.path.join(directory, 'metrics-0-00000000.json')
+			with open(stale, 'w') as f:
+				json.dump(metrics.snapshot(), f)
+			old = os.path.getmtime(stale) - metrics.snapshot_ttl - 1
+			os.utime(stale, (old, old))
+			for i in range(2):
+				text = metrics.render()
+				self.assertIn('flasky_request_duration_seconds_count{endpoint="main.index",'
+							  'method="GET"} 2', text)
+			self.assertFalse(os.path.exists(stale))
+			self.assertTrue(os.path.exists(os.path.join(directory, 'metrics-archive.json')))
+		finally:
+			metrics.directory = None
+			shutil.rmtree(directory)
+
+	#请求之后启动后台线程定期刷新快照，空闲的进程不会被当成已退出
+	def test_snapshots_refresh_on_timer(self):
+		directory = tempfile.mkdtemp()
+		try:
+			metrics.directory = directory
+			metrics.interval = 0.05
+			self.client.get('/')
+			path = os.path.join(directory, metrics.snapshot_name())
+			for i in range(100):
+				if os.path.exists(path):
+					break
+				time.sleep(0.05)
+			self.assertTrue(os.path.exists(path))
+		finally:
+			metrics.directory = None
+			shutil.rmtree(directory)
@@ -0,0 +1,117 @@
+# -*- coding:UTF-8 -*-
+
+import json
+import unittest
+from base64 import b64encode
+from app import create_app, db
+from app.models import User, Role, Post, Comment
+from app.search import search
+
+
+#批量评论审核测试
+class ModerationTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		moderator = Role.query.filter_by(name='Moderator').first()
+		self.mod = User(email='mod@example.com', username='mod', password='cat',
+						confirmed=True, role=moderator)
+		self.john = User(email='john@example.com', username='john',
+						 password='cat', confirmed=True)
+		self.post = Post(body='post', author=self.john)
+		db.session.add_all([self.mod, self.john, self.post])
+		db.session.commit()
+		self.comments = [Comment(body='comment%d apple' % i, post=self.post,
+								 author=self.john) for i in range(4)]
+		db.session.add_all(self.comments)
+		db.session.commit()
+		self.ids = [c.id for c in self.comments]
+		self.statements = []
+		db.event.listen(db.engine, 'before_cursor_execute', self.count)
+
+	def tearDown(self):
+		db.event.remove(db.engine, 'before_cursor_execute', self.count)
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def count(self, conn, cursor, statement, parameters, context, executemany):
+		self.statements.append(statement)
+
+	def disabled_ids(self):
+		return sorted(id for id, in db.session.query(Comment.id).filter(
+			Comment.disabled == True))
+
+	def hits(self):
+		return sorted(id for doc_type, id, score in search('apple', 'comment')[0])
+
+	def test_set_disabled(self):
+		self.assertEqual(self.disabled_ids(), [])
+		del self.statements[:]
+		changed = Comment.set_disabled(self.ids[:3], True)
+		self.assertEqual(sorted(changed), self.ids[:3])
+		updates = [s for s in self.statements if s.startswith('UPDATE comments')]
+		self.assertEqual(len(updates), 1)
+		db.session.commit()
+		self.assertEqual(self.disabled_ids(), self.ids[:3])
+		#集合式UPDATE不经过映射器事件，搜索索引要同步更新
+		self.assertEqual(self.hits(), self.ids[3:])
+		self.assertTrue(self.comments[0].disabled)
+
+		#已经是目标状态的评论不再修改
+		self.assertEqual(Comment.set_disabled(self.ids[:2], True), [])
+		self.assertEqual(sorted(Comment.set_disabled(self.ids, False)), self.ids[:3])
+		db.session.commit()
+		self.assertEqual(self.disabled_ids(), [])
+		self.assertEqual(self.hits(), self.ids)
+
+	def test_moderate_view(self):
+		client = self.app.test_client(use_cookies=True)
+		client.post('/auth/login', data={'email': 'mod@example.com',
+										 'password': 'cat'})
+		response = client.post('/moderate', data={
+			'id': [str(id) for id in self.ids[:2]], 'disable': '禁用所选'})
+		self.assertEqual(response.status_code, 302)
+		self.assertEqual(self.disabled_ids(), self.ids[:2])
+		page = client.get('/moderate?show=disabled').get_data(as_text=True)
+		self.assertIn('comment0 apple', page)
+		self.assertNotIn('comment3 apple', page)
+		page = client.get('/moderate').get_data(as_text=True)
+		self.assertIn('comment3 apple', page)
+		self.assertNotIn('comment0 apple', page)
+		self.assertEqual(client.get('/moderate?show=bogus').status_code, 404)
+
+		response = client.get('/moderate/enable/%d?show=disabled' % self.ids[0])
+		self.assertEqual(response.status_code, 302)
+		self.assertEqual(self.disabled_ids(), self.ids[1:2])
+
+	def api(self, method, url, email, data=None):
+		credentials = b64encode((email + ':cat').encode('utf-8')).decode('ascii')
+		response = self.app.test_client().open(
+			url, method=method, data=json.dumps(data), headers={
+				'Authorization': 'Basic ' + credentials,
+				'Content-Type': 'application/json'})
+		return response.status_code, json.loads(response.get_data(as_text=True))
+
+	def test_moderate_api(self):
+		url = '/api/v1.0/comments/moderate'
+		status, data = self.api('POST', url, 'john@example.com',
+								{'ids': self.ids, 'disabled': True})
+		self.assertEqual(status, 403)
+		status, data = self.api('POST', url, 'mod@example.com',
+								{'ids': 'all', 'disabled': True})
+		self.assertEqual(status, 400)
+		status, data = self.api('POST', url, 'mod@example.com',
+								{'ids': self.ids[1:3], 'disabled': True})
+		self.assertEqual(status, 200)
+		self.assertEqual(sorted(data['changed']), self.ids[1:3])
+		self.assertEqual(self.disabled_ids(), self.ids[1:3])
+
+		status, data = self.api('GET', url + '?disabled=true', 'mod@example.com')
+		self.assertEqual(status, 200)
+		self.assertEqual(len(data['comments']), 2)
+		status, data = self.api('GET', url, 'mod@example.com')
+		self.assertEqual(len(data['comments']), 2)
@@ -0,0 +1,71 @@
+# -*- coding:UTF-8 -*-
+
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.exceptions import ValidationError
+from app.models import User, Role, Post
+from app.pagination import paginate_by_cursor, encode_cursor, \
+	decode_cursor, LAST_PAGE
+
+
+#游标分页测试
+class CursorPaginationTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		u = User(email='john@example.com', username='john', password='cat')
+		db.session.add(u)
+		#五篇文章中有两篇时间戳相同，用id区分先后
+		base = datetime(2018, 1, 1)
+		for i, minutes in enumerate([0, 1, 1, 2, 3]):
+			db.session.add(Post(body='post %d' % i, author=u,
+								timestamp=base + timedelta(minutes=minutes)))
+		db.session.commit()
+
+	def tearDown(self):
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def test_cursor_round_trip(self):
+		ts = datetime(2018, 1, 2, 3, 4, 5, 678)
+		self.assertEqual(decode_cursor(encode_cursor('n', ts, 42)),
+						 ('n', ts, 42))
+		with self.assertRaises(ValidationError):
+			decode_cursor('not-a-cursor')
+
+	def test_walk_forward_and_back(self):
+		first = paginate_by_cursor(Post.query, Post, per_page=2)
+		self.assertFalse(first.has_prev)
+		self.assertTrue(first.has_next)
+		second = paginate_by_cursor(Post.query, Post, first.next_cursor,
+									per_page=2)
+		third = paginate_by_cursor(Post.query, Post, second.next_cursor,
+								   per_page=2)
+		self.assertFalse(third.has_next)
+		seen = [p.body for p in first.items + second.items + third.items]
+		self.assertEqual(seen, ['post 4', 'post 3', 'post 2', 'post 1',
+								'post 0'])
+		back = paginate_by_cursor(Post.query, Post, third.prev_cursor,
+								  per_page=2)
+		self.assertEqual([p.id for p in back.items],
+						 [p.id for p in second.items])
+
+	def test_last_page_ascending(self):
+		last = paginate_by_cursor(Post.query, Post, LAST_PAGE, per_page=2,
+								  ascending=True)
+		self.assertEqual([p.body for p in last.items], ['post 3', 'post 4'])
+		self.assertTrue(last.has_prev)
+		self.assertFalse(last.has_next)
+
+	def test_index_cursor_links(self):
+		self.app.config['FLASKY_POSTS_PER_PAGE'] = 2
+		client = self.app.test_client()
+		response = client.get('/')
+		self.assertEqual(response.status_code, 200)
+		self.assertIn('cursor=', response.get_data(as_text=True))
+		self.assertEqual(client.get('/?cursor=bogus').status_code, 404)
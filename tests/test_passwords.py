@@ -0,0 +1,95 @@
+# -*- coding:UTF-8 -*-
+
+import unittest
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS
+from app import create_app, db, password_hasher, metrics
+from app.exceptions import ServiceUnavailable
+from app.models import User, Role
+
+
+#密码散列进程池测试
+class PasswordHasherTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+
+	def tearDown(self):
+		password_hasher.init_app(self.app)
+		password_hasher.close()
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def test_hash_and_verify_in_pool(self):
+		before = password_hasher.stats()
+		u = User(email='john@example.com', password='cat')
+		self.assertTrue(u.password_hash.startswith('pbkdf2:sha256:50000$'))
+		self.assertTrue(u.verify_password('cat'))
+		self.assertFalse(u.verify_password('dog'))
+		self.assertIsNotNone(password_hasher.pool)
+		after = password_hasher.stats()
+		self.assertEqual(after['hash'] - before['hash'], 1)
+		self.assertEqual(after['verify'] - before['verify'], 2)
+		self.assertEqual(after['in_flight'], 0)
+
+	def test_rehash_when_parameters_change(self):
+		u = User(email='john@example.com', password='cat')
+		password_hasher.method = 'pbkdf2:sha256:1000'
+		self.assertTrue(u.verify_password('cat'))
+		self.assertTrue(u.password_hash.startswith('pbkdf2:sha256:1000$'))
+		self.assertTrue(u.verify_password('cat'))
+
+	def test_queue_limit(self):
+		password_hasher.queue_limit = 0
+		before = password_hasher.stats()['rejected']
+		with self.assertRaises(ServiceUnavailable):
+			User(email='john@example.com', password='cat')
+		self.assertEqual(password_hasher.stats()['rejected'], before + 1)
+
+	#HTML视图同样返回503而不是500
+	def test_html_views_return_503(self):
+		u = User(email='john@example.com', username='john', password='cat',
+				 confirmed=True)
+		db.session.add(u)
+		db.session.commit()
+		password_hasher.queue_limit = 0
+		response = self.app.test_client().post('/auth/login', data={
+			'email': 'john@example.com', 'password': 'cat'})
+		self.assertEqual(response.status_code, 503)
+
+	#超时后换上新的进程池，卡住的工作进程被终止
+	def test_timeout_terminates_workers(self):
+		pool = password_hasher._get_pool()
+		pool.submit(int).result()
+		processes = list(pool._processes.values())
+		password_hasher.timeout = 0.000001
+		with self.assertRaises(ServiceUnavailable):
+			User(email='john@example.com', password='cat')
+		self.assertIsNotNone(password_hasher.pool)
+		self.assertIsNot(password_hasher.pool, pool)
+		for process in processes:
+			process.join(5)
+			self.assertFalse(process.is_alive())
+		password_hasher.timeout = 5
+		self.assertTrue(User(email='john@example.com', password='cat')
+						.verify_password('cat'))
+
+	#省略迭代次数的配置与werkzeug默认的迭代次数相同，不必重新散列
+	def test_rehash_compares_parameters(self):
+		u = User(email='john@example.com', password='cat')
+		self.assertFalse(password_hasher.needs_rehash(u.password_hash))
+		password_hasher.method = 'pbkdf2:sha256'
+		self.assertEqual(password_hasher.needs_rehash(u.password_hash),
+						 DEFAULT_PBKDF2_ITERATIONS != 50000)
+		password_hasher.method = 'pbkdf2:sha256:1000'
+		self.assertTrue(password_hasher.needs_rehash(u.password_hash))
+
+	def test_stats_in_metrics(self):
+		User(email='john@example.com', password='cat')
+		text = metrics.render()
+		self.assertIn('flasky_password_operations_total{kind="hash"}', text)
+		self.assertIn('# TYPE flasky_password_in_flight gauge', text)
+		self.assertIn('flasky_password_in_flight 0.0', text)
@@ -0,0 +1,64 @@
+# -*- coding:UTF-8 -*-
+
+import unittest
+from datetime import datetime
+from app import create_app, db, last_seen_buffer
+from app.models import User, Role
+
+
+#最近访问时间写后缓冲测试
+class LastSeenBufferTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app.config['FLASKY_LAST_SEEN_FLUSH_INTERVAL'] = 3600
+		self.app.config['FLASKY_LAST_SEEN_FLUSH_SIZE'] = 2
+		last_seen_buffer.init_app(self.app)
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		self.john = User(email='john@example.com', username='john',
+						 password='cat', last_seen=datetime(2018, 1, 1))
+		self.susan = User(email='susan@example.com', username='susan',
+						  password='dog', last_seen=datetime(2018, 1, 1))
+		db.session.add_all([self.john, self.susan])
+		db.session.commit()
+
+	def tearDown(self):
+		last_seen_buffer.pending.clear()
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def stored_last_seen(self, user):
+		db.session.expire(user)
+		return user.last_seen
+
+	def test_ping_is_buffered(self):
+		self.john.ping()
+		self.assertEqual(self.stored_last_seen(self.john), datetime(2018, 1, 1))
+		self.assertGreater(self.john.last_seen_at, datetime(2018, 1, 1))
+		self.assertFalse(db.session.dirty)
+
+	def test_bulk_flush(self):
+		self.john.ping()
+		self.susan.ping()
+		self.assertEqual(last_seen_buffer.pending, {})
+		self.assertGreater(self.stored_last_seen(self.john), datetime(2018, 1, 1))
+		self.assertGreater(self.stored_last_seen(self.susan), datetime(2018, 1, 1))
+
+	#定时器和退出时的写回都在应用上下文之外进行
+	def test_flush_outside_app_context(self):
+		self.john_id = self.john.id
+		self.john.ping()
+		pid, timer = last_seen_buffer.timer
+		self.assertTrue(timer.is_alive())
+		timer.cancel()
+		self.app_context.pop()
+		try:
+			last_seen_buffer.flush()
+		finally:
+			self.app_context.push()
+		self.assertEqual(last_seen_buffer.pending, {})
+		self.assertGreater(User.query.get(self.john_id).last_seen,
+						   datetime(2018, 1, 1))
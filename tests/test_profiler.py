@@ -0,0 +1,78 @@
+# -*- coding:UTF-8 -*-
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from app import create_app, db, profiler
+from app.profiler import HEADER, collapse
+from app.models import Role
+
+
+#采样分析器测试
+class ProfilerTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app.config['FLASKY_PROFILE_INTERVAL'] = 0.001
+		self.directory = tempfile.mkdtemp()
+		self.app.config['FLASKY_PROFILE_DIR'] = self.directory
+		profiler.init_app(self.app)
+
+		@self.app.route('/slow')
+		def slow():
+			deadline = time.time() + 0.05
+			while time.time() < deadline:
+				pass
+			return 'done'
+
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		self.client = self.app.test_client()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def folded(self, endpoint='slow'):
+		path = os.path.join(self.directory, '%s.folded' % endpoint)
+		if not os.path.exists(path):
+			return []
+		with open(path) as f:
+			return f.read().splitlines()
+
+	def test_collapse(self):
+		import sys
+		stack = collapse(sys._getframe())
+		self.assertTrue(stack.endswith('tests/test_profiler.py:test_collapse'))
+		self.assertNotIn(';;', stack)
+
+	def test_inactive_by_default(self):
+		self.client.get('/slow')
+		self.assertEqual(self.folded(), [])
+
+	def test_signed_header_profiles_request(self):
+		self.client.get('/slow', headers={HEADER: profiler.generate_token()})
+		lines = self.folded()
+		self.assertTrue(lines)
+		stack, count = lines[0].rsplit(' ', 1)
+		self.assertTrue(int(count) > 0)
+		self.assertTrue(any('test_profiler.py:slow' in line for line in lines))
+
+	def test_query_flag_and_bad_token(self):
+		self.client.get('/slow?_profile=forged.token.value')
+		self.assertEqual(self.folded(), [])
+		self.client.get('/slow?_profile=' + profiler.generate_token())
+		self.assertTrue(self.folded())
+
+	def test_random_sampling(self):
+		profiler.rate = 1.0
+		try:
+			self.client.get('/slow')
+		finally:
+			profiler.rate = 0
+		self.assertTrue(self.folded())
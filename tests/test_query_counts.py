@@ -0,0 +1,99 @@
+# -*- coding:UTF-8 -*-
+
+import unittest
+from base64 import b64encode
+from flask import url_for
+from app import create_app, db, page_cache
+from app.models import User, Role, Post, Comment
+
+
+#列表页的SQL语句数不应随每页条数增长
+class QueryCountTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		moderator = Role.query.filter_by(name='Moderator').first()
+		self.admin = User(email='john@example.com', username='john',
+						  password='cat', confirmed=True, role=moderator)
+		db.session.add(self.admin)
+		#每篇文章和评论都来自不同的作者
+		self.post = None
+		for i in range(12):
+			u = User(email='user%d@example.com' % i, username='user%d' % i,
+					 password='cat', confirmed=True)
+			p = Post(body='post %d' % i, author=u)
+			db.session.add_all([u, p])
+			self.post = self.post or p
+			db.session.add(Comment(body='comment %d' % i, post=self.post,
+								   author=u))
+			self.admin.follow(u)
+		#作者主页按一个文章数超过一页、评论者各不相同的用户测量
+		self.writer = User(email='writer@example.com', username='writer',
+						   password='cat', confirmed=True)
+		db.session.add(self.writer)
+		commenters = User.query.filter(User.username.like('user%')).all()
+		for i in range(12):
+			p = Post(body='writer post %d' % i, author=self.writer)
+			db.session.add(p)
+			for u in commenters[i % 4::4]:
+				db.session.add(Comment(body='reply %d' % i, post=p, author=u))
+		self.admin.follow(self.writer)
+		db.session.commit()
+		self.statements = []
+		db.event.listen(db.engine, 'before_cursor_execute', self.count)
+		self.client = self.app.test_client(use_cookies=True)
+
+	def tearDown(self):
+		db.event.remove(db.engine, 'before_cursor_execute', self.count)
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def count(self, conn, cursor, statement, parameters, context,
+			  executemany):
+		self.statements.append(statement)
+
+	def statements_for(self, url, per_page, **kwargs):
+		self.app.config['FLASKY_POSTS_PER_PAGE'] = per_page
+		self.app.config['FLASKY_COMMENTS_PER_PAGE'] = per_page
+		db.session.remove()
+		page_cache.clear()
+		del self.statements[:]
+		response = self.client.get(url, **kwargs)
+		self.assertEqual(response.status_code, 200)
+		return len(self.statements)
+
+	def assertConstant(self, url, **kwargs):
+		small = self.statements_for(url, 2, **kwargs)
+		large = self.statements_for(url, 10, **kwargs)
+		self.assertEqual(small, large, url)
+
+	def test_html_listings(self):
+		with self.app.test_request_context():
+			urls = [url_for('main.index'),
+					url_for('main.user', username='writer'),
+					url_for('main.post', id=self.post.id)]
+		for url in urls:
+			self.assertConstant(url)
+		self.client.post('/auth/login', data={'email': 'john@example.com',
+											  'password': 'cat'})
+		self.client.set_cookie('localhost', 'show_followed', '1')
+		self.assertConstant('/')
+		self.assertConstant('/moderate')
+
+	def test_api_listings(self):
+		headers = {
+			'Authorization': 'Basic ' + b64encode(
+				b'john@example.com:cat').decode('utf-8'),
+			'Accept': 'application/json'}
+		with self.app.test_request_context():
+			urls = [url_for('api.get_posts'),
+					url_for('api.get_user_posts', id=self.writer.id),
+					url_for('api.get_user_followed_posts', id=self.admin.id),
+					url_for('api.get_comments'),
+					url_for('api.get_post_comments', id=self.post.id)]
+		for url in urls:
+			self.assertConstant(url, headers=headers)
@@ -0,0 +1,99 @@
+# -*- coding:UTF-8 -*-
+
+import unittest
+from app import create_app, db, renderer
+from app.models import User, Post, rerender_bodies
+from app.render import Renderer
+
+
+#Markdown渲染缓存测试
+class RendererTestCase(unittest.TestCase):
+	def setUp(self):
+		self.renderer = Renderer()
+
+	def tearDown(self):
+		self.renderer.close()
+
+	def test_render_and_cache(self):
+		html = self.renderer.render('body of the *blog* post', 'post')
+		self.assertEqual(html, '<p>body of the <em>blog</em> post</p>')
+		self.assertEqual(len(self.renderer.cache), 1)
+		self.assertIs(self.renderer.render('body of the *blog* post', 'post'),
+					  html)
+
+	def test_profiles_are_cached_separately(self):
+		post = self.renderer.render('# title', 'post')
+		comment = self.renderer.render('# title', 'comment')
+		self.assertEqual(post, '<h1>title</h1>')
+		self.assertEqual(comment, 'title')
+		self.assertEqual(len(self.renderer.cache), 2)
+
+	def test_lru_eviction(self):
+		self.renderer.cache_size = 2
+		for text in ('one', 'two', 'three'):
+			self.renderer.render(text, 'comment')
+		self.assertEqual(len(self.renderer.cache), 2)
+
+	def test_bodies_render_in_pool(self):
+		html = self.renderer.render('a **short** body', 'post')
+		self.assertEqual(html, '<p>a <strong>short</strong> body</p>')
+		self.assertIsNotNone(self.renderer.pool)
+
+	#超时的结果不缓存，短文本同样受时间限制
+	def test_timeout_is_not_cached(self):
+		self.renderer.timeout = 0.000001
+		self.assertIsNone(self.renderer.render('*x*', 'post'))
+		self.assertIsNone(self.renderer.pool)
+		self.assertEqual(len(self.renderer.cache), 0)
+		#超时后其余的项交给新的进程池，整批仍然会结束
+		self.assertEqual(len(self.renderer.render_many(['a', 'b', 'c'], 'post')), 3)
+		self.renderer.timeout = 10
+		self.assertEqual(self.renderer.render('*x*', 'post'), '<p><em>x</em></p>')
+
+	#超时只终止自己提交任务的进程池，不影响其他线程已经换上的新进程池
+	def test_timeout_keeps_replacement_pool(self):
+		old = self.renderer._get_pool()
+		self.renderer.close()
+		new = self.renderer._get_pool()
+		self.renderer._discard(old)
+		self.assertIs(self.renderer.pool, new)
+		self.assertEqual(self.renderer.render('*y*', 'comment'), '<em>y</em>')
+
+	def test_render_many(self):
+		self.renderer.render('*cached*', 'comment')
+		html = self.renderer.render_many(
+			['*cached*', 'a **long** enough body', None, '*x*', '*x*'], 'comment')
+		self.assertEqual(html, ['<em>cached</em>',
+								'a <strong>long</strong> enough body', None,
+								'<em>x</em>', '<em>x</em>'])
+		self.assertEqual(len(self.renderer.cache), 3)
+
+
+#渲染超时的正文留空，之后由rerender_bodies补渲染
+class RerenderTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+
+	def tearDown(self):
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def test_timed_out_body_is_rendered_later(self):
+		u = User(email='john@example.com', username='john', password='cat')
+		#按超时处理；极短的时限在进程池已经预热时不一定会超时
+		renderer._collect = lambda pool, text, result: None
+		try:
+			p = Post(body='*timed out* body', author=u)
+			db.session.add(p)
+			db.session.commit()
+		finally:
+			del renderer._collect
+		self.assertIsNone(p.body_html)
+		self.assertEqual(rerender_bodies(Post, 'post', 10), 1)
+		self.assertEqual(Post.query.get(p.id).body_html,
+						 '<p><em>timed out</em> body</p>')
+		self.assertEqual(rerender_bodies(Post, 'post', 10), 0)
@@ -0,0 +1,120 @@
+# -*- coding:UTF-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from base64 import b64encode
+from datetime import datetime, timedelta
+from flask import g
+from app import create_app, db, follow_graph
+from app.models import User, Role, AnonymousUser, ReplicationHeartbeat
+
+
+#读写分离测试：主库和从库是两个SQLite文件，"复制"就是复制文件
+class RoutingTestCase(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.primary = os.path.join(self.directory, 'primary.sqlite')
+		self.replica = os.path.join(self.directory, 'replica.sqlite')
+		self.app = create_app('testing')
+		self.app.config.update(
+			SQLALCHEMY_DATABASE_URI='sqlite:///' + self.primary,
+			SQLALCHEMY_BINDS={'replica0': 'sqlite:///' + self.replica},
+			FLASKY_DB_REPLICAS=['replica0'],
+			FLASKY_DB_STICKY_DIR=os.path.join(self.directory, 'sticky'),
+			FLASKY_DB_REPLICA_CHECK_INTERVAL=0)
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		user = User(email='john@example.com', username='john', password='cat',
+					confirmed=True)
+		db.session.add_all([user, ReplicationHeartbeat(
+			id=1, timestamp=datetime.utcnow())])
+		db.session.commit()
+		self.id = user.id
+		self.replicate()
+		#只在从库中改名，由返回的用户名判断读的是哪个库
+		self.execute_on_replica("UPDATE users SET username = 'replica-john'")
+		self.client = self.app.test_client(use_cookies=True)
+
+	def tearDown(self):
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+		shutil.rmtree(self.directory)
+
+	def replicate(self):
+		db.session.remove()
+		shutil.copy(self.primary, self.replica)
+
+	def execute_on_replica(self, statement, *args):
+		db.get_engine(self.app, bind='replica0').execute(statement, *args)
+
+	def request(self, method, url, data=None, client=None):
+		db.session.remove()
+		credentials = b64encode(b'john@example.com:cat').decode('ascii')
+		response = (client or self.client).open(url, method=method, data=json.dumps(data),
+									headers={'Authorization': 'Basic ' + credentials,
+											 'Content-Type': 'application/json'})
+		return response.status_code, json.loads(response.get_data(as_text=True))
+
+	def username(self, client=None):
+		status, data = self.request('GET', '/api/v1.0/users/%d' % self.id,
+									client=client)
+		self.assertEqual(status, 200)
+		return data['username']
+
+	def test_reads_use_replica(self):
+		self.assertEqual(self.username(), 'replica-john')
+		#请求之外(命令行、后台任务)只用主库
+		db.session.remove()
+		self.assertEqual(User.query.get(self.id).username, 'john')
+
+	def test_read_your_writes(self):
+		status, data = self.request('POST', '/api/v1.0/posts/', {'body': 'hello'})
+		self.assertEqual(status, 201)
+		#写入之后的一段时间内这个用户只读主库，不依赖客户端保存的Cookie
+		self.assertEqual(self.username(self.app.test_client(use_cookies=False)), 'john')
+		self.assertEqual(self.username(), 'john')
+		shutil.rmtree(self.app.config['FLASKY_DB_STICKY_DIR'])
+		self.assertEqual(self.username(), 'replica-john')
+
+	def test_cache_fills_read_primary(self):
+		#匿名访问会写入整页缓存的页面，从主库读取
+		response = self.app.test_client().get('/user/john')
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.headers['X-Page-Cache'], 'MISS')
+
+		#从库中还没有用户关注自己的记录
+		self.execute_on_replica('DELETE FROM follows')
+		follow_graph.clear()
+		username = User.query.with_entities(User.username).filter_by(id=self.id)
+		with self.app.test_request_context('/followers/john'):
+			db.route_request()
+			g.current_user = AnonymousUser()
+			self.assertEqual(username.scalar(), 'replica-john')
+			with db.primary():
+				self.assertEqual(username.scalar(), 'john')
+			#关注关系缓存只从主库填充
+			self.assertEqual(list(follow_graph.followed(self.id)), [self.id])
+			db.end_request()
+
+	def test_lagging_replica(self):
+		self.execute_on_replica('UPDATE replication_heartbeat SET timestamp = ?',
+								datetime.utcnow() - timedelta(seconds=60))
+		self.assertEqual(self.username(), 'john')
+		self.execute_on_replica('UPDATE replication_heartbeat SET timestamp = ?',
+								datetime.utcnow())
+		self.assertEqual(self.username(), 'replica-john')
+
+	def test_unavailable_replica(self):
+		binds = self.app.config['SQLALCHEMY_BINDS']
+		self.app.config['SQLALCHEMY_BINDS'] = {
+			'replica0': 'sqlite:///' + os.path.join(self.directory, 'missing', 'db')}
+		try:
+			self.assertEqual(self.username(), 'john')
+		finally:
+			self.app.config['SQLALCHEMY_BINDS'] = binds
@@ -0,0 +1,161 @@
+# -*- coding:UTF-8 -*-
+
+import json
+import unittest
+from base64 import b64encode
+from app import create_app, db
+from app import search as search_module
+from app.models import User, Role, Post, Comment, SearchPosting, SearchStats
+from app.search import tokenize, search, reindex
+
+
+#全文搜索测试
+class SearchTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		self.john = User(email='john@example.com', username='john',
+						 password='cat', confirmed=True)
+		db.session.add(self.john)
+		db.session.commit()
+		self.client = self.app.test_client()
+
+	def tearDown(self):
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def add_post(self, body):
+		post = Post(body=body, author=self.john)
+		db.session.add(post)
+		db.session.commit()
+		return post
+
+	def ids(self, query, type=None):
+		return [(t, id) for t, id, score in search(query, type)[0]]
+
+	def test_tokenize(self):
+		self.assertEqual(tokenize('The Flask cache, v2!'), ['flask', 'cache', 'v2'])
+		self.assertEqual(tokenize('数据库', query=True), ['数据', '据库'])
+		self.assertEqual(tokenize('数据库'), ['数', '据', '库', '数据', '据库'])
+		self.assertEqual(tokenize('我 用 Python写代码', query=True),
+						 ['我', '用', 'python', '写代', '代码'])
+
+	def test_single_character_query(self):
+		post = self.add_post('小猫很可爱')
+		self.assertEqual(self.ids('猫'), [('post', post.id)])
+		self.assertEqual(self.ids('小猫'), [('post', post.id)])
+		self.assertEqual(self.ids('猫很好'), [('post', post.id)])
+		self.assertEqual(self.ids('猫小'), [])
+
+	def test_incremental_index_and_ranking(self):
+		a = self.add_post('数据库索引优化')
+		b = self.add_post('今天天气很好，数据库也很好，数据库真快')
+		c = self.add_post('flask and python')
+		self.assertEqual(self.ids('数据库')[0], ('post', b.id))
+		self.assertEqual(set(self.ids('数据库')), set([('post', a.id), ('post', b.id)]))
+		self.assertEqual(self.ids('Python'), [('post', c.id)])
+		#修改正文后重建索引
+		c.body = 'django'
+		db.session.commit()
+		self.assertEqual(self.ids('python'), [])
+		self.assertEqual(self.ids('django'), [('post', c.id)])
+		db.session.delete(c)
+		db.session.commit()
+		self.assertEqual(self.ids('django'), [])
+		self.assertEqual(SearchPosting.query.filter_by(doc_id=c.id).count(), 0)
+
+	def test_comments_and_moderation(self):
+		post = self.add_post('post')
+		comment = Comment(body='这个缓存不错', post=post, author=self.john)
+		db.session.add(comment)
+		db.session.commit()
+		self.assertEqual(self.ids('缓存', 'comment'), [('comment', comment.id)])
+		self.assertEqual(self.ids('缓存', 'post'), [])
+		comment.disabled = True
+		db.session.commit()
+		self.assertEqual(self.ids('缓存'), [])
+		comment.disabled = False
+		db.session.commit()
+		self.assertEqual(self.ids('缓存'), [('comment', comment.id)])
+
+	def stats(self):
+		return dict((s.doc_type, (s.documents, s.total_length))
+					for s in SearchStats.query.all())
+
+	def test_stats_follow_writes(self):
+		post = self.add_post('redis cache')
+		self.add_post('flask')
+		self.assertEqual(self.stats(), {'post': (2, 3)})
+		post.body = 'redis cache server'
+		db.session.commit()
+		self.assertEqual(self.stats(), {'post': (2, 4)})
+		db.session.delete(post)
+		db.session.commit()
+		self.assertEqual(self.stats(), {'post': (1, 1)})
+
+	def test_reindex(self):
+		post = self.add_post('redis cache')
+		gone = self.add_post('redis gone')
+		db.session.execute(SearchPosting.__table__.delete())
+		db.session.execute(Post.__table__.delete().where(Post.id == gone.id))
+		db.session.execute(SearchStats.__table__.delete())
+		db.session.commit()
+		self.assertEqual(self.ids('redis'), [])
+		counts = reindex(batch_size=1)
+		self.assertEqual(counts, {'post': 1, 'comment': 0})
+		self.assertEqual(self.ids('redis'), [('post', post.id)])
+		self.assertEqual(self.stats(), {'post': (1, 2)})
+
+	#重建时不清空索引，已经由写入钩子索引过的文章重复索引也不会冲突
+	def test_reindex_keeps_index_available(self):
+		posts = [self.add_post('redis %d' % i) for i in range(3)]
+		checked = []
+
+		def index_documents(connection, doc_type, documents):
+			checked.append(len(self.ids('redis')))
+			return real(connection, doc_type, documents)
+		real = search_module.index_documents
+		search_module.index_documents = index_documents
+		try:
+			reindex(batch_size=1)
+		finally:
+			search_module.index_documents = real
+		self.assertEqual(checked, [3, 3, 3])
+		self.assertEqual(len(self.ids('redis')), len(posts))
+		self.assertEqual(self.stats(), {'post': (3, 3)})
+
+	def test_postings_are_bounded(self):
+		for i in range(5):
+			self.add_post('redis %d' % i)
+		search_module.MAX_TERM_POSTINGS = 2
+		try:
+			hits, total = search('redis')
+		finally:
+			search_module.MAX_TERM_POSTINGS = 10000
+		self.assertEqual(len(hits), 2)
+		self.assertEqual(total, 5)
+
+	def test_search_views(self):
+		for i in range(3):
+			self.add_post('分页测试 %d' % i)
+		response = self.client.get('/search?q=分页')
+		self.assertEqual(response.status_code, 200)
+		self.assertIn('分页测试 2', response.get_data(as_text=True))
+		credentials = b64encode(b'john@example.com:cat').decode('ascii')
+		self.app.config['FLASKY_SEARCH_RESULTS_PER_PAGE'] = 2
+		response = self.client.get('/api/v1.0/search?q=分页', headers={
+			'Authorization': 'Basic ' + credentials})
+		self.assertEqual(response.status_code, 200)
+		data = json.loads(response.get_data(as_text=True))
+		self.assertEqual(data['count'], 3)
+		self.assertEqual(len(data['results']), 2)
+		self.assertEqual(data['results'][0]['type'], 'post')
+		self.assertIn('body', data['results'][0]['post'])
+		self.assertIsNotNone(data['next'])
+		response = self.client.get('/api/v1.0/search?q=x&type=user', headers={
+			'Authorization': 'Basic ' + credentials})
+		self.assertEqual(response.status_code, 400)
@@ -0,0 +1,93 @@
+# -*- coding:UTF-8 -*-
+
+import unittest
+from datetime import datetime
+from app import create_app, db
+from app.models import User, Role, Post, Comment, Follow, Timeline, SearchStats
+from app.search import search
+from app.seed import Seeder, PowerLaw
+
+
+#批量生成压测数据测试
+class SeedTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+
+	def tearDown(self):
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def seed(self, random_seed=1):
+		#不指定end，默认的截止日期也必须是固定的
+		return Seeder(users=50, posts=200, comments=300, follows=5,
+					  seed=random_seed, chunk_size=64).run()
+
+	def snapshot(self):
+		return ([(p.id, p.author_id, p.body, p.timestamp)
+				 for p in Post.query.order_by(Post.id)],
+				sorted((f.follower_id, f.followed_id) for f in Follow.query))
+
+	def test_seed_counts_and_denormalized_columns(self):
+		counts = self.seed()
+		self.assertEqual(counts['users'], 50)
+		self.assertEqual(counts['posts'], 200)
+		self.assertEqual(counts['comments'], 300)
+		self.assertEqual(Follow.query.count(), counts['follows'])
+		self.assertEqual(Timeline.query.count(), counts['timelines'])
+		user = User.query.filter_by(username='seed1').first()
+		self.assertTrue(user.verify_password('password'))
+		self.assertTrue(user.is_following(user))
+		for u in User.query:
+			self.assertEqual(u.post_count, u.posts.count())
+			self.assertEqual(u.follower_count, u.followers.count())
+		self.assertEqual(sum(p.comment_count for p in Post.query), 300)
+		comment = Comment.query.first()
+		self.assertTrue(comment.timestamp >= comment.post.timestamp)
+		self.assertTrue(max(p.timestamp for p in Post.query) <= datetime(2017, 1, 1))
+		#时间线与逐条关注、发表得到的结果一致
+		self.assertEqual(user.timeline[0][0].count(),
+						 user.followed_post.count())
+		#生成的文章和评论进入了全文搜索索引
+		self.assertEqual(SearchStats.query.get('post').documents, 200)
+		self.assertTrue(search('flask')[1] > 0)
+
+	#时间线行在所引用的文章写入之后才写入，外键约束不会失败
+	def test_timelines_follow_posts(self):
+		def foreign_keys(connection, branch):
+			if not branch:
+				connection.execute('PRAGMA foreign_keys=ON')
+		if db.engine.dialect.name == 'sqlite':
+			db.event.listen(db.engine, 'engine_connect', foreign_keys)
+		try:
+			counts = Seeder(users=200, posts=300, comments=10, follows=40,
+							seed=1, chunk_size=50).run()
+		finally:
+			if db.engine.dialect.name == 'sqlite':
+				db.event.remove(db.engine, 'engine_connect', foreign_keys)
+		self.assertEqual(Timeline.query.count(), counts['timelines'])
+
+	def test_seed_is_deterministic(self):
+		self.seed()
+		first = self.snapshot()
+		db.session.remove()
+		db.drop_all()
+		db.create_all()
+		Role.insert_roles()
+		self.seed()
+		self.assertEqual(self.snapshot(), first)
+
+	def test_power_law_is_skewed(self):
+		import random
+		law = PowerLaw(1000, 1.2, random.Random(0))
+		hits = {}
+		for i in range(10000):
+			n = law.sample()
+			self.assertTrue(0 <= n < 1000)
+			hits[n] = hits.get(n, 0) + 1
+		top = sorted(hits.values(), reverse=True)
+		self.assertTrue(sum(top[:10]) > 10000 * 0.2)
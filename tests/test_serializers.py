@@ -0,0 +1,57 @@
+# -*- coding:UTF-8 -*-
+
+import json
+import unittest
+from datetime import datetime
+from flask import url_for
+from app import create_app, db, last_seen_buffer
+from app.models import User, Role, Post, Comment
+from app.serializers import (UrlTemplate, posts_to_json, users_to_json,
+							 comments_to_json)
+
+
+#批量序列化的输出必须与to_json()逐字节相同
+class SerializerTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		self.users = [User(email='user%d@example.com' % i, username='user%d' % i,
+						   password='cat', confirmed=True) for i in range(3)]
+		db.session.add_all(self.users)
+		for i, u in enumerate(self.users):
+			p = Post(body='*post* %d' % i, author=u)
+			db.session.add(p)
+			db.session.add(Comment(body='comment %d' % i, post=p,
+								   author=self.users[0]))
+		db.session.commit()
+
+	def tearDown(self):
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def dumps(self, items):
+		return json.dumps(items, sort_keys=True, default=str).encode('utf-8')
+
+	def test_url_template(self):
+		with self.app.test_request_context('/', base_url='http://example.com:5000/app'):
+			template = UrlTemplate('api.get_post_comments')
+			for id in (1, 5000, 2147483647):
+				self.assertEqual(template(id), url_for(
+					'api.get_post_comments', id=id, _external=True))
+
+	def test_byte_identical(self):
+		last_seen_buffer.record(self.users[1].id, datetime(2020, 1, 2, 3, 4, 5))
+		with self.app.test_request_context('/', base_url='https://example.com'):
+			posts = Post.query.order_by(Post.id).all()
+			comments = Comment.query.order_by(Comment.id).all()
+			self.assertEqual(self.dumps(posts_to_json(posts)),
+							 self.dumps([post.to_json() for post in posts]))
+			self.assertEqual(self.dumps(users_to_json(self.users)),
+							 self.dumps([user.to_json() for user in self.users]))
+			self.assertEqual(self.dumps(comments_to_json(comments)),
+							 self.dumps([c.to_json() for c in comments]))
+			self.assertEqual(posts_to_json([]), [])
@@ -0,0 +1,90 @@
+# -*- coding:UTF-8 -*-
+
+import json
+import unittest
+from base64 import b64encode
+from app import create_app, db
+from app.models import User, Role, FollowSuggestion
+from app.suggestions import load_graph, refresh
+
+
+#离线关注推荐测试
+class SuggestionsTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		self.users = {}
+		for name in 'abcdef':
+			self.users[name] = User(email='%s@example.com' % name, username=name,
+									password='cat', confirmed=True)
+		db.session.add_all(self.users.values())
+		db.session.commit()
+		for follower, followed in ['ab', 'ac', 'bd', 'cd', 'be', 'ef', 'fe']:
+			self.users[follower].follow(self.users[followed])
+		db.session.commit()
+
+	def tearDown(self):
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def suggested(self, name):
+		user = self.users[name]
+		return [s.username for s, mutual_count in user.suggestions(10)]
+
+	def test_graph(self):
+		graph = load_graph(batch_size=2)
+		a, b = self.users['a'], self.users['b']
+		self.assertEqual(graph.nnz, 7)
+		self.assertEqual(graph[a.id, b.id], 1)
+		self.assertEqual(graph[a.id, a.id], 0)
+
+	def test_ranking(self):
+		counts = refresh(full=True, top_k=10, chunk_size=4)
+		self.assertEqual(counts['users'], 6)
+		#d有两条路径；e只有一条但被关注得更多，排在f前面
+		self.assertEqual(self.suggested('a'), ['d', 'e'])
+		self.assertEqual([s.username for s, m in self.users['c'].suggestions(10)], [])
+		self.assertEqual(self.suggested('b'), ['f'])
+		row = FollowSuggestion.query.filter_by(
+			user_id=self.users['a'].id, rank=0).first()
+		self.assertEqual(row.mutual_count, 2)
+		refresh(full=True, top_k=1)
+		self.assertEqual(self.suggested('a'), ['d'])
+
+	def test_incremental_refresh(self):
+		refresh(full=True)
+		self.assertEqual(refresh()['users'], 0)
+		#c关注e之后，c和关注c的a需要重算
+		self.users['c'].follow(self.users['e'])
+		db.session.commit()
+		counts = refresh()
+		self.assertEqual(counts['users'], 2)
+		self.assertEqual(self.suggested('c'), ['f'])
+		self.assertEqual(self.suggested('a'), ['e', 'd'])
+
+		#推荐计算之后已经关注的用户不再显示
+		self.users['a'].follow(self.users['e'])
+		db.session.commit()
+		self.assertEqual(self.suggested('a'), ['d'])
+
+	def test_views(self):
+		refresh(full=True)
+		client = self.app.test_client(use_cookies=True)
+		client.post('/auth/login', data={'email': 'a@example.com',
+										 'password': 'cat'})
+		response = client.get('/user/a')
+		self.assertIn('/user/d', response.get_data(as_text=True))
+		credentials = b64encode(b'a@example.com:cat').decode('ascii')
+		response = client.get('/api/v1.0/users/%d/suggestions/' % self.users['a'].id,
+							  headers={'Authorization': 'Basic ' + credentials})
+		data = json.loads(response.get_data(as_text=True))
+		self.assertEqual([u['username'] for u in data['suggestions']], ['d', 'e'])
+		self.assertEqual(data['suggestions'][0]['mutual_count'], 2)
+		#其他用户的推荐列表不可读
+		response = client.get('/api/v1.0/users/%d/suggestions/' % self.users['b'].id,
+							  headers={'Authorization': 'Basic ' + credentials})
+		self.assertEqual(response.status_code, 403)
@@ -0,0 +1,87 @@
+# -*- coding:UTF-8 -*-
+
+import unittest
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.models import User, Role, Post, Timeline
+from app.pagination import paginate_by_cursor
+
+
+#物化时间线测试
+class TimelineTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		self.john = User(email='john@example.com', username='john',
+						 password='cat')
+		self.susan = User(email='susan@example.com', username='susan',
+						  password='dog')
+		db.session.add_all([self.john, self.susan])
+		db.session.commit()
+
+	def tearDown(self):
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def timeline_bodies(self, user):
+		pagination = paginate_by_cursor(user.timeline, Post, per_page=50)
+		return [p.body for p in pagination.items]
+
+	def test_fan_out_on_post(self):
+		self.john.follow(self.susan)
+		db.session.commit()
+		db.session.add(Post(body='from susan', author=self.susan))
+		db.session.commit()
+		self.assertEqual(self.timeline_bodies(self.john), ['from susan'])
+		self.assertEqual(self.timeline_bodies(self.susan), ['from susan'])
+
+	def test_backfill_and_purge(self):
+		db.session.add(Post(body='old post', author=self.susan))
+		db.session.commit()
+		self.assertEqual(self.timeline_bodies(self.john), [])
+		self.john.follow(self.susan)
+		db.session.commit()
+		self.assertEqual(self.timeline_bodies(self.john), ['old post'])
+		self.john.unfollow(self.susan)
+		db.session.commit()
+		self.assertEqual(self.timeline_bodies(self.john), [])
+
+	#回填有上限，更早的文章在翻页时从posts表读取
+	def test_history_beyond_backfill_limit(self):
+		self.app.config['FLASKY_TIMELINE_BACKFILL'] = 2
+		start = datetime(2020, 1, 1)
+		db.session.add_all([Post(body='post %d' % i, author=self.susan,
+								 timestamp=start + timedelta(hours=i))
+							for i in range(5)])
+		db.session.commit()
+		self.john.follow(self.susan)
+		db.session.commit()
+		self.assertEqual(Timeline.query.filter_by(
+			user_id=self.john.id).count(), 2)
+		expected = ['post %d' % i for i in range(4, -1, -1)]
+		self.assertEqual(self.timeline_bodies(self.john), expected)
+		bodies, cursor = [], None
+		while True:
+			pagination = paginate_by_cursor(self.john.timeline, Post,
+											cursor=cursor, per_page=2)
+			bodies.extend(p.body for p in pagination.items)
+			cursor = pagination.next_cursor
+			if cursor is None:
+				break
+		self.assertEqual(bodies, expected)
+
+	def test_pull_mode_for_popular_authors(self):
+		self.app.config['FLASKY_TIMELINE_FANOUT_LIMIT'] = 1
+		self.john.follow(self.susan)
+		db.session.commit()
+		db.session.refresh(self.susan)
+		self.assertTrue(self.susan.timeline_pull)
+		db.session.add(Post(body='pulled', author=self.susan))
+		db.session.commit()
+		self.assertEqual(Timeline.query.filter_by(
+			user_id=self.john.id).count(), 0)
+		self.assertEqual(self.timeline_bodies(self.john), ['pulled'])
@@ -0,0 +1,82 @@
+# -*- coding:UTF-8 -*-
+
+import json
+import unittest
+from base64 import b64encode
+from app import create_app, db
+from app.models import User, Role, Post, Permission
+from app.tokens import TokenUser, epochs
+
+
+#无状态API令牌测试
+class AuthTokenTestCase(unittest.TestCase):
+	def setUp(self):
+		self.app = create_app('testing')
+		self.app_context = self.app.app_context()
+		self.app_context.push()
+		db.create_all()
+		Role.insert_roles()
+		epochs.clear()
+		self.john = User(email='john@example.com', username='john',
+						 password='cat', confirmed=True)
+		db.session.add(self.john)
+		db.session.commit()
+		self.client = self.app.test_client()
+		self.statements = []
+		db.event.listen(db.engine, 'before_cursor_execute', self.count)
+
+	def tearDown(self):
+		db.event.remove(db.engine, 'before_cursor_execute', self.count)
+		db.session.remove()
+		db.drop_all()
+		self.app_context.pop()
+
+	def count(self, conn, cursor, statement, parameters, context,
+			  executemany):
+		self.statements.append(statement)
+
+	def headers(self, username, password=''):
+		return {
+			'Authorization': 'Basic ' + b64encode(
+				(username + ':' + password).encode('utf-8')).decode('utf-8'),
+			'Accept': 'application/json',
+			'Content-Type': 'application/json'}
+
+	def test_claims_verify_without_queries(self):
+		token = self.john.generate_auth_token(3600)
+		User.verify_auth_token(token)
+		del self.statements[:]
+		user = User.verify_auth_token(token)
+		self.assertIsInstance(user, TokenUser)
+		self.assertTrue(user.confirmed)
+		self.assertTrue(user.can(Permission.WRITE_ARTICLES))
+		self.assertFalse(user.is_administrator())
+		self.assertEqual(self.statements, [])
+		db.session.expunge_all()
+		self.assertEqual(user.username, 'john')
+		self.assertEqual(len(self.statements), 1)
+
+	def test_expired_and_tampered_tokens(self):
+		self.assertIsNone(User.verify_auth_token(
+			self.john.generate_auth_token(-1)))
+		self.assertIsNone(User.verify_auth_token('bogus'))
+
+	def test_password_change_revokes_tokens(self):
+		token = self.john.generate_auth_token(3600)
+		self.john.password = 'dog'
+		db.session.commit()
+		self.assertIsNone(User.verify_auth_token(token))
+
+	def test_token_api_flow(self):
+		response = self.client.get('/api/v1.0/token',
+								   headers=self.headers('john@example.com', 'cat'))
+		self.assertEqual(response.status_code, 200)
+		token = json.loads(response.get_data(as_text=True))['token']
+		response = self.client.post(
+			'/api/v1.0/posts/', headers=self.headers(token),
+			data=json.dumps({'body': 'body of the *blog* post'}))
+		self.assertEqual(response.status_code, 201)
+		self.assertEqual(Post.query.first().author_id, self.john.id)
+		response = self.client.get('/api/v1.0/token',
+								   headers=self.headers(token))
+		self.assertEqual(response.status_code, 401)